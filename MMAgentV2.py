@@ -1,16 +1,19 @@
+import asyncio
+from typing import Optional
 import warnings
-import torch
-from FlagEmbedding import FlagReranker
-from embedding_utils import embed
+from rerank_service import get_rerank_service, RerankService
+from evidence_selector import select_formation_evidence
+from embedding_utils import embed, embed_many
 from intent_classifier import classify_intent_and_extract_entities
 from geo_context_summary import query_all_geological_info, format_question_with_context,summarize_geological_context
-from graph_query import query_genesis_triples_for
+from graph_query_async import aquery_genesis_triples_for, gather_limited, run_async
 from answer_generator import (
     generate_full_formation_answer_v2,
     generate_general_answer_v2
 )
 from retrieval_with_context_v2 import (
     retrieve_for_formation_analysis_v2,
+    retrieve_formation_texts,
     retrieve_for_general_question_v2
 )
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -22,21 +25,37 @@ INCLUDE_FOR_QUESTION_CONTEXT = ["hirise_top3"]
 INCLUDE_FOR_GEO_SUMMARY = ["epoch","hirise_all", "craters", "mineral_data"]
 
 USE_RERANKER = False
+# MMR evidence selection (evidence_selector.py) before the formation prompt is built
+USE_EVIDENCE_SELECTION = False
+# Formation paragraphs of all entities in one batched search and reranker batch (retrieve_formation_texts),
+# with paragraphs shared by several entities put into the prompt once
+USE_BATCHED_TEXT_RETRIEVAL = False
 BLOCKED_SOURCES = {
 
 }
 TEXT_WEIGHT = 0.6
 DESC_WEIGHT = 0.4
-local_model_path = ""  # Path to local reranker model
-reranker = None
-if USE_RERANKER:
-    reranker = FlagReranker(local_model_path, use_fp16=True)
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    reranker.model.to(device)
-    reranker.model.half()
-    print(f"Reranker loaded successfully. Device: {device}")
-else:
-    print("Reranker is disabled.")
+
+
+def get_active_reranker() -> Optional[RerankService]:
+    """ Shared, score-caching reranking service (model loaded on first use), or None when USE_RERANKER is off """
+    return get_rerank_service() if USE_RERANKER else None
+
+
+async def _retrieve_formation_entities(entities, **retrieval_kwargs):
+    """
+    Per-entity formation retrieval fanned out concurrently; results keep the entity order.
+    Each item is ((paths, top_texts, extra_1hop), genesis_triples). Path retrieval runs on the synchronous
+    driver in a worker thread; the genesis triples use the async driver (both with graph_query's timeout and retries).
+    """
+    async def _one(entity):
+        print(f"\n🌐 entity retrieval：{entity}")
+        return await asyncio.gather(
+            asyncio.to_thread(retrieve_for_formation_analysis_v2, entity=entity, **retrieval_kwargs),
+            aquery_genesis_triples_for(entity)
+        )
+
+    return await gather_limited([_one(entity) for entity in entities])
 
 def run_MMAgent(question: str) -> str:
     """
@@ -76,26 +95,49 @@ def run_MMAgent(question: str) -> str:
         all_genesis_triples = []
         all_top_texts = []
         all_extra_1hop = []
-        for entity in all_entities:
-            print(f"\n🌐 entity retrieval：{entity}")
-            paths, top_texts, extra_1hop = retrieve_for_formation_analysis_v2(
-                question=question,
-                entity=entity,
-                lat=lat,
-                lon=lon,
+        reranker = get_active_reranker()
+        entity_results = run_async(_retrieve_formation_entities(
+            all_entities,
+            question=question,
+            lat=lat,
+            lon=lon,
+            q_vec=q_vec,
+            geo_vec=geo_vec,
+            blocked_sources=BLOCKED_SOURCES,
+            text_weight=TEXT_WEIGHT,
+            desc_weight=DESC_WEIGHT,
+            reranker=None if USE_BATCHED_TEXT_RETRIEVAL else reranker,
+            retrieve_texts=not USE_BATCHED_TEXT_RETRIEVAL
+        ))
+        if USE_BATCHED_TEXT_RETRIEVAL:
+            # Paragraphs of all entities: one batched search and one reranker batch
+            entity_texts = retrieve_formation_texts(
+                all_entities,
                 q_vec=q_vec,
                 geo_vec=geo_vec,
+                topk=3,
+                reranker=reranker,
                 blocked_sources=BLOCKED_SOURCES,
                 text_weight=TEXT_WEIGHT,
-                desc_weight=DESC_WEIGHT,
-                reranker=reranker
+                desc_weight=DESC_WEIGHT
             )
-            genesis = query_genesis_triples_for(entity)
-
+        else:
+            entity_texts = [top_texts for (_, top_texts, _), _ in entity_results]
+        for ((paths, _, extra_1hop), genesis), top_texts in zip(entity_results, entity_texts):
             all_paths.extend(paths)
             all_genesis_triples.extend(genesis)
             all_top_texts.extend(top_texts)
             all_extra_1hop.extend(extra_1hop)
+        if USE_BATCHED_TEXT_RETRIEVAL:
+            # A paragraph retrieved for several entities goes into the prompt once
+            all_top_texts = list(dict.fromkeys(all_top_texts))
+        if USE_EVIDENCE_SELECTION:
+            all_paths, all_top_texts, all_extra_1hop = select_formation_evidence(
+                TEXT_WEIGHT * q_vec + DESC_WEIGHT * geo_vec,
+                all_paths,
+                all_top_texts,
+                all_extra_1hop
+            )
 
         geo_summary = summarize_geological_context(
             **geo_context,
@@ -116,9 +158,9 @@ def run_MMAgent(question: str) -> str:
     elif intent in ["reasoning_qa", "general_qa"] and all_entities:
         print("\n📊 Embedding question and entity descriptions...")
         all_desc_text = "; ".join(all_entities)
-        desc_vec = embed(all_desc_text, tag="entity_description")
         instr = "Generate a representation for this sentence to use to retrieve related articles:"
-        q_vec = embed([instr + question], tag="general_question")
+        vecs = embed_many([all_desc_text, instr + question], tag="entity_description + general_question")
+        desc_vec, q_vec = vecs[0], vecs[1:2]
 
         print("\n🚀 Retrieving multi-entity general QA information...")
         all_paths, all_contexts, all_top_texts = retrieve_for_general_question_v2(
@@ -129,7 +171,7 @@ def run_MMAgent(question: str) -> str:
             blocked_sources=BLOCKED_SOURCES,
             text_weight=TEXT_WEIGHT,
             desc_weight=DESC_WEIGHT,
-            reranker=reranker
+            reranker=get_active_reranker()
         )
         answer, prompt = generate_general_answer_v2(
             question=question,
@@ -129,7 +129,7 @@ def generate_general_answer_v2(question, paths, entity_context_str=None, top_tex
         triples = path.get("triples", []) or []
         paras = path.get("paragraphs", []) or []
 
-        same_len = isinstance(paras, list) and len(paras) == len(triples)
+        same_len = isinstance(paras, (list, tuple)) and len(paras) == len(triples)
 
         for j, triple in enumerate(triples):
             if not isinstance(triple, (list, tuple)) or len(triple) < 3:
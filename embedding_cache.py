@@ -0,0 +1,204 @@
+import time
+import sqlite3
+from contextlib import contextmanager
+import hashlib
+import threading
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Optional, Any
+# SQLite file of the persistent embedding cache
+EMBED_CACHE_PATH = r""
+# Size budget of the stored vectors; least recently used entries are evicted beyond it
+EMBED_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Fraction of the budget kept after an eviction pass, so eviction does not run on every insert
+EMBED_CACHE_EVICT_TO = 0.9
+# Hits refresh last_used only when it is older than this many seconds, so hot entries cost no write per lookup
+EMBED_CACHE_TOUCH_INTERVAL = 3600.0
+# Texts looked up per SQL statement (SQLite limits the number of bound parameters)
+_LOOKUP_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model      TEXT    NOT NULL,
+    normalized INTEGER NOT NULL,
+    text_hash  BLOB    NOT NULL,
+    vec        BLOB    NOT NULL,
+    last_used  REAL    NOT NULL,
+    PRIMARY KEY (model, normalized, text_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, disk-backed store of text embeddings.
+    Entries are keyed by (model id, normalization flag, hash of the text) and hold float32 vectors.
+    Total vector bytes are bounded by max_bytes with least-recently-used eviction (recency at EMBED_CACHE_TOUCH_INTERVAL resolution).
+    One connection is shared by all threads of the process; WAL mode lets several processes read concurrently.
+    """
+
+    def __init__(self, path: str, model_id: str, normalized: bool = True, max_bytes: int = EMBED_CACHE_MAX_BYTES):
+        self.path = path
+        self.model_id = model_id
+        self.normalized = int(normalized)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0]
+        self.hits = self.misses = self.evictions = 0
+
+    @contextmanager
+    def _transaction(self):
+        """ Explicit write transaction, rolled back if the block raises """
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def get_many(self, hashes: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Cached vectors of the given text hashes (absent hashes are left out) and mark them as used.
+        last_used is only rewritten once it is EMBED_CACHE_TOUCH_INTERVAL old, in one transaction per call.
+        """
+        hashes = list(hashes)
+        found: Dict[bytes, np.ndarray] = {}
+        stale = []
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(hashes), _LOOKUP_CHUNK):
+                chunk = hashes[i:i + _LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vec, last_used FROM embeddings WHERE model = ? AND normalized = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (self.model_id, self.normalized, *chunk)
+                ).fetchall()
+                for h, blob, last_used in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+                    if now - last_used >= EMBED_CACHE_TOUCH_INTERVAL:
+                        stale.append(h)
+            if stale:
+                with self._transaction():
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND normalized = ? AND text_hash = ?",
+                        [(now, self.model_id, self.normalized, h) for h in stale]
+                    )
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[bytes, np.ndarray]) -> None:
+        now = time.time()
+        rows = [
+            (self.model_id, self.normalized, h, np.ascontiguousarray(v, dtype=np.float32).tobytes(), now)
+            for h, v in vectors.items()
+        ]
+        with self._lock:
+            added = 0
+            with self._transaction():
+                for row in rows:
+                    old = self._conn.execute(
+                        "SELECT LENGTH(vec) FROM embeddings WHERE model = ? AND normalized = ? AND text_hash = ?", row[:3]
+                    ).fetchone()
+                    self._conn.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", row)
+                    added += len(row[3]) - (old[0] if old else 0)
+            self.bytes += added
+            if self.bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """ Drop least recently used entries until the store is back under EMBED_CACHE_EVICT_TO of the budget """
+        target = self.max_bytes * EMBED_CACHE_EVICT_TO
+        # Other processes may have written since we counted
+        self.bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0]
+        if self.bytes <= target:
+            return
+        victims, freed = [], 0
+        oldest = self._conn.execute(
+            "SELECT model, normalized, text_hash, LENGTH(vec) FROM embeddings ORDER BY last_used"
+        )
+        for model, normalized, h, size in oldest:
+            victims.append((model, normalized, h))
+            freed += size
+            if self.bytes - freed <= target:
+                break
+        oldest.close()
+        with self._transaction():
+            self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND normalized = ? AND text_hash = ?", victims)
+        self.bytes -= freed
+        self.evictions += len(victims)
+
+    def embed_many(self, texts: List[str], compute: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """ (len(texts), dim) vectors: cached ones from disk, the rest from compute (called once, deduplicated) and stored """
+        hashes = [text_hash(t) for t in texts]
+        found = self.get_many(dict.fromkeys(hashes))
+        missing = list(dict.fromkeys(t for t, h in zip(texts, hashes) if h not in found))
+        if missing:
+            computed = {text_hash(t): np.asarray(v, dtype=np.float32) for t, v in zip(missing, compute(missing))}
+            self.put_many(computed)
+            found.update(computed)
+        return np.stack([found[h] for h in hashes])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+def _kg_descriptions() -> List[str]:
+    """ Every non-empty entity description of the active graph backend """
+    import graph_backend
+    if graph_backend.GRAPH_BACKEND == "snapshot":
+        from graph_snapshot import _snapshot
+        descriptions = _snapshot().descriptions
+    else:
+        from graph_query import _driver
+        from entity_names import ENTITY_LABEL
+        with _driver.session() as session:
+            descriptions = [r["description"] for r in session.run(
+                f"MATCH (n:{ENTITY_LABEL}) WHERE n.description IS NOT NULL RETURN n.description AS description"
+            )]
+    return list(dict.fromkeys(d for d in descriptions if d))
+
+
+def warm_up_descriptions(batch_size: int = 1024, cache: Optional[EmbeddingCache] = None) -> int:
+    """
+    Offline job: pre-embed all KG entity descriptions into the embedding cache, so query-time
+    description embeddings are cache hits. Returns the number of descriptions embedded.
+    """
+    import embedding_utils
+    cache = cache or embedding_utils.get_embedding_cache()
+    descriptions = _kg_descriptions()
+    print(f"🛠️ Warming up the embedding cache with {len(descriptions)} entity descriptions ...")
+    for i in range(0, len(descriptions), batch_size):
+        cache.embed_many(descriptions[i:i + batch_size], embedding_utils._embed_uncached)
+        print(f"  - {min(i + batch_size, len(descriptions))}/{len(descriptions)}")
+    print(f"✅ Embedding cache warm: {cache.stats()}")
+    return len(descriptions)
+
+
+if __name__ == "__main__":
+    warm_up_descriptions()
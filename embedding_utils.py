@@ -1,20 +1,41 @@
-from sentence_transformers import SentenceTransformer
-import torch
 import numpy as np
-from typing import Union
-_model = None
+import queue
+import time
+import threading
+from concurrent.futures import Future
+from typing import Union, List, Optional
+import embedding_cache
+from embedding_cache import EmbeddingCache
+from model_registry import get_model as get_registry_model
+import onnx_embedder
+# Guards the lazily created batcher and embedding cache
+_model_lock = threading.Lock()
 # your embedding model path
 _model_path = r""
+# "torch": SentenceTransformer (fp32); "onnx": ONNX Runtime on CPU, int8 quantized (see onnx_embedder.py)
+EMBED_BACKEND = "torch"
+# Texts per forward pass of embed_many
+EMBED_BATCH_SIZE = 32
+# Coalesce concurrent embed()/embed_many() calls from different threads into shared batches
+USE_EMBED_BATCHER = False
+EMBED_MAX_BATCH_SIZE = 32
+# How long the batcher waits for more texts after the first one arrives
+EMBED_MAX_WAIT_MS = 5.0
+# Serve repeated texts from the persistent embedding cache (embedding_cache.EMBED_CACHE_PATH)
+USE_EMBED_CACHE = False
 
 def get_model():
-    global _model
-    if _model is None:
-        print("📦 Lazy loading of embedded model bge-large...")
-        _model = SentenceTransformer(_model_path)
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        _model.to(device)
-        print(f"The model has been loaded onto the device.: {device}")
-    return _model
+    """ The shared bge-large instance of EMBED_BACKEND from the model registry (loaded on first use) """
+    if EMBED_BACKEND == "onnx":
+        return get_registry_model(onnx_embedder.registry_kind(), onnx_embedder.ONNX_MODEL_DIR)
+    return get_registry_model("sentence_transformer", _model_path)
+
+
+def model_id() -> str:
+    """ Identity of the vectors embed() produces; quantized backends do not share cache entries with fp32 """
+    if EMBED_BACKEND == "onnx":
+        return f"{_model_path}#onnx{'-int8' if onnx_embedder.ONNX_QUANTIZED else ''}"
+    return _model_path
 
 def combine_embeddings(q_vec, geo_vec, method='weighted_sum', weight=0.5):
     """
@@ -31,9 +52,109 @@ def combine_embeddings(q_vec, geo_vec, method='weighted_sum', weight=0.5):
     else:
         raise ValueError("Unsupported combination method.")
 
-def embed(text: str, tag: str = "") -> np.ndarray:
-    model = get_model()
-    vec = model.encode(text, normalize_embeddings=True)
+def _encode(texts: List[str]) -> np.ndarray:
+    return get_model().encode(texts, batch_size=EMBED_BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True)
+
+
+class EmbeddingBatcher:
+    """
+    In-process micro-batching queue in front of the model.
+    Callers submit single texts and wait on a Future; a worker thread takes the first queued text,
+    waits up to max_wait_ms for more (at most max_batch_size) and encodes them in one padded batch.
+    """
+
+    def __init__(self, max_batch_size: int = EMBED_MAX_BATCH_SIZE, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.texts = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        futures = [self.submit(t) for t in texts]
+        return np.stack([f.result() for f in futures])
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vecs = _encode([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vec in zip(batch, vecs):
+                future.set_result(vec)
+            self.batches += 1
+            self.texts += len(batch)
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_batcher() -> EmbeddingBatcher:
+    global _batcher
+    if _batcher is None:
+        with _model_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher(EMBED_MAX_BATCH_SIZE, EMBED_MAX_WAIT_MS)
+    return _batcher
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """ Persistent cache of this model's normalized embeddings """
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _model_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(embedding_cache.EMBED_CACHE_PATH, model_id(), normalized=True,
+                                                  max_bytes=embedding_cache.EMBED_CACHE_MAX_BYTES)
+    return _embedding_cache
+
+
+def _embed_uncached(texts: List[str]) -> np.ndarray:
+    if USE_EMBED_BATCHER and texts:
+        return get_batcher().embed(texts)
+    return _encode(texts)
+
+
+def embed_many(texts: List[str], tag: str = "") -> np.ndarray:
+    """ Embed several texts in as few forward passes as possible; returns (len(texts), dim) """
+    texts = list(texts)
+    if USE_EMBED_CACHE and texts:
+        vecs = get_embedding_cache().embed_many(texts, _embed_uncached)
+    else:
+        vecs = _embed_uncached(texts)
+    if tag:
+        print(f"✅Embedding complete [{tag}]，{len(texts)} texts, Vector Dimension: {vecs.shape}")
+    return vecs
+
+
+def embed(text: Union[str, List[str]], tag: str = "") -> np.ndarray:
+    if USE_EMBED_BATCHER or USE_EMBED_CACHE:
+        vec = embed_many([text] if isinstance(text, str) else text)
+        if isinstance(text, str):
+            vec = vec[0]
+    else:
+        model = get_model()
+        vec = model.encode(text, normalize_embeddings=True)
     if tag:
         print(f"✅Embedding complete [{tag}]，Vector Dimension: {vec.shape}")
     return vec
@@ -49,7 +170,8 @@ def sim(a: np.ndarray, b: Union[np.ndarray, list[np.ndarray]]) -> float:
 
     try:
         if isinstance(b, list):
-            return sum(np.dot(a, v) for v in b if v is not None)
+            vecs = [v for v in b if v is not None]
+            return float(np.sum(np.stack(vecs) @ np.ravel(a))) if vecs else 0.0
         else:
             return float(np.dot(a, b))
     except Exception as e:
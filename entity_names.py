@@ -0,0 +1,81 @@
+import csv
+import unicodedata
+from typing import Dict, Optional
+from functools import lru_cache
+# Label added to every named node so that name lookups can use a label-scoped index
+ENTITY_LABEL = "Entity"
+# Normalized name property and the index that backs it
+NAME_KEY_PROPERTY = "name_key"
+NAME_KEY_INDEX = "entity_name_key"
+# Optional alias/synonym table: CSV with columns alias,canonical (e.g. "K-jarosite,jarosite")
+ALIAS_TABLE_PATH = r""
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """
+    Normalized lookup key of an entity name: Unicode NFKC, whitespace collapsed, case-folded.
+    The same function computes the stored name_key and the query parameter, so both sides always agree.
+    """
+    if not name:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", name).split()).casefold()
+
+
+@lru_cache(maxsize=1)
+def load_alias_table(path: str = ALIAS_TABLE_PATH) -> Dict[str, str]:
+    """ Load the alias table once; keys and values are normalized names """
+    if not path:
+        return {}
+    aliases = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            alias, canonical = normalize_name(row.get("alias")), normalize_name(row.get("canonical"))
+            if alias and canonical and alias != canonical:
+                aliases[alias] = canonical
+    print(f"📖 Loaded {len(aliases)} entity aliases")
+    return aliases
+
+
+def resolve_name_key(name: Optional[str]) -> str:
+    """ Normalized name with aliases resolved to their canonical entity """
+    key = normalize_name(name)
+    return load_alias_table(ALIAS_TABLE_PATH).get(key, key)
+
+
+def migrate_name_keys(driver=None, batch_size: int = 5000, only_missing: bool = True) -> int:
+    """
+    One-off (re-runnable) migration: label every named node as :Entity, store its name_key
+    and create the backing index. Returns the number of nodes updated.
+    Re-run after loading new nodes; with only_missing=True existing keys are left untouched.
+    """
+    if driver is None:
+        from graph_query import _driver as driver
+
+    missing_filter = f"AND (n.{NAME_KEY_PROPERTY} IS NULL OR NOT n:{ENTITY_LABEL})" if only_missing else ""
+    update = f"""
+    UNWIND $rows AS row
+    MATCH (n) WHERE elementId(n) = row.id
+    SET n:{ENTITY_LABEL}, n.{NAME_KEY_PROPERTY} = row.key
+    """
+    updated = 0
+    with driver.session() as session:
+        session.run(
+            f"CREATE INDEX {NAME_KEY_INDEX} IF NOT EXISTS FOR (n:{ENTITY_LABEL}) ON (n.{NAME_KEY_PROPERTY})"
+        ).consume()
+        records = list(session.run(f"""
+        MATCH (n) WHERE n.name IS NOT NULL {missing_filter}
+        RETURN elementId(n) AS id, n.name AS name
+        """))
+        print(f"🛠️ Computing name keys for {len(records)} nodes ...")
+        for i in range(0, len(records), batch_size):
+            rows = [{"id": r["id"], "key": normalize_name(r["name"])} for r in records[i:i + batch_size]]
+            session.run(update, rows=rows).consume()
+            updated += len(rows)
+            print(f"  - {updated}/{len(records)} nodes updated")
+        session.run("CALL db.awaitIndexes()").consume()
+    print(f"✅ Name key migration finished: {updated} nodes, index {NAME_KEY_INDEX} online")
+    return updated
+
+
+if __name__ == "__main__":
+    migrate_name_keys()
@@ -0,0 +1,104 @@
+import re
+import numpy as np
+from typing import List, Dict, Any, Tuple
+from embedding_utils import embed_many
+# Most evidence units (inlined path paragraphs, retrieved paragraphs, supplementary 1-hop triples) kept in a prompt
+EVIDENCE_MAX_ITEMS = 30
+# Units at least this cosine-similar to an already selected unit are near-duplicates and dropped
+EVIDENCE_SIM_THRESHOLD = 0.92
+# MMR trade-off: 1.0 = relevance only, 0.0 = diversity only
+EVIDENCE_MMR_LAMBDA = 0.7
+
+
+def _normalized_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def mmr_select(embs: np.ndarray, relevance: np.ndarray, k: int, lam: float = EVIDENCE_MMR_LAMBDA,
+               sim_threshold: float = EVIDENCE_SIM_THRESHOLD) -> List[int]:
+    """
+    Maximal marginal relevance over L2-normalized embeddings: repeatedly pick the candidate maximizing
+    lam * relevance - (1 - lam) * (max similarity to the picked ones), skipping candidates at or above
+    sim_threshold to any picked one. Returns the picked indices in pick order.
+    """
+    n = len(embs)
+    if n == 0 or k <= 0:
+        return []
+    sims = embs @ embs.T
+    max_sim = np.full(n, -np.inf)
+    available = np.ones(n, dtype=bool)
+    picked = []
+    while len(picked) < k and available.any():
+        redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        gain = np.where(available, lam * relevance - (1 - lam) * redundancy, -np.inf)
+        best = int(np.argmax(gain))
+        picked.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, sims[best])
+        available &= max_sim < sim_threshold
+    return picked
+
+
+def select_formation_evidence(
+    query_vec: np.ndarray,
+    paths: List[Dict[str, Any]],
+    top_texts: List[str],
+    extra_1hop: List[Dict[str, Any]],
+    max_items: int = EVIDENCE_MAX_ITEMS,
+    sim_threshold: float = EVIDENCE_SIM_THRESHOLD,
+    lam: float = EVIDENCE_MMR_LAMBDA
+) -> Tuple[List[Dict[str, Any]], List[str], List[Dict[str, Any]]]:
+    """
+    Evidence selection of the formation prompt across all entities.
+    Candidates are the node paragraphs inlined under path triples, the retrieved paragraphs and the supplementary
+    1-hop triples (with their paragraph or description). Exact repeats are dropped, then MMR against query_vec keeps
+    at most max_items units without near-duplicates. Path triples always stay; an unselected inlined paragraph is
+    blanked, unselected paragraphs and 1-hop triples are removed.
+    Returns (paths, top_texts, extra_1hop) with the input order preserved.
+    """
+    # (kind, position, text); kind: "path" (position = (path index, paragraph index)), "text", "extra"
+    candidates = []
+    for i, path in enumerate(paths):
+        # Triple j is printed with paragraph j (its head node); later node paragraphs never reach the prompt
+        inlined = (path.get("paragraphs", []) or [])[:len(path.get("triples", []))]
+        for j, para in enumerate(inlined):
+            if isinstance(para, str) and para.strip():
+                candidates.append(("path", (i, j), para))
+    candidates += [("text", i, text) for i, text in enumerate(top_texts) if text and text.strip()]
+    for i, item in enumerate(extra_1hop):
+        body = item.get("paragraph") or item.get("description") or ""
+        candidates.append(("extra", i, f"{item['triple']} {body}".strip()))
+
+    first_of: Dict[str, int] = {}
+    unique = []
+    for c, (_, _, text) in enumerate(candidates):
+        key = _normalized_text(text)
+        if key not in first_of:
+            first_of[key] = c
+            unique.append(c)
+
+    kept = set()
+    if unique:
+        embs = embed_many([candidates[c][2] for c in unique])
+        embs = embs / np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12)
+        q = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        relevance = embs @ (q / max(float(np.linalg.norm(q)), 1e-12))
+        kept = {unique[i] for i in mmr_select(embs, relevance, max_items, lam, sim_threshold)}
+
+    kept_paths = {pos for c, (kind, pos, _) in enumerate(candidates) if kind == "path" and c in kept}
+    selected_paths = []
+    for i, path in enumerate(paths):
+        paragraphs = path.get("paragraphs", []) or []
+        selected_paths.append({
+            **path,
+            "paragraphs": [p if (i, j) in kept_paths or not (isinstance(p, str) and p.strip()) else ""
+                           for j, p in enumerate(paragraphs)]
+        })
+    kept_texts = {pos for c, (kind, pos, _) in enumerate(candidates) if kind == "text" and c in kept}
+    kept_extra = {pos for c, (kind, pos, _) in enumerate(candidates) if kind == "extra" and c in kept}
+    selected_texts = [t for i, t in enumerate(top_texts) if i in kept_texts]
+    selected_extra = [item for i, item in enumerate(extra_1hop) if i in kept_extra]
+
+    print(f"🧹 Evidence selection: {len(candidates)} candidates, {len(unique)} distinct, {len(kept)} kept "
+          f"(paragraphs {len(selected_texts)}/{len(top_texts)}, 1-hop {len(selected_extra)}/{len(extra_1hop)})")
+    return selected_paths, selected_texts, selected_extra
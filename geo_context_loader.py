@@ -4,12 +4,19 @@ from lxml import etree
 import rasterio
 from rasterio.transform import rowcol
 import math
-from geopy.distance import geodesic
 import pandas as pd
 import numpy as np
 import geopandas as gpd
 from shapely.geometry import shape, Point
 import fiona
+import json
+import os
+import pickle
+from scipy.spatial import cKDTree
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from rasterio.windows import Window
 from functools import lru_cache
 
 # Geological Age
@@ -103,41 +110,145 @@ def mars_lonlat_to_meters(lon_deg, lat_deg, radius=3396000):
 
 # Find the nearest valid cell value
 def find_nearest_valid(data, mask, row, col, max_radius=10):
-    for r in range(1, max_radius + 1):
-        row_min = max(0, row - r)
-        row_max = min(data.shape[0], row + r + 1)
-        col_min = max(0, col - r)
-        col_max = min(data.shape[1], col + r + 1)
-
-        window = data[row_min:row_max, col_min:col_max]
-        window_mask = mask[row_min:row_max, col_min:col_max]
-        valid = window[window_mask > 0]
-
-        if valid.size > 0:
-            return valid[0]
-    return None
+    """
+    Value of the valid cell in the smallest square ring (Chebyshev distance 1..max_radius) around (row, col),
+    the first one in row-major order when a ring holds several. Vectorized over the whole neighbourhood.
+    """
+    row_min, row_max = max(0, row - max_radius), min(data.shape[0], row + max_radius + 1)
+    col_min, col_max = max(0, col - max_radius), min(data.shape[1], col + max_radius + 1)
+    rows, cols = np.nonzero(mask[row_min:row_max, col_min:col_max] > 0)
+    if rows.size == 0:
+        return None
+    ring = np.maximum(np.abs(rows + row_min - row), np.abs(cols + col_min - col))
+    # np.nonzero is row-major and argmin takes the first minimum, so ties resolve like a ring-by-ring scan
+    best = int(np.argmin(ring))
+    return data[row_min + rows[best], col_min + cols[best]]
+
+# Albedo sampling reads only the neighbourhood searched by find_nearest_valid
+ALBEDO_SEARCH_RADIUS = 10
+# Windowed reads are served from a shared LRU cache of square tiles (band values and mask)
+ALBEDO_TILE_SIZE = 256
+ALBEDO_TILE_CACHE_TILES = 256
+# Directory of the uncompressed, memory-mapped band/mask copy written by export_albedo_memmap ("" = read the GeoTIFF)
+ALBEDO_MEMMAP_DIR = r""
+_ALBEDO_BAND_FILE = "albedo_band.npy"
+_ALBEDO_MASK_FILE = "albedo_mask.npy"
+
+
+class RasterTileCache:
+    """
+    Thread-safe LRU cache of (band 1, dataset mask) tiles of an open raster.
+    Rasterio dataset handles are not thread-safe, so tile reads happen under the cache lock.
+    """
+
+    def __init__(self, src, tile_size=ALBEDO_TILE_SIZE, max_tiles=ALBEDO_TILE_CACHE_TILES):
+        self.src = src
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _tile(self, tile_row, tile_col):
+        key = (tile_row, tile_col)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+            self.misses += 1
+            row0, col0 = tile_row * self.tile_size, tile_col * self.tile_size
+            window = Window(col0, row0, min(self.tile_size, self.src.width - col0), min(self.tile_size, self.src.height - row0))
+            tile = (self.src.read(1, window=window), self.src.dataset_mask(window=window))
+            self._tiles[key] = tile
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+            return tile
+
+    def read_window(self, row_min, row_max, col_min, col_max):
+        """ (data, mask) of rows row_min:row_max and columns col_min:col_max (inside the raster) """
+        size = self.tile_size
+        data = np.empty((row_max - row_min, col_max - col_min), dtype=self.src.dtypes[0])
+        mask = np.empty(data.shape, dtype=np.uint8)
+        for tile_row in range(row_min // size, (row_max - 1) // size + 1):
+            for tile_col in range(col_min // size, (col_max - 1) // size + 1):
+                tile_data, tile_mask = self._tile(tile_row, tile_col)
+                r0, r1 = max(row_min, tile_row * size), min(row_max, (tile_row + 1) * size)
+                c0, c1 = max(col_min, tile_col * size), min(col_max, (tile_col + 1) * size)
+                src_rows = slice(r0 - tile_row * size, r1 - tile_row * size)
+                src_cols = slice(c0 - tile_col * size, c1 - tile_col * size)
+                data[r0 - row_min:r1 - row_min, c0 - col_min:c1 - col_min] = tile_data[src_rows, src_cols]
+                mask[r0 - row_min:r1 - row_min, c0 - col_min:c1 - col_min] = tile_mask[src_rows, src_cols]
+        return data, mask
+
+
+class MemmapBand:
+    """ Memory-mapped band/mask copy with the read_window interface of RasterTileCache """
+
+    def __init__(self, band_dir):
+        self.data = np.load(Path(band_dir) / _ALBEDO_BAND_FILE, mmap_mode="r")
+        self.mask = np.load(Path(band_dir) / _ALBEDO_MASK_FILE, mmap_mode="r")
+
+    def read_window(self, row_min, row_max, col_min, col_max):
+        return (np.asarray(self.data[row_min:row_max, col_min:col_max]),
+                np.asarray(self.mask[row_min:row_max, col_min:col_max]))
+
+
+def export_albedo_memmap(tif_path, out_dir=ALBEDO_MEMMAP_DIR, block_rows=512):
+    """ Offline job: write band 1 and the dataset mask of the albedo GeoTIFF as uncompressed .npy files """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    with rasterio.open(tif_path) as src:
+        data = np.lib.format.open_memmap(out / _ALBEDO_BAND_FILE, mode="w+", dtype=src.dtypes[0], shape=(src.height, src.width))
+        mask = np.lib.format.open_memmap(out / _ALBEDO_MASK_FILE, mode="w+", dtype=np.uint8, shape=(src.height, src.width))
+        for row0 in range(0, src.height, block_rows):
+            window = Window(0, row0, src.width, min(block_rows, src.height - row0))
+            data[row0:row0 + window.height] = src.read(1, window=window)
+            mask[row0:row0 + window.height] = src.dataset_mask(window=window)
+        data.flush()
+        mask.flush()
+    load_albedo_reader.cache_clear()
+    print(f"✅ Albedo band exported to {out}")
 
 # Albedo lookup function
 @lru_cache(maxsize=1)
 def load_albedo_src(tif_path):
     return rasterio.open(tif_path)
 
-# The original function was changed to use a cached file object
+@lru_cache(maxsize=1)
+def load_albedo_grid(tif_path):
+    """ (transform, height, width) of the albedo raster, read once so lookups never touch the shared handle outside the reader lock """
+    src = load_albedo_src(tif_path)
+    return src.transform, src.height, src.width
+
+@lru_cache(maxsize=1)
+def load_albedo_reader(tif_path):
+    """ Window reader of the albedo band: the memory-mapped copy when exported, else a tile cache over the GeoTIFF """
+    if ALBEDO_MEMMAP_DIR and (Path(ALBEDO_MEMMAP_DIR) / _ALBEDO_BAND_FILE).exists():
+        return MemmapBand(ALBEDO_MEMMAP_DIR)
+    return RasterTileCache(load_albedo_src(tif_path))
+
+# Reads only the (2 * ALBEDO_SEARCH_RADIUS + 1)^2 neighbourhood of the query pixel instead of the whole raster
 def get_albedo_value(tif_path, lon_deg, lat_deg):
     scaling_factor = 1.4522365285e-05
     offset = 0.52414565669
     x, y = mars_lonlat_to_meters(lon_deg, lat_deg)
-    src = load_albedo_src(tif_path)  # ✅Use cached objects instead of opening each time.
-    row, col = rowcol(src.transform, x, y)
-    data = src.read(1)
-    mask = src.dataset_mask()
+    transform, height, width = load_albedo_grid(tif_path)  # ✅Use cached objects instead of opening each time.
+    row, col = rowcol(transform, x, y)
 
-    if not (0 <= row < src.height and 0 <= col < src.width):
+    if not (0 <= row < height and 0 <= col < width):
         return None
 
+    row_min, col_min = max(0, row - ALBEDO_SEARCH_RADIUS), max(0, col - ALBEDO_SEARCH_RADIUS)
+    data, mask = load_albedo_reader(tif_path).read_window(
+        row_min, min(height, row + ALBEDO_SEARCH_RADIUS + 1),
+        col_min, min(width, col + ALBEDO_SEARCH_RADIUS + 1)
+    )
+    row, col = row - row_min, col - col_min
     raw_value = data[row, col]
     if mask[row, col] == 0:
-        raw_value = find_nearest_valid(data, mask, row, col)
+        raw_value = find_nearest_valid(data, mask, row, col, ALBEDO_SEARCH_RADIUS)
         if raw_value is None:
             return None
     return raw_value * scaling_factor + offset
@@ -189,36 +300,94 @@ def get_paleolake_context(csv_path, center_lat, center_lon, delta=2):
 def load_crater_csv(crater_csv_path: str) -> pd.DataFrame:
     return pd.read_csv(crater_csv_path, low_memory=False)
 
-def get_crater_context(crater_csv_path: str, lat: float, lon: float, delta=1.0):
-    crater_df = load_crater_csv(crater_csv_path)
-    db_lon = lon + 360 if lon < 0 else lon
-
-    nearby = crater_df[
-        crater_df['LAT_CIRC_IMG'].between(lat - delta, lat + delta) &
-        crater_df['LON_CIRC_IMG'].between(db_lon - delta, db_lon + delta)
-    ].copy()
-
-    if nearby.empty:
-        return []
-    center = (lat, db_lon)
-    nearby = nearby.dropna(subset=['LAT_CIRC_IMG', 'LON_CIRC_IMG'])
-    nearby['distance'] = nearby.apply(
-        lambda r: geodesic(center, (r['LAT_CIRC_IMG'], r['LON_CIRC_IMG'])).km,
-        axis=1
-    )
-    nearby = nearby.sort_values(by='distance').head(3)
+# Pickled crater index written by build_crater_index ("" = build it in memory from the CSV on first use)
+CRATER_INDEX_PATH = r""
+# Robbins columns copied into the index, so queries never touch the DataFrame
+CRATER_COLUMNS = ['CRATER_ID', 'LAT_CIRC_IMG', 'LON_CIRC_IMG', 'DIAM_CIRC_IMG',
+                  'INT_MORPH1', 'LAY_MORPH1', 'DEG_RIM', 'DEG_EJC', 'DEG_FLR']
+
+def _unit_vectors(lat, lon):
+    """ (N, 3) points on the unit sphere; longitude wraps and the poles need no special casing """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+def _chord_to_km(chord):
+    """ Great-circle distance on the Mars sphere of a unit-sphere chord length """
+    return 2.0 * np.arcsin(np.minimum(np.asarray(chord) / 2.0, 1.0)) * R_MARS / 1000.0
+
+def _km_to_chord(km):
+    return 2.0 * np.sin(min(km * 1000.0 / R_MARS, np.pi) / 2.0)
+
+def build_crater_index(crater_csv_path: str, out_path: str = CRATER_INDEX_PATH):
+    """
+    KD-tree over the crater centers on the unit sphere plus the CRATER_COLUMNS arrays, pickled to out_path when set.
+    Chord length is monotonic in great-circle distance, so Euclidean tree queries give exact spherical neighbours.
+    """
+    df = load_crater_csv(crater_csv_path).dropna(subset=['LAT_CIRC_IMG', 'LON_CIRC_IMG'])
+    index = {
+        "csv_path": os.path.abspath(crater_csv_path),
+        "csv_mtime": os.path.getmtime(crater_csv_path),
+        "tree": cKDTree(_unit_vectors(df['LAT_CIRC_IMG'].to_numpy(), df['LON_CIRC_IMG'].to_numpy())),
+        "columns": {c: df[c].to_numpy() for c in CRATER_COLUMNS if c in df.columns},
+    }
+    if out_path:
+        with open(out_path, "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"✅ Crater index of {len(df)} craters written to {out_path}")
+    return index
+
+@lru_cache(maxsize=1)
+def load_crater_index(crater_csv_path: str):
+    """ The persisted crater index when it was built from this CSV as it is now, else a freshly built one """
+    if CRATER_INDEX_PATH and os.path.exists(CRATER_INDEX_PATH):
+        with open(CRATER_INDEX_PATH, "rb") as f:
+            index = pickle.load(f)
+        if (index["csv_path"], index["csv_mtime"]) == (os.path.abspath(crater_csv_path), os.path.getmtime(crater_csv_path)):
+            return index
+        print("⚠️ Crater index is stale, rebuilding it")
+    return build_crater_index(crater_csv_path, CRATER_INDEX_PATH)
+
+def query_craters_radius(crater_csv_path: str, lat: float, lon: float, radius_km: float):
+    """ (index rows, great-circle km) of the craters within radius_km of (lat, lon), nearest first """
+    index = load_crater_index(crater_csv_path)
+    point = _unit_vectors(lat, lon)
+    rows = np.asarray(index["tree"].query_ball_point(point, _km_to_chord(radius_km)), dtype=np.int64)
+    dist_km = _chord_to_km(np.linalg.norm(index["tree"].data[rows] - point, axis=1))
+    order = np.argsort(dist_km, kind="stable")
+    return rows[order], dist_km[order]
+
+def query_craters_nearest(crater_csv_path: str, lat: float, lon: float, k: int = 3):
+    """ (index rows, great-circle km) of the k craters nearest to (lat, lon), nearest first """
+    index = load_crater_index(crater_csv_path)
+    k = min(k, index["tree"].n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    chord, rows = index["tree"].query(_unit_vectors(lat, lon), k=list(range(1, k + 1)))
+    return np.asarray(rows, dtype=np.int64), _chord_to_km(chord)
+
+def get_crater_context(crater_csv_path: str, lat: float, lon: float, delta=1.0, topk=3):
+    """
+    The topk craters nearest to (lat, lon) within a great-circle radius of `delta` degrees of arc on Mars,
+    correct across the 0/360 seam and near the poles (longitudes in [-180, 180] or [0, 360]).
+    """
+    radius_km = delta * DEG2RAD * R_MARS / 1000.0
+    rows, dist_km = query_craters_radius(crater_csv_path, lat, lon, radius_km)
+    columns = load_crater_index(crater_csv_path)["columns"]
     result = []
-    for _, row in nearby.iterrows():
+    for row, distance in zip(rows[:topk], dist_km[:topk]):
+        get = lambda c: columns[c][row] if c in columns else None
         info = {
-            'crater_id': row.get('CRATER_ID'),
-            'lat': row.get('LAT_CIRC_IMG'),
-            'lon': row.get('LON_CIRC_IMG'),
-            'diameter_km': row.get('DIAM_CIRC_IMG'),
-            'int_morph1': row.get('INT_MORPH1'),
-            'lay_morph1': row.get('LAY_MORPH1'),
-            'DEG_RIM': row.get('DEG_RIM'),
-            'DEG_EJC': row.get('DEG_EJC'),
-            'DEG_FLR': row.get('DEG_FLR'),
+            'crater_id': get('CRATER_ID'),
+            'lat': get('LAT_CIRC_IMG'),
+            'lon': get('LON_CIRC_IMG'),
+            'diameter_km': get('DIAM_CIRC_IMG'),
+            'int_morph1': get('INT_MORPH1'),
+            'lay_morph1': get('LAY_MORPH1'),
+            'DEG_RIM': get('DEG_RIM'),
+            'DEG_EJC': get('DEG_EJC'),
+            'DEG_FLR': get('DEG_FLR'),
+            'distance_km': float(distance),
         }
         result.append(info)
     return result
@@ -289,16 +458,19 @@ def get_valley_context(shp_path: str, lat: float, lon: float, bins_km=[0, 20, 10
 @lru_cache(maxsize=1)
 def load_elevation_src(tif_path):
     return rasterio.open(tif_path)
+# The shared handle is not thread-safe; a timed-out lookup may still be reading when the next one starts
+_elevation_lock = threading.Lock()
 # The original function was changed to use a cached object
 def get_mars_elevation_direct(tif_path, lon_deg, lat_deg):
     src = load_elevation_src(tif_path)  # ✅ Use cached objects instead of opening each time
-    row, col = rowcol(src.transform, lon_deg, lat_deg)
-    if not (0 <= row < src.height and 0 <= col < src.width):
-        print("❌ Coordinates outside image range")
-        return None
-    window = rasterio.windows.Window(col, row, 1, 1)
-    value = src.read(1, window=window)[0, 0]
-    mask_val = src.read_masks(1, window=window)[0, 0]
+    with _elevation_lock:
+        row, col = rowcol(src.transform, lon_deg, lat_deg)
+        if not (0 <= row < src.height and 0 <= col < src.width):
+            print("❌ Coordinates outside image range")
+            return None
+        window = rasterio.windows.Window(col, row, 1, 1)
+        value = src.read(1, window=window)[0, 0]
+        mask_val = src.read_masks(1, window=window)[0, 0]
     if mask_val == 0:
         print("Current pixel: NoData")
         return None
@@ -308,15 +480,91 @@ LAT_START = -90.0
 LON_START = -180.0
 NUM_COLS = int(360 / PIXEL_SIZE)
 NUM_ROWS = int(180 / PIXEL_SIZE)
+# Stacked (minerals x NUM_ROWS x NUM_COLS) float32 cube written by build_mineral_cube and memory-mapped on first use
+# ("" = stack the TES GeoTIFFs in memory); the mineral names are stored next to it in a .json file
+MINERAL_CUBE_PATH = r""
+
+@lru_cache(maxsize=4)
+def _load_tif_stack(mineral_items):
+    """ (names, (minerals x NUM_ROWS x NUM_COLS) float32 stack) of ((mineral, tif path), ...), read once """
+    bands = []
+    for mineral, tif_path in mineral_items:
+        with rasterio.open(tif_path) as src:
+            # Reverse the row direction so that row 0 corresponds to lat=-90.
+            bands.append(np.flipud(src.read(1)).astype(np.float32))
+    return [m for m, _ in mineral_items], np.stack(bands)
+
 def load_all_tifs(minerals):
     """Load all TIFFs at once and cache them"""
-    tifs = {}
-    for mineral, tif_path in minerals.items():
+    names, cube = _load_tif_stack(tuple((m, str(p)) for m, p in minerals.items()))
+    return dict(zip(names, cube))
+
+def build_mineral_cube(minerals, out_path=MINERAL_CUBE_PATH):
+    """
+    Offline job: stack the TES rasters of `minerals` (name -> tif path, e.g. geo_context_summary.minerals)
+    into an uncompressed float32 .npy cube, row 0 at lat=-90, plus the mineral order as .json
+    """
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    sidecar = out.with_suffix(".json")
+    # Written under temporary names and moved into place, so readers never map a partial cube
+    tmp_out, tmp_sidecar = out.with_name(out.name + ".tmp"), sidecar.with_name(sidecar.name + ".tmp")
+    cube = None
+    for i, (mineral, tif_path) in enumerate(minerals.items()):
         with rasterio.open(tif_path) as src:
-            band = src.read(1)
-            # Reverse the row direction so that row 0 corresponds to lat=-90.
-            tifs[mineral] = np.flipud(band)
-    return tifs
+            band = np.flipud(src.read(1))
+        if cube is None:
+            cube = np.lib.format.open_memmap(tmp_out, mode="w+", dtype=np.float32, shape=(len(minerals),) + band.shape)
+        cube[i] = band
+    cube.flush()
+    shape = cube.shape
+    del cube
+    tmp_sidecar.write_text(json.dumps(list(minerals)))
+    tmp_out.replace(out)
+    tmp_sidecar.replace(sidecar)
+    load_mineral_cube.cache_clear()
+    print(f"✅ Mineral cube {shape} written to {out}")
+
+@lru_cache(maxsize=1)
+def load_mineral_cube(cube_path):
+    """ (names, memory-mapped cube) of a cube written by build_mineral_cube """
+    names = json.loads(Path(cube_path).with_suffix(".json").read_text())
+    return names, np.load(cube_path, mmap_mode="r")
+
+def get_mineral_cube(minerals):
+    """ (names, cube) in the order of `minerals`: the memory-mapped cube when it holds exactly these minerals, else the TIFF stack """
+    if MINERAL_CUBE_PATH and Path(MINERAL_CUBE_PATH).exists():
+        if not Path(MINERAL_CUBE_PATH).with_suffix(".json").exists():
+            print("⚠️ Mineral cube has no .json mineral list, reading the TIFFs")
+        else:
+            names, cube = load_mineral_cube(MINERAL_CUBE_PATH)
+            if names == list(minerals) and cube.shape[0] == len(names):
+                return names, cube
+            print("⚠️ Mineral cube does not match the requested minerals, reading the TIFFs")
+    return _load_tif_stack(tuple((m, str(p)) for m, p in minerals.items()))
+
+def get_indices_from_latlon(lats, lons):
+    """ Vectorized get_index_from_latlon: arrays of (lat, lon) to 1-based idx, same binning and edge clamping """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if np.any((lats < -90) | (lats > 90) | (lons < -180) | (lons > 180)) or np.any(np.isnan(lats) | np.isnan(lons)):
+        raise ValueError("The input latitude and longitude are out of range: lat [-90,90], lon [-180,180]")
+    rows = np.clip(((lats - LAT_START) // PIXEL_SIZE).astype(np.int64), 0, NUM_ROWS - 1)
+    cols = np.clip(((lons - LON_START) // PIXEL_SIZE).astype(np.int64), 0, NUM_COLS - 1)
+    return rows * NUM_COLS + cols + 1
+
+def sample_mineral_abundances(lats, lons, minerals):
+    """
+    Abundances of all `minerals` at arrays of (lat, lon) in one fancy-index read.
+    Returns (idx array (N,), mineral names, float64 values (N, minerals)) with -1 / NaN cells as NaN.
+    """
+    idx = get_indices_from_latlon(lats, lons)
+    names, cube = get_mineral_cube(minerals)
+    rows, cols = (idx - 1) // NUM_COLS, (idx - 1) % NUM_COLS
+    values = np.asarray(cube[:, rows, cols], dtype=np.float64).T
+    values[values == -1] = np.nan
+    return idx, names, values
+
 def get_index_from_latlon(lat, lon):
     """
     Latitude and longitude are mapped to idx, consistent with the original database
@@ -335,16 +583,8 @@ def get_mineral_abundance(lat, lon, minerals):
     The values in dict are Python floats, -1, or NaN converted to None.
     """
     idx = get_index_from_latlon(lat, lon)
-    row = (idx - 1) // NUM_COLS
-    col = (idx - 1) % NUM_COLS
-    tifs = load_all_tifs(minerals)
-    mineral_dict = {}
-    for mineral, band in tifs.items():
-        value = band[row, col]
-        if value == -1 or np.isnan(value):
-            mineral_dict[mineral] = None
-        else:
-            mineral_dict[mineral] = float(value)
+    _, names, values = sample_mineral_abundances([lat], [lon], minerals)
+    mineral_dict = {m: None if np.isnan(v) else float(v) for m, v in zip(names, values[0])}
     if all(v is None for v in mineral_dict.values()):
         return idx, None
     else:
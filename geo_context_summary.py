@@ -1,6 +1,8 @@
 import pandas as pd
 import time
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from geo_context_loader import (
     get_geologic_epoch,
     get_albedo_value,
@@ -9,7 +11,15 @@ from geo_context_loader import (
     get_paleolake_context,
     get_crater_context,
     get_valley_context,
-    get_mineral_abundance
+    get_mineral_abundance,
+    load_geologic_dataset,
+    load_albedo_grid,
+    load_albedo_reader,
+    load_elevation_src,
+    load_paleolake_csv_cached,
+    load_crater_index,
+    load_valley_shapefile,
+    get_mineral_cube
 )
 # Set path parameters
 # Data acquisition can be found in the readme file
@@ -33,6 +43,89 @@ minerals = {
     'Quartz': data_dir / "TES_Quartz.tif"
 }
 geologic_data_path = r''
+# Feature lookups of query_all_geological_info run concurrently on this many threads
+GEO_MAX_WORKERS = 8
+# Seconds each feature lookup may take before its fallback value is used; per-feature overrides below
+GEO_FEATURE_TIMEOUT = 10.0
+GEO_FEATURE_TIMEOUTS = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+# Features whose one-time data load has run (see warm_up_geo_context)
+_warm_features = set()
+_warm_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Shared and never shut down: a timed-out lookup keeps running in the background without blocking the caller
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=GEO_MAX_WORKERS, thread_name_prefix="geo-feature")
+    return _executor
+
+
+def _feature_loaders():
+    """ feature -> its one-time data load (file parsing, index build, raster stack); HiRISE is a web search and has none """
+    return {
+        "epoch": lambda: load_geologic_dataset(geologic_data_path),
+        "albedo": lambda: (load_albedo_grid(albedo_tif_path), load_albedo_reader(albedo_tif_path)),
+        "elevation": lambda: load_elevation_src(elevation_tif_path),
+        "paleolake": lambda: load_paleolake_csv_cached(paleolake_csv_path),
+        "crater": lambda: load_crater_index(crater_csv_path),
+        "valley": lambda: load_valley_shapefile(valley_shp_path),
+        "mineral": lambda: get_mineral_cube(minerals),
+    }
+
+
+def warm_up_geo_context(features=None):
+    """
+    Run the one-time data loads of `features` (all by default) concurrently and without a timeout.
+    query_all_geological_info calls it for its features, so a first load never counts against the lookup
+    timeouts; call it at startup to move that cost out of the first question. Returns load seconds per feature.
+    """
+    loaders = _feature_loaders()
+    with _warm_lock:
+        pending = [f for f in (features or loaders) if f in loaders and f not in _warm_features]
+        if not pending:
+            return {}
+        started = time.perf_counter()
+        futures = {f: _get_executor().submit(_timed, loaders[f]) for f in pending}
+        seconds = {}
+        for f in pending:
+            _, seconds[f], error = futures[f].result()
+            if error is not None:
+                print(f"⚠️ Geo feature '{f}' data failed to load ({error})")
+            # Marked warm either way: a missing file fails the same way on every call
+            _warm_features.add(f)
+        print(f"🛠️ Geological data loaded in {time.perf_counter() - started:.3f}s: "
+              f"{ {f: round(t, 3) for f, t in seconds.items()} }")
+    return seconds
+
+
+def _feature_lookups(lat, lon):
+    """ feature -> (lookup returning its result fields, fallback fields used on timeout or error) """
+    def hirise():
+        delta, all_images, top3 = get_hirise_context(lat, lon)
+        return {"hirise_delta": delta, "hirise_all": all_images, "hirise_top3": top3}
+
+    def mineral():
+        idx, data = get_mineral_abundance(lat, lon, minerals)
+        return {"mineral_idx": idx, "mineral_data": data}
+
+    return {
+        "epoch": (lambda: {"epoch": get_geologic_epoch(lon, lat, geologic_data_path)}, {"epoch": None}),
+        "albedo": (lambda: {"albedo": get_albedo_value(albedo_tif_path, lon, lat)}, {"albedo": None}),
+        "elevation": (lambda: {"elevation": get_mars_elevation_direct(elevation_tif_path, lon, lat)}, {"elevation": None}),
+        "hirise": (hirise, {"hirise_delta": None, "hirise_all": [], "hirise_top3": []}),
+        "paleolake": (lambda: {"paleolakes": get_paleolake_context(paleolake_csv_path, lat, lon)}, {"paleolakes": []}),
+        "crater": (lambda: {"craters": get_crater_context(crater_csv_path, lat, lon)}, {"craters": []}),
+        "valley": (lambda: {"valley_groups": get_valley_context(valley_shp_path, lat, lon, bins_km=[0, 20, 100])},
+                   {"valley_groups": []}),
+        "mineral": (mineral, {"mineral_idx": None, "mineral_data": None}),
+    }
+
 
 def summarize_geological_context(
         epoch=None,
@@ -115,58 +208,50 @@ def query_all_geological_info(lat, lon, features=None):
     """
     Selectively query geological context information based on the parameter.
     features: list, for example ["epoch", "albedo", "elevation"].
+    The lookups run concurrently; one that exceeds its timeout (GEO_FEATURE_TIMEOUTS / GEO_FEATURE_TIMEOUT)
+    or raises contributes its fallback fields instead. Data loads on first use are not timed (warm_up_geo_context).
+    results["timings"] maps each feature to {"seconds", "status": "ok" | "timeout" | "error"}, plus the
+    overall "wall_seconds".
     """
     if features is None:
         features = ["epoch", "albedo", "elevation", "hirise", "paleolake", "crater", "valley", "mineral"]
 
+    lookups = _feature_lookups(lat, lon)
+    selected = [f for f in lookups if f in features]
+    warm_up_geo_context(selected)
+    executor = _get_executor()
+    started = time.perf_counter()
+    futures = {f: executor.submit(_timed, lookups[f][0]) for f in selected}
+
     results = {}
     timings = {}
-    if "epoch" in features:
-        t0 = time.time()
-        results["epoch"] = get_geologic_epoch(lon, lat, geologic_data_path)
-        timings["epoch"] = time.time() - t0
-
-    if "albedo" in features:
-        t0 = time.time()
-        results["albedo"] = get_albedo_value(albedo_tif_path, lon, lat)
-        timings["albedo"] = time.time() - t0
-
-    if "elevation" in features:
-        t0 = time.time()
-        results["elevation"] = get_mars_elevation_direct(elevation_tif_path, lon, lat)
-        timings["elevation"] = time.time() - t0
-
-    if "hirise" in features:
-        t0 = time.time()
-        results["hirise_delta"], results["hirise_all"], results["hirise_top3"] = get_hirise_context(lat, lon)
-        timings["hirise"] = time.time() - t0
-
-    if "paleolake" in features:
-        t0 = time.time()
-        results["paleolakes"] = get_paleolake_context(paleolake_csv_path, lat, lon)
-        timings["paleolake"] = time.time() - t0
-
-    if "crater" in features:
-        t0 = time.time()
-        results["craters"] = get_crater_context(crater_csv_path, lat, lon)
-        timings["crater"] = time.time() - t0
-
-    if "valley" in features:
-        t0 = time.time()
-        results["valley_groups"] = get_valley_context(valley_shp_path, lat, lon, bins_km=[0, 20, 100])
-        timings["valley"] = time.time() - t0
-
-    if "mineral" in features:
-        t0 = time.time()
-        results["mineral_idx"], results["mineral_data"] = get_mineral_abundance(lat, lon, minerals)
-        timings["mineral"] = time.time() - t0
-
-    # Printing time information
-    print("⏱The time taken for each module is as follows (in seconds):")
-    for k, v in timings.items():
-        print(f"  {k:<15}: {v:.3f}")
+    # Collect in deadline order so every feature waits at most its own timeout measured from submission
+    for f in sorted(selected, key=lambda f: GEO_FEATURE_TIMEOUTS.get(f, GEO_FEATURE_TIMEOUT)):
+        remaining = started + GEO_FEATURE_TIMEOUTS.get(f, GEO_FEATURE_TIMEOUT) - time.perf_counter()
+        try:
+            fields, seconds, error = futures[f].result(timeout=max(remaining, 0.0))
+            status = "ok" if error is None else "error"
+            if error is not None:
+                print(f"⚠️ Geo feature '{f}' failed ({error}), using its fallback value")
+        except FutureTimeoutError:
+            fields, seconds, status = None, time.perf_counter() - started, "timeout"
+            print(f"⚠️ Geo feature '{f}' timed out, using its fallback value")
+        timings[f] = {"seconds": seconds, "status": status}
+        results.update(fields if status == "ok" else lookups[f][1])
+    timings["wall_seconds"] = time.perf_counter() - started
+    results["timings"] = timings
+    print(f"⏱ Geological context: {timings['wall_seconds']:.3f}s wall for {len(selected)} features")
     return results
 
+
+def _timed(lookup):
+    """ (fields, seconds, error message or None) of one feature lookup """
+    t0 = time.perf_counter()
+    try:
+        return lookup(), time.perf_counter() - t0, None
+    except Exception as e:
+        return None, time.perf_counter() - t0, str(e) or type(e).__name__
+
 def format_question_with_context(question: str, context: dict, include: list = None) -> str:
     """
     This appends the specified fields to the question text. `include` specifies the list of fields to include (defaults to `['epoch', 'hirise_top3']`).
@@ -0,0 +1,49 @@
+"""
+Graph backend switch.
+"neo4j"    : every lookup is a Cypher query against the live database (graph_query.py).
+"snapshot" : the same lookups are answered from the local CSR snapshot (graph_snapshot.py),
+             exported beforehand with `python graph_snapshot.py`.
+Modules that need graph data import from here instead of from a concrete backend.
+"""
+GRAPH_BACKEND = "neo4j"
+
+if GRAPH_BACKEND == "snapshot":
+    from graph_snapshot import (
+        query_direct_description,
+        query_direct_neighbors,
+        query_direct_neighbors_many,
+        query_direct_genesis_neighbors,
+        query_khop_paths,
+        query_khop_paths_ranked,
+        iter_khop_paths,
+        query_khop_paths_many,
+        query_relation_between,
+        query_relations_between,
+        query_genesis_triples_for,
+        query_node_labels_and_neighbors,
+        query_labels_and_degrees,
+        get_topic_entities,
+        query_one_hop_edges_undirected,
+        query_one_hop_edges_with_raw_direction
+    )
+elif GRAPH_BACKEND == "neo4j":
+    from graph_query import (
+        query_direct_description,
+        query_direct_neighbors,
+        query_direct_neighbors_many,
+        query_direct_genesis_neighbors,
+        query_khop_paths,
+        query_khop_paths_ranked,
+        iter_khop_paths,
+        query_khop_paths_many,
+        query_relation_between,
+        query_relations_between,
+        query_genesis_triples_for,
+        query_node_labels_and_neighbors,
+        query_labels_and_degrees,
+        get_topic_entities,
+        query_one_hop_edges_undirected,
+        query_one_hop_edges_with_raw_direction
+    )
+else:
+    raise ValueError(f"Unsupported graph backend: {GRAPH_BACKEND}")
@@ -0,0 +1,196 @@
+import sys
+import time
+import inspect
+import threading
+import numpy as np
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+# Default byte budget of every graph result cache (embedding arrays included, memory-mapped views excluded)
+GRAPH_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Default time-to-live of a cached result, in seconds (None = never expires)
+GRAPH_CACHE_TTL = 3600.0
+
+MISSING = object()
+_caches: Dict[str, "GraphResultCache"] = {}
+
+
+class _FrozenList(tuple):
+    """ Frozen list; kept apart from frozen tuples so views restore the original type """
+
+
+def freeze(value: Any) -> Any:
+    """
+    Immutable copy of a query result: dicts become read-only mappings, lists and tuples become tuples and
+    numpy arrays become read-only views (no data is copied).
+    """
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return _FrozenList(freeze(v) for v in value)
+    if isinstance(value, tuple):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, np.ndarray) and value.flags.writeable:
+        value = value.view()
+        value.flags.writeable = False
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """ One-level mutable copy: a frozen mapping becomes a dict, a frozen list a list """
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    if isinstance(value, _FrozenList):
+        return list(value)
+    return value
+
+
+def _record_view(record: MappingProxyType) -> Dict[str, Any]:
+    return {k: _thaw(v) for k, v in record.items()}
+
+
+def view(frozen: Any) -> Any:
+    """
+    Copy of a frozen result handed to callers, with the types the query function returned.
+    Records become new dicts whose list fields are new lists, so callers may annotate or extend them
+    without touching the cache; deeper values are shared with the cache (numpy arrays stay read-only).
+    A top-level sequence is copied the same way, record by record.
+    """
+    if isinstance(frozen, MappingProxyType):
+        return _record_view(frozen)
+    if isinstance(frozen, tuple):
+        items = [_record_view(v) if isinstance(v, MappingProxyType) else _thaw(v) for v in frozen]
+        return items if isinstance(frozen, _FrozenList) else tuple(items)
+    return frozen
+
+
+def _is_memory_mapped(array: np.ndarray) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base if isinstance(array.base, np.ndarray) else None
+    return False
+
+
+def estimate_nbytes(value: Any) -> int:
+    """ Approximate resident size of a result; memory-mapped arrays cost nothing (they live in the page cache) """
+    if isinstance(value, np.ndarray):
+        return 0 if _is_memory_mapped(value) else value.nbytes
+    if isinstance(value, Mapping):
+        return sys.getsizeof(value) + sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class GraphResultCache:
+    """
+    Thread-safe LRU cache of frozen graph query results, bounded by total bytes instead of entry count.
+    Entries older than ttl seconds are treated as misses.
+    """
+
+    def __init__(self, name: str, max_bytes: int = GRAPH_CACHE_MAX_BYTES, ttl: Optional[float] = GRAPH_CACHE_TTL):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.oversized = 0
+
+    def get(self, key: Tuple) -> Any:
+        """ Frozen value of key, or MISSING """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple, value: Any) -> Any:
+        """ Freeze and store value (unless it alone exceeds the budget); returns the frozen value """
+        frozen = freeze(value)
+        nbytes = estimate_nbytes(frozen)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if nbytes > self.max_bytes:
+                self.oversized += 1
+                return frozen
+            self._entries[key] = (frozen, nbytes, expires)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return frozen
+
+    def _remove(self, key: Tuple) -> None:
+        _, nbytes, _ = self._entries.pop(key)
+        self.bytes -= nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "oversized": self.oversized,
+            }
+
+
+def graph_cache(max_bytes: int = GRAPH_CACHE_MAX_BYTES, ttl: Optional[float] = GRAPH_CACHE_TTL) -> Callable:
+    """
+    Decorator replacing lru_cache on graph lookups. Results are cached frozen and every call returns a fresh
+    view (see view()), so callers may annotate records (path["score"] = ...) without touching the cache.
+    The cache key is the tuple of bound arguments with defaults applied, e.g. (start, k) for query_khop_paths.
+    """
+    def decorate(func: Callable) -> Callable:
+        cache = GraphResultCache(func.__name__, max_bytes, ttl)
+        _caches[cache.name] = cache
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = bound.args
+            frozen = cache.get(key)
+            if frozen is MISSING:
+                frozen = cache.put(key, func(*args, **kwargs))
+            return view(frozen)
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+        wrapper.cache_info = cache.stats
+        return wrapper
+    return decorate
+
+
+def graph_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """ Counters of every graph result cache, keyed by function name """
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def clear_graph_caches() -> None:
+    for cache in _caches.values():
+        cache.clear()
@@ -1,178 +1,572 @@
-from neo4j import GraphDatabase
+import time
+from neo4j import GraphDatabase, Query
+from neo4j.exceptions import TransientError, ServiceUnavailable, SessionExpired
 import numpy as np
-from typing import List, Dict, Any, Tuple
-from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Optional, Iterator
+from graph_cache import graph_cache, view, MISSING
+from node_embedding_store import get_node_embedding_store
+from entity_names import resolve_name_key, ENTITY_LABEL, NAME_KEY_PROPERTY, NAME_KEY_INDEX
+from khop_path_table import table_khop_paths
+import node_degrees
+from node_degrees import fanout_for, IMPORTANCE_PROPERTY
 # Neo4j settings
-_driver = GraphDatabase.driver("bolt://localhost:7687", auth=("username", "password"))
+NEO4J_URI = "bolt://localhost:7687"
+NEO4J_AUTH = ("username", "password")
+# Connection pool of the synchronous driver, shared by the retrieval worker threads of the async layer
+NEO4J_POOL_SIZE = 50
+# Seconds to wait for a free pooled connection
+NEO4J_ACQUIRE_TIMEOUT = 30.0
+_driver = GraphDatabase.driver(NEO4J_URI, auth=NEO4J_AUTH, max_connection_pool_size=NEO4J_POOL_SIZE,
+                               connection_acquisition_timeout=NEO4J_ACQUIRE_TIMEOUT)
 # Enter your neo4j username and password
+# Server-side transaction timeout of every read, in seconds (None = server default); shared with graph_query_async
+QUERY_TIMEOUT = 30.0
+# Retries of a read on transient errors, with exponential backoff starting at RETRY_BACKOFF seconds
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.2
+# Match entities on the indexed :Entity(name_key) property written by entity_names.migrate_name_keys
+# (`python entity_names.py`); without its index lookups fall back to case-insensitive name matching
+USE_NAME_KEY_INDEX = False
+# Return node ids only and read embeddings from the memory-mapped store (see node_embedding_store.py)
+USE_EMBEDDING_STORE = False
+# Serve query_khop_paths from the materialized path table (see khop_path_table.py) for the hop counts it covers
+USE_PATH_TABLE = False
 
-@lru_cache(maxsize=128)
-def query_direct_description(entity_name: str) -> str:
+
+_RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+
+class _Records(list):
+    """ Eagerly read records; single() like neo4j's Result """
+
+    def single(self):
+        return self[0] if self else None
+
+
+def _read(cypher: str, **params) -> _Records:
+    """ Run one read query on a pooled session with QUERY_TIMEOUT and return all records, retrying transient failures """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with _driver.session() as session:
+                return _Records(session.run(Query(cypher, timeout=QUERY_TIMEOUT), **params))
+        except _RETRYABLE_ERRORS as e:
+            if attempt >= MAX_RETRIES:
+                raise
+            delay = RETRY_BACKOFF * (2 ** attempt)
+            print(f"⚠️ Transient Neo4j error, retry {attempt + 1}/{MAX_RETRIES} in {delay:.2f}s: {e}")
+            time.sleep(delay)
+
+
+# Seconds between re-checks of an index that was not online yet (e.g. while entity_names.py is still populating it)
+NAME_KEY_RECHECK_SECONDS = 60.0
+_name_key_online = False
+_name_key_checked_at: Optional[float] = None
+
+
+def _use_name_key() -> bool:
     """
-    Query the description field of a specific entity
+    Whether entity lookups use :Entity(name_key): USE_NAME_KEY_INDEX is set and the index is online.
+    An online index is remembered; otherwise the check is repeated every NAME_KEY_RECHECK_SECONDS.
+    """
+    global _name_key_online, _name_key_checked_at
+    if not USE_NAME_KEY_INDEX:
+        return False
+    if _name_key_online:
+        return True
+    now = time.monotonic()
+    if _name_key_checked_at is None or now - _name_key_checked_at >= NAME_KEY_RECHECK_SECONDS:
+        first_check = _name_key_checked_at is None
+        _name_key_checked_at = now
+        record = _read("SHOW INDEXES YIELD name, state WHERE name = $name RETURN state", name=NAME_KEY_INDEX).single()
+        _name_key_online = record is not None and record["state"] == "ONLINE"
+        if _name_key_online and not first_check:
+            print(f"✅ Index {NAME_KEY_INDEX} is online, matching entities by name_key")
+        elif not _name_key_online and first_check:
+            print(f"⚠️ Index {NAME_KEY_INDEX} is not online (run `python entity_names.py`), matching entities by name")
+    return _name_key_online
+
+
+def _lookup_key(name: Optional[str]) -> str:
+    """ Lookup parameter of an entity name: its resolved name key, or its lower-cased name without the index """
+    return resolve_name_key(name) if _use_name_key() else (name or "").lower()
+
+
+def _match_entity(var: str, key: str) -> str:
+    """ MATCH clause binding node `var` to the entity whose lookup key (see _lookup_key) is the Cypher expression `key` """
+    if _use_name_key():
+        return f"MATCH ({var}:{ENTITY_LABEL} {{{NAME_KEY_PROPERTY}: {key}}})"
+    return f"MATCH ({var}) WHERE toLower({var}.name) = {key}"
+
+
+def _name_expr(var: str) -> str:
+    """ Cypher expression of the normalized name of node `var`, for distinct-node checks """
+    return f"{var}.{NAME_KEY_PROPERTY}" if _use_name_key() else f"toLower({var}.name)"
+
+
+def _name_items(names: List[str]) -> List[Dict[str, str]]:
+    """ UNWIND parameter for batched lookups: the caller's name together with its lookup key """
+    return [{"name": n, "key": _lookup_key(n)} for n in names]
+
+
+def _emb_return(var: str) -> str:
+    """ RETURN items carrying the embeddings of node `var`: its element id when the store is used, the vectors otherwise """
+    if USE_EMBEDDING_STORE:
+        return f"elementId({var}) AS node_id"
+    return f"{var}.gnn_embedding_v1 AS desc_emb, {var}.paragraph_embedding_v1 AS para_emb"
+
+
+def _node_projection(var: str) -> str:
+    """ Map projection of a path node: name, texts and either its element id or its embeddings """
+    if USE_EMBEDDING_STORE:
+        return f"{var} {{.name, .description, .paragraph, node_id: elementId({var})}}"
+    return f"{var} {{.name, .description, .paragraph, desc_emb: {var}.gnn_embedding_v1, para_emb: {var}.paragraph_embedding_v1}}"
+
+
+def _embedded(var: str) -> str:
+    return f"{var}.gnn_embedding_v1 IS NOT NULL AND {var}.paragraph_embedding_v1 IS NOT NULL"
+
+
+def _rank_expression(var: str, order: str) -> str:
+    """ Cypher expression ranking neighbour `var` under a fan-out cap (higher is kept first) """
+    if order == "similarity":
+        fn = node_degrees.VECTOR_SIMILARITY_FUNCTION
+        return f"{fn}({var}.gnn_embedding_v1, $query_vec) + {fn}({var}.paragraph_embedding_v1, $query_vec)"
+    return f"coalesce({var}.{IMPORTANCE_PROPERTY}, 0.0)"
+
+
+def _hop_match(src: str, rel: str, dst: str, where: str, carried: str, cap: Optional[int], order: str = "importance") -> str:
+    """
+    One expansion hop (src)-[rel]-(dst). Under a fan-out cap it becomes a CALL subquery that keeps
+    only the `cap` best-ranked neighbours of each incoming row, so hub nodes cost at most `cap` rows.
+    """
+    if cap is None:
+        return f"""
+    MATCH ({src})-[{rel}]-({dst})
+    WHERE {where}"""
+    return f"""
+    CALL {{
+        WITH {carried}
+        MATCH ({src})-[{rel}]-({dst})
+        WHERE {where}
+        RETURN {rel}, {dst}
+        ORDER BY {_rank_expression(dst, order)} DESC
+        LIMIT {cap}
+    }}"""
+
+
+def _dot_expression(var: str) -> str:
+    """ Cypher expression of q·desc + q·para of node `var` with q = $query_vec, the per-node term of link_scorer.score_path """
+    return " + ".join(
+        f"reduce(s = 0.0, i IN range(0, size({var}.{prop}) - 1) | s + {var}.{prop}[i] * $query_vec[i])"
+        for prop in ("gnn_embedding_v1", "paragraph_embedding_v1")
+    )
+
+
+def _vector_param(query_vec: np.ndarray) -> List[float]:
+    return np.ravel(query_vec).astype(float).tolist()
+
+
+def _embeddings_of(item) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (desc_emb, para_emb) of a record or projected node.
+    With the store enabled these are zero-copy views of the memory-mapped matrix.
     """
-    query = """
-    MATCH (n)
-    WHERE toLower(n.name) = toLower($name)
+    if USE_EMBEDDING_STORE:
+        store = get_node_embedding_store()
+        row = store.row_of(item["node_id"])
+        if row is None:
+            print(f"⚠️ Node is missing from the embedding store, skipped: {item['name']}")
+            return None
+        return store.desc(row), store.para(row)
+    return np.array(item["desc_emb"], dtype=np.float32), np.array(item["para_emb"], dtype=np.float32)
+
+
+# Cypher shared with the async layer (graph_query_async.py)
+def _description_cypher() -> str:
+    return f"""
+    {_match_entity("n", "$key")}
     RETURN n.description AS description
     LIMIT 1
     """
-    with _driver.session() as session:
-        result = session.run(query, name=entity_name).single()
-        return result["description"] if result and result["description"] else ""
 
+
+def _genesis_key(mineral: str) -> str:
+    """ Lookup parameter of _genesis_triples_cypher: the name key with the index, else the exact mineral name """
+    return resolve_name_key(mineral) if _use_name_key() else mineral
+
+
+def _genesis_triples_cypher() -> str:
+    # Exact name match without the index, as genesis triples were always looked up
+    match = _match_entity("m", "$key") if _use_name_key() else "MATCH (m) WHERE m.name = $key"
+    return f"""
+    {match}
+    MATCH (m)-[r]->(g:genesis)
+    RETURN m.name AS head, type(r) AS rel, g.name AS tail, r.source AS source, r.paragraph AS paragraph
+    """
+
+
+def _direct_neighbors_cypher() -> str:
+    cap = fanout_for(1)
+    limit = f"ORDER BY {_rank_expression('m', 'importance')} DESC LIMIT {cap}" if cap is not None else ""
+    return f"""
+    {_match_entity("n", "$key")}
+    MATCH (n)-[r]-(m)
+    WHERE m.gnn_embedding_v1 IS NOT NULL AND m.paragraph_embedding_v1 IS NOT NULL
+    RETURN m.name AS name,
+           type(r) AS rel_type,
+           r.source AS source,
+           {_emb_return("m")},
+           m.description AS description,
+           m.paragraph AS paragraph
+    {limit}
+    """
+
+
+def _genesis_triple_from_record(record) -> Dict[str, Any]:
+    return {
+        "triple": (record["head"], record["rel"], record["tail"]),
+        "source": record["source"],
+        "paragraph": record["paragraph"]
+    }
+
+
+@graph_cache(max_bytes=16 * 1024 * 1024)
+def query_direct_description(entity_name: str) -> str:
+    """
+    Query the description field of a specific entity
+    """
+    result = _read(_description_cypher(), key=_lookup_key(entity_name)).single()
+    return result["description"] if result and result["description"] else ""
+
+@graph_cache()
 def query_direct_neighbors(entity_name: str) -> List[Dict[str, Any]]:
     """
     Returns the 1-hop neighbors connected to the specified entity, along with the corresponding triples and source.
     """
-    query = """
-    MATCH (n)-[r]-(m)
-    WHERE toLower(n.name) = toLower($name)
-      AND m.gnn_embedding_v1 IS NOT NULL AND m.paragraph_embedding_v1 IS NOT NULL
-    RETURN m.name AS name,
+    records = _read(_direct_neighbors_cypher(), key=_lookup_key(entity_name))
+    neighbors = []
+    for r in records:
+        neighbor = _neighbor_from_record(r, entity_name)
+        if neighbor is not None:
+            neighbors.append(neighbor)
+    return neighbors
+
+
+def _neighbor_from_record(r, entity_name: str) -> Optional[Dict[str, Any]]:
+    embs = _embeddings_of(r)
+    if embs is None:
+        return None
+    return {
+        "name": r["name"],
+        "desc_emb": embs[0],
+        "para_emb": embs[1],
+        "description": r.get("description", ""),
+        "paragraph": r.get("paragraph", ""),
+        "triple": (entity_name, r["rel_type"], r["name"]),
+        "source": r.get("source", "unknown")  # ✅ 加入三元组的关系来源
+    }
+
+
+def query_direct_neighbors_many(entity_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Batched query_direct_neighbors for a whole search frontier in one UNWIND round trip.
+    Each neighbor dict additionally carries the neighbor's "labels" and "raw_triple", the relationship
+    in its stored direction (like query_one_hop_edges_with_raw_direction).
+    Return: {entity: [neighbor dict, ...]} keyed by the entity names exactly as given.
+    """
+    names = list(dict.fromkeys(n for n in entity_names if n))
+    results = {n: [] for n in names}
+    if not names:
+        return results
+    query = f"""
+    UNWIND $items AS item
+    {_match_entity("n", "item.key")}
+    {_hop_match("n", "r", "m", _embedded("m"), "n", fanout_for(1))}
+    RETURN item.name AS entity,
+           m.name AS name,
+           labels(m) AS labels,
            type(r) AS rel_type,
+           startNode(r).name AS head,
+           endNode(r).name AS tail,
            r.source AS source,
-           m.gnn_embedding_v1 AS desc_emb,
-           m.paragraph_embedding_v1 AS para_emb,
+           {_emb_return("m")},
            m.description AS description,
            m.paragraph AS paragraph
     """
-    with _driver.session() as session:
-        records = session.run(query, name=entity_name)
-        neighbors = []
-        for r in records:
-            neighbors.append({
-                "name": r["name"],
-                "desc_emb": np.array(r["desc_emb"], dtype=np.float32),
-                "para_emb": np.array(r["para_emb"], dtype=np.float32),
-                "description": r.get("description", ""),
-                "paragraph": r.get("paragraph", ""),
-                "triple": (entity_name, r["rel_type"], r["name"]),
-                "source": r.get("source", "unknown")  # ✅ 加入三元组的关系来源
-            })
-        return neighbors
+    for r in _read(query, items=_name_items(names)):
+        neighbor = _neighbor_from_record(r, r["entity"])
+        if neighbor is not None:
+            neighbor["labels"] = r["labels"]
+            neighbor["raw_triple"] = (r["head"], r["rel_type"], r["tail"])
+            results[r["entity"]].append(neighbor)
+    return results
 
 
 def query_direct_genesis_neighbors(entity_name: str) -> List[Dict[str, Any]]:
     """
     Returns a 1-hop neighborhood of type genesis.
     """
-    query = """
-       MATCH (n) WHERE toLower(n.name) = toLower($name)
+    query = f"""
+       {_match_entity("n", "$key")}
        MATCH (n)--(m:genesis)
        WHERE m.gnn_embedding_v1 IS NOT NULL AND m.paragraph_embedding_v1 IS NOT NULL
        RETURN m.name AS name,
-              m.gnn_embedding_v1 AS desc_emb,
-              m.paragraph_embedding_v1 AS para_emb,
+              {_emb_return("m")},
               m.description AS description,
               m.paragraph AS paragraph
     """
-    with _driver.session() as session:
-        records = session.run(query, name=entity_name)
-        neighbors = []
-        for r in records:
-            neighbors.append({
-                "name": r["name"],
-                "desc_emb": np.array(r["desc_emb"], dtype=np.float32),
-                "para_emb": np.array(r["para_emb"], dtype=np.float32),
-                "description": r.get("description", ""),
-                "paragraph": r.get("paragraph", "")
-            })
-        return neighbors
-
-@lru_cache(maxsize=1024)
+    records = _read(query, key=_lookup_key(entity_name))
+    neighbors = []
+    for r in records:
+        embs = _embeddings_of(r)
+        if embs is None:
+            continue
+        neighbors.append({
+            "name": r["name"],
+            "desc_emb": embs[0],
+            "para_emb": embs[1],
+            "description": r.get("description", ""),
+            "paragraph": r.get("paragraph", "")
+        })
+    return neighbors
+
+@graph_cache()
 def query_khop_paths(start: str, k: int) -> List[Dict[str, Any]]:
     """
     Expand the k-hop paths of a given entity, including all entity information, relation types, and source.
     Return: path (list of names), desc/para embedding lists, triples, source, description, paragraph.
     """
-    query = f"""
-    MATCH (start) WHERE toLower(start.name) = toLower($name)
+    if USE_PATH_TABLE:
+        paths = table_khop_paths(start, k)
+        if paths is not None:
+            return paths
+    query = _khop_cypher(k)
+    records = _read(query, key=_lookup_key(start))
+    results = [p for p in (_parse_path_record(record) for record in records) if p is not None]
+    return results
+
+
+def _khop_cypher(k: int, batched: bool = False, order: str = "importance", caps: Optional[List[Optional[int]]] = None,
+                 sort_by_score: bool = False) -> str:
+    """
+    Cypher for simple k-hop expansions; the batched form UNWINDs $items ({name, key}) and also returns the start name.
+    Without fan-out caps (node_degrees.HUB_FANOUT, or `caps`) this is one variable-length match;
+    with caps, or when ranking by similarity to $query_vec, the path is expanded hop by hop with a capped subquery per hop.
+    sort_by_score (similarity order only) streams the paths best first by their score_path score, the summed dot
+    products of the query vector with every node's embeddings (exact for unnormalized embeddings too).
+    """
+    if batched:
+        head = f"""
+    UNWIND $items AS item
+    {_match_entity("start", "item.key")}"""
+        ret = "RETURN item.name AS name, "
+    else:
+        head = f"""
+    {_match_entity("start", "$key")}"""
+        ret = "RETURN "
+    if order == "similarity" or any(fanout_for(hop, caps) is not None for hop in range(1, k + 1)):
+        nodes = ["start"] + [f"n{hop}" for hop in range(1, k + 1)]
+        rels = [f"r{hop}" for hop in range(1, k + 1)]
+        body = f"""
+    WITH {"item, " if batched else ""}start
+    WHERE {_embedded("start")}"""
+        for hop in range(1, k + 1):
+            src, dst = nodes[hop - 1], nodes[hop]
+            seen_keys = ", ".join(_name_expr(n) for n in nodes[:hop])
+            where = f"{_embedded(dst)} AND NOT {_name_expr(dst)} IN [{seen_keys}]"
+            body += _hop_match(src, rels[hop - 1], dst, where, ", ".join(nodes[:hop]), fanout_for(hop, caps), order)
+        sort = ""
+        if sort_by_score and order == "similarity":
+            sort = f"ORDER BY {' + '.join(_dot_expression(n) for n in nodes)} DESC"
+        return head + body + f"""
+    {ret}[n IN [{", ".join(nodes)}] | {_node_projection('n')}] AS path_nodes,
+    [r IN [{", ".join(rels)}] | {{head: startNode(r).name, type: type(r), tail: endNode(r).name, source: r.source}}] AS rels
+    {sort}
+    """
+    # Only the needed fields are shipped: projected nodes and (head, type, tail, source) per relationship
+    ret += (
+        f"[n IN nds | {_node_projection('n')}] AS path_nodes, "
+        "[r IN relationships(p) | {head: startNode(r).name, type: type(r), tail: endNode(r).name, source: r.source}] AS rels"
+    )
+    return head + f"""
     MATCH p=(start)-[*1..{k}]-(end)
     WHERE ALL(n IN nodes(p) WHERE n.gnn_embedding_v1 IS NOT NULL AND n.paragraph_embedding_v1 IS NOT NULL)
       AND size(nodes(p)) = {k + 1}
-      AND ALL(i IN range(0, size(nodes(p))-2) WHERE toLower(nodes(p)[i].name) <> toLower(nodes(p)[i+1].name))
-    WITH p, [n IN nodes(p) | toLower(n.name)] AS name_lowers, nodes(p) AS nds
-    WHERE size(name_lowers) = size(apoc.coll.toSet(name_lowers))  
-    RETURN nds AS path_nodes, relationships(p) AS rels
+      AND ALL(i IN range(0, size(nodes(p))-2) WHERE {_name_expr("nodes(p)[i]")} <> {_name_expr("nodes(p)[i+1]")})
+    WITH {"item, " if batched else ""}p, [n IN nodes(p) | {_name_expr("n")}] AS name_keys, nodes(p) AS nds
+    WHERE size(name_keys) = size(apoc.coll.toSet(name_keys))
+    {ret}
     """
-    results = []
+
+
+def _parse_path_record(record) -> Optional[Dict[str, Any]]:
+    """
+    Convert one (path_nodes, rels) record into the path dict used by path_selector.
+    Returns None for closed loops or records that cannot be parsed.
+    """
+    try:
+        nodes = record["path_nodes"]
+        rels = record["rels"]
+        path, desc_embs, para_embs = [], [], []
+        descriptions, paragraphs = [], []
+        triples, sources = [], []
+
+        for node in nodes:
+            embs = _embeddings_of(node)
+            if embs is None:
+                return None
+            path.append(node["name"])
+            desc_embs.append(embs[0])
+            para_embs.append(embs[1])
+            descriptions.append(node["description"] or "")
+            paragraphs.append(node["paragraph"] or "")
+
+        if len(set(name.lower() for name in path)) < len(path):
+            print(f"[!!!Skip closed loop path]: {path}")
+            return None
+
+        for rel in rels:
+            triples.append((rel["head"], rel["type"], rel["tail"]))
+            sources.append(rel["source"] if rel["source"] is not None else "unknown")
+
+        seen_set = set()
+        triples_dedup, sources_dedup = [], []
+        for t, s in zip(triples, sources):
+            key = (t[0].lower(), t[1], t[2].lower())
+            if key not in seen_set:
+                seen_set.add(key)
+                triples_dedup.append(t)
+                sources_dedup.append(s)
+
+        return {
+            "path": path,
+            "desc_embs": desc_embs,
+            "para_embs": para_embs,
+            "descriptions": descriptions,
+            "paragraphs": paragraphs,
+            "triples": triples_dedup,
+            "sources": sources_dedup
+        }
+    except Exception as e:
+        print("[!]Path resolution failed:", e)
+        return None
+
+
+def query_khop_paths_ranked(start: str, k: int, query_vec: np.ndarray, fanout: Optional[List[Optional[int]]] = None) -> List[Dict[str, Any]]:
+    """
+    k-hop paths where every hop keeps only the neighbours most similar to query_vec, selected server-side
+    with per-hop caps (`fanout`, default node_degrees.HUB_FANOUT). Not cached: the result depends on the query.
+    Without any cap every path is kept, so the cached, unranked query_khop_paths answers instead.
+    """
+    if all(fanout_for(hop, fanout) is None for hop in range(1, k + 1)):
+        return query_khop_paths(start, k)
+    query = _khop_cypher(k, order="similarity", caps=fanout)
+    records = _read(query, key=_lookup_key(start), query_vec=_vector_param(query_vec))
+    return [p for p in (_parse_path_record(r) for r in records) if p is not None]
+
+
+def iter_khop_paths(start: str, k: int, query_vec: Optional[np.ndarray] = None,
+                    fanout: Optional[List[Optional[int]]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield the k-hop paths of `start` while the records stream in; closing the generator ends the query.
+    With query_vec the server ranks every hop by similarity and sends the paths best first
+    in score_path order (summed dot products with the query vector). Not cached.
+    """
+    if query_vec is None:
+        query, params = _khop_cypher(k, caps=fanout), {}
+    else:
+        query = _khop_cypher(k, order="similarity", caps=fanout, sort_by_score=True)
+        params = {"query_vec": _vector_param(query_vec)}
     with _driver.session() as session:
-        records = session.run(query, name=start)
-        for record in records:
-            try:
-                nodes = record["path_nodes"]
-                rels = record["rels"]
-                path, desc_embs, para_embs = [], [], []
-                descriptions, paragraphs = [], []
-                triples, sources = [], []
-
-                for node in nodes:
-                    path.append(node["name"])
-                    desc_embs.append(np.array(node["gnn_embedding_v1"], dtype=np.float32))
-                    para_embs.append(np.array(node["paragraph_embedding_v1"], dtype=np.float32))
-                    descriptions.append(node.get("description", ""))
-                    paragraphs.append(node.get("paragraph", ""))
-
-                if len(set(name.lower() for name in path)) < len(path):
-                    print(f"[!!!Skip closed loop path]: {path}")
-                    continue
-
-                for rel in rels:
-                    triples.append((rel.start_node["name"], rel.type, rel.end_node["name"]))
-                    sources.append(rel.get("source", "unknown"))
-
-                seen_set = set()
-                triples_dedup, sources_dedup = [], []
-                for t, s in zip(triples, sources):
-                    key = (t[0].lower(), t[1], t[2].lower())
-                    if key not in seen_set:
-                        seen_set.add(key)
-                        triples_dedup.append(t)
-                        sources_dedup.append(s)
-
-                triples = triples_dedup
-                sources = sources_dedup
-                results.append({
-                    "path": path,
-                    "desc_embs": desc_embs,
-                    "para_embs": para_embs,
-                    "descriptions": descriptions,
-                    "paragraphs": paragraphs,
-                    "triples": triples,
-                    "sources": sources
-                })
-            except Exception as e:
-                print("[!]Path resolution failed:", e)
-                continue
-    return results
+        # Streamed, so not retried: records already yielded cannot be taken back
+        for record in session.run(Query(query, timeout=QUERY_TIMEOUT), key=_lookup_key(start), **params):
+            path = _parse_path_record(record)
+            if path is not None:
+                yield path
 
 
+def query_khop_paths_many(starts: List[str], k: int) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Batched query_khop_paths: expand the k-hop paths of several start entities in one UNWIND round trip.
+    Return: {start: [path dict, ...]} keyed by the start names exactly as given.
+    """
+    starts = list(dict.fromkeys(s for s in starts if s))
+    # Shares the query_khop_paths cache: only uncached starts are expanded
+    cache = query_khop_paths.cache
+    frozen = {s: cache.get((s, k)) for s in starts}
+    missing = [s for s in starts if frozen[s] is MISSING]
+    if missing and USE_PATH_TABLE:
+        for s in missing:
+            paths = table_khop_paths(s, k)
+            if paths is not None:
+                frozen[s] = cache.put((s, k), paths)
+        missing = [s for s in missing if frozen[s] is MISSING]
+    if missing:
+        fetched = {s: [] for s in missing}
+        records = _read(_khop_cypher(k, batched=True), items=_name_items(missing))
+        for record in records:
+            path = _parse_path_record(record)
+            if path is not None:
+                fetched[record["name"]].append(path)
+        for s, paths in fetched.items():
+            frozen[s] = cache.put((s, k), paths)
+    return {s: view(frozen[s]) for s in starts}
+
 
 def query_relation_between(entity1: str, entity2: str) -> Dict[str, str]:
     """
     Query the direct relationship type and source between two entities
     """
-    query = """
+    query = f"""
+    {_match_entity("a", "$k1")}
+    {_match_entity("b", "$k2")}
     MATCH (a)-[r]-(b)
-    WHERE toLower(a.name) = toLower($e1) AND toLower(b.name) = toLower($e2)
     RETURN type(r) AS rel_type, r.source AS source
     LIMIT 1
     """
-    with _driver.session() as session:
-        result = session.run(query, e1=entity1, e2=entity2).single()
-        if result:
-            return {
-                "rel_type": result["rel_type"],
-                "source": result.get("source", "unknown")
-            }
-        else:
-            return {
-                "rel_type": "related_to",
-                "source": "unknown"
+    result = _read(query, k1=_lookup_key(entity1), k2=_lookup_key(entity2)).single()
+    if result:
+        return {
+            "rel_type": result["rel_type"],
+            "source": result["source"] if result["source"] is not None else "unknown"
+        }
+    else:
+        return {
+            "rel_type": "related_to",
+            "source": "unknown"
+        }
+
+
+def query_relations_between(pairs: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+    """
+    Batched query_relation_between: one UNWIND round trip for all (entity1, entity2) pairs.
+    Returns one {"rel_type", "source"} dict per input pair, in input order.
+    """
+    unique_pairs = list(dict.fromkeys((a, b) for a, b in pairs))
+    found = {}
+    if unique_pairs:
+        query = f"""
+        UNWIND range(0, size($pairs) - 1) AS i
+        WITH i, $pairs[i] AS pair
+        {_match_entity("a", "pair[0]")}
+        {_match_entity("b", "pair[1]")}
+        MATCH (a)-[r]-(b)
+        WITH i, collect({{rel_type: type(r), source: r.source}})[0] AS rel
+        RETURN i, rel.rel_type AS rel_type, rel.source AS source
+        """
+        records = _read(query, pairs=[[_lookup_key(a), _lookup_key(b)] for a, b in unique_pairs])
+        for record in records:
+            found[unique_pairs[record["i"]]] = {
+                "rel_type": record["rel_type"],
+                "source": record["source"] if record["source"] is not None else "unknown"
             }
+    return [
+        dict(found.get((a, b), {"rel_type": "related_to", "source": "unknown"}))
+        for a, b in pairs
+    ]
 
 
+@graph_cache(max_bytes=16 * 1024 * 1024)
 def query_genesis_triples_for(mineral: str):
     """
     Retrieve the genetic mechanism ternary sequence and origin associated with a specific mineral.
@@ -182,39 +576,47 @@ def query_genesis_triples_for(mineral: str):
         ...
     ]
     """
-    with _driver.session() as session:
-        query = """
-        MATCH (m)-[r]->(g:genesis)
-        WHERE m.name = $mineral
-        RETURN m.name AS head, type(r) AS rel, g.name AS tail, r.source AS source, r.paragraph AS paragraph
-        """
-        result = session.run(query, mineral=mineral)
-        return [
-            {
-                "triple": (record["head"], record["rel"], record["tail"]),
-                "source": record["source"],
-                "paragraph": record["paragraph"]
-            }
-            for record in result
-        ]
+    result = _read(_genesis_triples_cypher(), key=_genesis_key(mineral))
+    return [_genesis_triple_from_record(record) for record in result]
 
 # Queries that prioritize deep links
 def query_node_labels_and_neighbors(entity_name: str) -> Tuple[List[str], int]:
     """
     Query the label and number of neighbors of a given entity
     """
-    query = """
+    query = f"""
+    {_match_entity("n", "$key")}
     MATCH (n)-[]-(m)
-    WHERE toLower(n.name) = toLower($name)
     RETURN labels(n) AS labels, count(DISTINCT m) AS neighbor_count
     LIMIT 1
     """
-    with _driver.session() as session:
-        result = session.run(query, name=entity_name).single()
-        if result:
-            return result["labels"], result["neighbor_count"]
-        else:
-            return [], 0
+    result = _read(query, key=_lookup_key(entity_name)).single()
+    if result:
+        return result["labels"], result["neighbor_count"]
+    else:
+        return [], 0
+
+
+def query_labels_and_degrees(names: List[str]) -> Dict[str, Tuple[List[str], int]]:
+    """
+    Batched query_node_labels_and_neighbors: labels and neighbor count of many entities in one UNWIND round trip.
+    Return: {lower-cased name: (labels, neighbor_count)}; unknown or isolated entities map to ([], 0).
+    """
+    keys = list(dict.fromkeys(n.lower() for n in names if n))
+    results = {key: ([], 0) for key in keys}
+    if not keys:
+        return results
+    query = f"""
+    UNWIND $items AS item
+    {_match_entity("n", "item.key")}
+    MATCH (n)-[]-(m)
+    WITH item.name AS name, labels(n) AS labels, count(DISTINCT m) AS neighbor_count
+    RETURN name, collect([labels, neighbor_count])[0] AS first
+    """
+    for record in _read(query, items=_name_items(keys)):
+        labels, neighbor_count = record["first"]
+        results[record["name"]] = (labels, neighbor_count)
+    return results
 
 
 def get_topic_entities(mineral: str, max_hop: int = 3):
@@ -227,24 +629,23 @@ def query_one_hop_edges_undirected(entity: str, blocked_sources: List[str] = [])
     Return format: (entity, relation, neighbor, source)
     """
     results = []
-    with _driver.session() as session:
-        cypher = """
-        MATCH (a)-[r]-(b)
-        WHERE toLower(a.name) = toLower($entity)
-        RETURN a.name AS a_name, type(r) AS rel, b.name AS b_name, r.source AS source
-        """
-        records = session.run(cypher, entity=entity)
-        for record in records:
-            source = record["source"] or ""
-            if source in blocked_sources:
-                continue
-            a = record["a_name"]
-            b = record["b_name"]
-            rel = record["rel"]
-            if a.lower() == entity.lower():
-                results.append((a, rel, b, source))  # entity 是 a
-            else:
-                results.append((b, rel, a, source))  # entity 是 b，统一返回格式
+    cypher = f"""
+    {_match_entity("a", "$key")}
+    MATCH (a)-[r]-(b)
+    RETURN a.name AS a_name, type(r) AS rel, b.name AS b_name, r.source AS source
+    """
+    records = _read(cypher, key=_lookup_key(entity))
+    for record in records:
+        source = record["source"] or ""
+        if source in blocked_sources:
+            continue
+        a = record["a_name"]
+        b = record["b_name"]
+        rel = record["rel"]
+        if _lookup_key(a) == _lookup_key(entity):
+            results.append((a, rel, b, source))  # entity 是 a
+        else:
+            results.append((b, rel, a, source))  # entity 是 b，统一返回格式
     return results
 
 def query_one_hop_edges_with_raw_direction(entity: str, blocked_sources: List[str] = []) -> List[Tuple[str, str, str, str]]:
@@ -252,17 +653,16 @@ def query_one_hop_edges_with_raw_direction(entity: str, blocked_sources: List[st
     Return the one-hop adjacent edge of the entity, preserving the true direction. (head, relation, tail, source)
     """
     results = []
-    with _driver.session() as session:
-        cypher = """
-        MATCH (a)-[r]-(b)
-        WHERE toLower(a.name) = toLower($entity) OR toLower(b.name) = toLower($entity)
-        RETURN a.name AS head, type(r) AS rel, b.name AS tail, r.source AS source
-        """
-        records = session.run(cypher, entity=entity)
+    cypher = f"""
+    {_match_entity("e", "$key")}
+    MATCH (e)-[r]-()
+    RETURN startNode(r).name AS head, type(r) AS rel, endNode(r).name AS tail, r.source AS source
+    """
+    records = _read(cypher, key=_lookup_key(entity))
 
-        for record in records:
-            h, r, t, s = record["head"], record["rel"], record["tail"], record["source"] or ""
-            if s in blocked_sources:
-                continue
-            results.append((h, r, t, s))
+    for record in records:
+        h, r, t, s = record["head"], record["rel"], record["tail"], record["source"] or ""
+        if s in blocked_sources:
+            continue
+        results.append((h, r, t, s))
     return results
@@ -0,0 +1,174 @@
+"""
+Async Neo4j layer: a pooled async driver per event loop, server-side timeouts and retried reads.
+Synchronous callers go through run_async, which runs everything on one long-lived background loop.
+It serves entity descriptions and genesis triples. Per-entity path retrieval (path_selector) runs on
+the synchronous graph_query driver in worker threads (asyncio.to_thread), bounded by ENTITY_CONCURRENCY;
+that driver has its own pool settings (graph_query.NEO4J_POOL_SIZE / NEO4J_ACQUIRE_TIMEOUT) and both layers
+share the timeout and retry policy of graph_query (QUERY_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF).
+"""
+import atexit
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional, Awaitable, Iterable, Callable
+from neo4j import AsyncGraphDatabase, Query
+from neo4j.exceptions import TransientError, ServiceUnavailable, SessionExpired
+import graph_backend
+from graph_cache import view, MISSING
+import graph_query
+from graph_query import (
+    NEO4J_URI,
+    NEO4J_AUTH,
+    _description_cypher,
+    _genesis_triples_cypher,
+    _lookup_key,
+    _genesis_key,
+    _genesis_triple_from_record
+)
+# Async driver settings (one pooled driver per event loop)
+ASYNC_POOL_SIZE = 50
+# Seconds to wait for a free pooled connection
+ACQUIRE_TIMEOUT = 30.0
+# Maximum number of entities retrieved at the same time
+ENTITY_CONCURRENCY = 8
+
+_RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+_drivers: Dict[asyncio.AbstractEventLoop, Any] = {}
+
+
+def _get_driver():
+    """ Pooled async driver of the running event loop (async drivers cannot be shared across loops) """
+    loop = asyncio.get_running_loop()
+    driver = _drivers.get(loop)
+    if driver is None:
+        driver = AsyncGraphDatabase.driver(
+            NEO4J_URI,
+            auth=NEO4J_AUTH,
+            max_connection_pool_size=ASYNC_POOL_SIZE,
+            connection_acquisition_timeout=ACQUIRE_TIMEOUT
+        )
+        _drivers[loop] = driver
+    return driver
+
+
+async def close_async_driver() -> None:
+    driver = _drivers.pop(asyncio.get_running_loop(), None)
+    if driver is not None:
+        await driver.close()
+
+
+async def _read(cypher: str, **params) -> list:
+    """
+    Run one read query on a pooled session and return all records, retrying transient failures
+    (timeout and retry policy of graph_query: QUERY_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF)
+    """
+    retries = graph_query.MAX_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            async with _get_driver().session() as session:
+                result = await session.run(Query(cypher, timeout=graph_query.QUERY_TIMEOUT), **params)
+                return [record async for record in result]
+        except _RETRYABLE_ERRORS as e:
+            if attempt >= retries:
+                raise
+            delay = graph_query.RETRY_BACKOFF * (2 ** attempt)
+            print(f"⚠️ Transient Neo4j error, retry {attempt + 1}/{retries} in {delay:.2f}s: {e}")
+            await asyncio.sleep(delay)
+
+
+def _use_neo4j() -> bool:
+    return graph_backend.GRAPH_BACKEND == "neo4j"
+
+
+async def _cached(sync_func, key: tuple, fetch: Callable[[], Awaitable]):
+    """ Serve from (and fill) the result cache of the matching synchronous graph_query function """
+    cache = sync_func.cache
+    frozen = cache.get(key)
+    if frozen is MISSING:
+        frozen = cache.put(key, await fetch())
+    return view(frozen)
+
+
+async def aquery_direct_description(entity_name: str) -> str:
+    """ Async query_direct_description """
+    if not _use_neo4j():
+        return await asyncio.to_thread(graph_backend.query_direct_description, entity_name)
+
+    async def fetch():
+        records = await _read(_description_cypher(), key=_lookup_key(entity_name))
+        return records[0]["description"] if records and records[0]["description"] else ""
+
+    return await _cached(graph_query.query_direct_description, (entity_name,), fetch)
+
+
+async def aquery_direct_descriptions(entity_names: List[str]) -> List[str]:
+    """ Descriptions of several entities fetched concurrently, in input order """
+    return await gather_limited([aquery_direct_description(e) for e in entity_names])
+
+
+async def aquery_genesis_triples_for(mineral: str) -> List[Dict[str, Any]]:
+    """ Async query_genesis_triples_for """
+    if not _use_neo4j():
+        return await asyncio.to_thread(graph_backend.query_genesis_triples_for, mineral)
+
+    async def fetch():
+        records = await _read(_genesis_triples_cypher(), key=_genesis_key(mineral))
+        return [_genesis_triple_from_record(r) for r in records]
+
+    return await _cached(graph_query.query_genesis_triples_for, (mineral,), fetch)
+
+
+async def gather_limited(aws: Iterable[Awaitable], limit: Optional[int] = None) -> list:
+    """ asyncio.gather with at most `limit` (default ENTITY_CONCURRENCY) awaitables running at once; keeps input order """
+    semaphore = asyncio.Semaphore(limit or ENTITY_CONCURRENCY)
+
+    async def _bounded(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(_bounded(aw) for aw in aws))
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """ The long-lived event loop of run_async, running in a daemon thread; it owns one pooled driver for the process """
+    global _loop, _loop_thread
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                _loop_thread = threading.Thread(target=loop.run_forever, name="neo4j-async-loop", daemon=True)
+                _loop_thread.start()
+                _loop = loop
+                atexit.register(shutdown_async)
+    return _loop
+
+
+def shutdown_async() -> None:
+    """ Close the background loop's driver and stop the loop (registered with atexit) """
+    global _loop, _loop_thread
+    with _loop_lock:
+        loop, thread, _loop, _loop_thread = _loop, _loop_thread, None, None
+    if loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(close_async_driver(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def run_async(coro):
+    """
+    Run a coroutine from synchronous code (including worker threads and threads with a running loop of their
+    own, e.g. notebooks) on the shared background loop and block until it finishes.
+    The loop and its pooled driver live until shutdown_async, so connections are reused across calls.
+    Coroutines already running on the background loop must await instead.
+    """
+    loop = _background_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_async called on the background loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
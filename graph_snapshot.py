@@ -0,0 +1,576 @@
+import json
+import hashlib
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional, Iterator
+from functools import lru_cache
+from entity_names import normalize_name, resolve_name_key
+from node_degrees import fanout_for, importance_from_degree
+# Directory holding the exported MMKG snapshot (see export_graph_snapshot)
+SNAPSHOT_DIR = r""
+
+_ARRAYS_FILE = "graph.npz"
+_STRINGS_FILE = "strings.json"
+_DESC_EMB_FILE = "desc_emb.npy"
+_PARA_EMB_FILE = "para_emb.npy"
+
+
+class GraphSnapshot:
+    """
+    Read-only, in-memory copy of the MMKG.
+    Nodes are numbered 0..N-1. Every relationship is stored once in the edge table
+    (edge_head, edge_tail, edge_rel, edge_src) and twice in the CSR adjacency
+    (indptr, adj_nbr, adj_edge), once from each endpoint, so undirected
+    neighbourhoods are a single slice.
+    Embeddings are memory-mapped (N, dim) float32 matrices; nodes without both
+    embeddings have has_emb = False.
+    """
+
+    def __init__(self, snapshot_dir: str):
+        root = Path(snapshot_dir)
+        arrays = np.load(root / _ARRAYS_FILE)
+        self.indptr = arrays["indptr"]
+        self.adj_nbr = arrays["adj_nbr"]
+        self.adj_edge = arrays["adj_edge"]
+        self.edge_head = arrays["edge_head"]
+        self.edge_tail = arrays["edge_tail"]
+        self.edge_rel = arrays["edge_rel"]
+        self.edge_src = arrays["edge_src"]
+        self.has_emb = arrays["has_emb"]
+        self.name_key = arrays["name_key"]
+
+        with open(root / _STRINGS_FILE, "r", encoding="utf-8") as f:
+            strings = json.load(f)
+        self.names: List[str] = strings["names"]
+        self.labels: List[List[str]] = strings["labels"]
+        self.descriptions: List[Optional[str]] = strings["descriptions"]
+        self.paragraphs: List[Optional[str]] = strings["paragraphs"]
+        self.rel_types: List[str] = strings["rel_types"]
+        self.sources: List[str] = strings["sources"]
+        self.edge_paragraphs: List[Optional[str]] = strings["edge_paragraphs"]
+
+        self.desc_emb = np.load(root / _DESC_EMB_FILE, mmap_mode="r")
+        self.para_emb = np.load(root / _PARA_EMB_FILE, mmap_mode="r")
+
+        # Same ranking signal as the importance property written by node_degrees.compute_node_degrees
+        self.importance = importance_from_degree(np.diff(self.indptr))
+
+        # Normalized name index, the in-memory counterpart of :Entity(name_key)
+        self.by_key: Dict[str, List[int]] = {}
+        for i, name in enumerate(self.names):
+            if name is None:
+                continue
+            self.by_key.setdefault(normalize_name(name), []).append(i)
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.names)
+
+    def lookup(self, name: str) -> List[int]:
+        if not name:
+            return []
+        return self.by_key.get(resolve_name_key(name), [])
+
+    def fingerprint(self) -> str:
+        """ Content hash of the structure derived tables depend on (edges, embedded flags, name keys), computed once """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for array in (self.edge_head, self.edge_tail, self.edge_rel, self.edge_src, self.has_emb, self.name_key):
+                digest.update(np.ascontiguousarray(array).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def slots(self, node: int) -> np.ndarray:
+        return np.arange(self.indptr[node], self.indptr[node + 1])
+
+    def degree(self, node: int) -> int:
+        return int(len(np.unique(self.adj_nbr[self.indptr[node]:self.indptr[node + 1]])))
+
+    def source(self, edge: int, default: Optional[str] = None) -> Optional[str]:
+        s = self.edge_src[edge]
+        return self.sources[s] if s >= 0 else default
+
+    def oriented_triple(self, edge: int) -> Tuple[str, str, str]:
+        return (self.names[self.edge_head[edge]], self.rel_types[self.edge_rel[edge]], self.names[self.edge_tail[edge]])
+
+
+@lru_cache(maxsize=1)
+def load_graph_snapshot(snapshot_dir: str) -> GraphSnapshot:
+    """ Load the snapshot once and keep it resident """
+    print(f"📦 Loading graph snapshot from {snapshot_dir} ...")
+    snap = GraphSnapshot(snapshot_dir)
+    print(f"Graph snapshot loaded: {snap.num_nodes} nodes, {len(snap.edge_head)} relationships")
+    return snap
+
+
+def _snapshot() -> GraphSnapshot:
+    return load_graph_snapshot(SNAPSHOT_DIR)
+
+
+def export_graph_snapshot(snapshot_dir: str = SNAPSHOT_DIR, batch_log: int = 50000) -> None:
+    """
+    Dump the Neo4j graph (names, labels, descriptions, paragraphs, relation types, sources,
+    adjacency and both embedding families) into a snapshot directory readable by GraphSnapshot.
+    """
+    from graph_query import _driver
+
+    root = Path(snapshot_dir)
+    root.mkdir(parents=True, exist_ok=True)
+
+    with _driver.session() as session:
+        num_nodes = session.run("MATCH (n) RETURN count(n) AS c").single()["c"]
+        dim_record = session.run(
+            "MATCH (n) WHERE n.gnn_embedding_v1 IS NOT NULL RETURN size(n.gnn_embedding_v1) AS dim LIMIT 1"
+        ).single()
+        dim = dim_record["dim"] if dim_record else 0
+        print(f"📤 Exporting {num_nodes} nodes (embedding dim {dim}) ...")
+
+        desc_emb = np.lib.format.open_memmap(root / _DESC_EMB_FILE, mode="w+", dtype=np.float32, shape=(num_nodes, dim))
+        para_emb = np.lib.format.open_memmap(root / _PARA_EMB_FILE, mode="w+", dtype=np.float32, shape=(num_nodes, dim))
+        has_emb = np.zeros(num_nodes, dtype=bool)
+        node_index: Dict[str, int] = {}
+        names, labels, descriptions, paragraphs = [], [], [], []
+
+        records = session.run("""
+        MATCH (n)
+        RETURN elementId(n) AS id, n.name AS name, labels(n) AS labels,
+               n.description AS description, n.paragraph AS paragraph,
+               n.gnn_embedding_v1 AS desc_emb, n.paragraph_embedding_v1 AS para_emb
+        """)
+        for i, r in enumerate(records):
+            node_index[r["id"]] = i
+            names.append(r["name"])
+            labels.append(list(r["labels"]))
+            descriptions.append(r["description"])
+            paragraphs.append(r["paragraph"])
+            if r["desc_emb"] is not None and r["para_emb"] is not None:
+                desc_emb[i] = np.asarray(r["desc_emb"], dtype=np.float32)
+                para_emb[i] = np.asarray(r["para_emb"], dtype=np.float32)
+                has_emb[i] = True
+            if (i + 1) % batch_log == 0:
+                print(f"  - {i + 1} nodes exported")
+        desc_emb.flush()
+        para_emb.flush()
+
+        rel_types, rel_index = [], {}
+        sources, source_index = [], {}
+        edge_head, edge_tail, edge_rel, edge_src, edge_paragraphs = [], [], [], [], []
+        records = session.run("""
+        MATCH (a)-[r]->(b)
+        RETURN elementId(a) AS head, elementId(b) AS tail, type(r) AS rel,
+               r.source AS source, r.paragraph AS paragraph
+        """)
+        for r in records:
+            rel = r["rel"]
+            if rel not in rel_index:
+                rel_index[rel] = len(rel_types)
+                rel_types.append(rel)
+            src = r["source"]
+            if src is None:
+                src_id = -1
+            else:
+                if src not in source_index:
+                    source_index[src] = len(sources)
+                    sources.append(src)
+                src_id = source_index[src]
+            edge_head.append(node_index[r["head"]])
+            edge_tail.append(node_index[r["tail"]])
+            edge_rel.append(rel_index[rel])
+            edge_src.append(src_id)
+            edge_paragraphs.append(r["paragraph"])
+
+    edge_head = np.asarray(edge_head, dtype=np.int32)
+    edge_tail = np.asarray(edge_tail, dtype=np.int32)
+    _write_graph_arrays(root, num_nodes, edge_head, edge_tail, np.asarray(edge_rel, dtype=np.int32),
+                        np.asarray(edge_src, dtype=np.int32), has_emb, _build_name_keys(names))
+    with open(root / _STRINGS_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "names": names,
+            "labels": labels,
+            "descriptions": descriptions,
+            "paragraphs": paragraphs,
+            "rel_types": rel_types,
+            "sources": sources,
+            "edge_paragraphs": edge_paragraphs,
+        }, f, ensure_ascii=False)
+    print(f"✅ Snapshot written to {root}: {num_nodes} nodes, {len(edge_head)} relationships")
+
+
+def append_snapshot_edges(snapshot_dir: str, edges: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Append new relationships between existing nodes to a snapshot on disk and rebuild its adjacency.
+    edges: [{"triple": (head, rel, tail), "source": ..., "paragraph": ...}], endpoints given by name.
+    Existing edge ids are unchanged; returns the ids of the appended edges.
+    New nodes are not supported here and need a full export_graph_snapshot.
+    """
+    root = Path(snapshot_dir)
+    snap = GraphSnapshot(snapshot_dir)
+    with open(root / _STRINGS_FILE, "r", encoding="utf-8") as f:
+        strings = json.load(f)
+    rel_index = {rel: i for i, rel in enumerate(strings["rel_types"])}
+    source_index = {src: i for i, src in enumerate(strings["sources"])}
+
+    heads, tails, rels, srcs = [], [], [], []
+    for edge in edges:
+        head, rel, tail = edge["triple"]
+        head_ids, tail_ids = snap.lookup(head), snap.lookup(tail)
+        if not head_ids or not tail_ids:
+            print(f"⚠️ Edge endpoint not in snapshot, skipped: {edge['triple']}")
+            continue
+        if rel not in rel_index:
+            rel_index[rel] = len(strings["rel_types"])
+            strings["rel_types"].append(rel)
+        src = edge.get("source")
+        if src is not None and src not in source_index:
+            source_index[src] = len(strings["sources"])
+            strings["sources"].append(src)
+        heads.append(head_ids[0])
+        tails.append(tail_ids[0])
+        rels.append(rel_index[rel])
+        srcs.append(source_index[src] if src is not None else -1)
+        strings["edge_paragraphs"].append(edge.get("paragraph"))
+
+    first_new = len(snap.edge_head)
+    _write_graph_arrays(
+        root,
+        snap.num_nodes,
+        np.concatenate([snap.edge_head, np.asarray(heads, dtype=np.int32)]),
+        np.concatenate([snap.edge_tail, np.asarray(tails, dtype=np.int32)]),
+        np.concatenate([snap.edge_rel, np.asarray(rels, dtype=np.int32)]),
+        np.concatenate([snap.edge_src, np.asarray(srcs, dtype=np.int32)]),
+        snap.has_emb,
+        snap.name_key,
+    )
+    with open(root / _STRINGS_FILE, "w", encoding="utf-8") as f:
+        json.dump(strings, f, ensure_ascii=False)
+    load_graph_snapshot.cache_clear()
+    print(f"✅ Appended {len(heads)} relationships to snapshot {root}")
+    return np.arange(first_new, first_new + len(heads), dtype=np.int32)
+
+
+def _write_graph_arrays(root: Path, num_nodes: int, edge_head: np.ndarray, edge_tail: np.ndarray, edge_rel: np.ndarray,
+                        edge_src: np.ndarray, has_emb: np.ndarray, name_key: np.ndarray) -> None:
+    indptr, adj_nbr, adj_edge = _build_csr(num_nodes, edge_head, edge_tail)
+    np.savez(
+        root / _ARRAYS_FILE,
+        indptr=indptr,
+        adj_nbr=adj_nbr,
+        adj_edge=adj_edge,
+        edge_head=edge_head,
+        edge_tail=edge_tail,
+        edge_rel=edge_rel,
+        edge_src=edge_src,
+        has_emb=has_emb,
+        name_key=name_key,
+    )
+
+
+def _build_csr(num_nodes: int, edge_head: np.ndarray, edge_tail: np.ndarray):
+    """ Undirected CSR: each relationship appears in the rows of both endpoints (self-loops once) """
+    edge_ids = np.arange(len(edge_head), dtype=np.int32)
+    loop = edge_head == edge_tail
+    rows = np.concatenate([edge_head, edge_tail[~loop]])
+    nbrs = np.concatenate([edge_tail, edge_head[~loop]])
+    eids = np.concatenate([edge_ids, edge_ids[~loop]])
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+    return indptr, nbrs[order].astype(np.int32), eids[order].astype(np.int32)
+
+
+def _build_name_keys(names: List[Optional[str]]) -> np.ndarray:
+    """ Map every node to an integer id of its normalized name, so path loop checks are integer compares """
+    keys: Dict[str, int] = {}
+    out = np.empty(len(names), dtype=np.int32)
+    for i, name in enumerate(names):
+        key = normalize_name(name)
+        out[i] = keys.setdefault(key, len(keys))
+    return out
+
+
+# === Same signatures as graph_query ===
+
+def query_direct_description(entity_name: str) -> str:
+    """
+    Query the description field of a specific entity
+    """
+    snap = _snapshot()
+    ids = snap.lookup(entity_name)
+    if not ids:
+        return ""
+    return snap.descriptions[ids[0]] or ""
+
+
+def _cap_slots(snap: GraphSnapshot, slots: np.ndarray, cap: Optional[int], rank: Optional[np.ndarray] = None) -> np.ndarray:
+    """ Keep the `cap` adjacency slots whose neighbours rank highest (importance by default), best first """
+    if cap is None or len(slots) <= cap and rank is None:
+        return slots
+    scores = snap.importance[snap.adj_nbr[slots]] if rank is None else rank
+    return slots[np.argsort(-scores, kind="stable")[:cap]]
+
+
+def _neighbors_of(snap: GraphSnapshot, entity_name: str, with_labels: bool = False) -> List[Dict[str, Any]]:
+    neighbors = []
+    for n in snap.lookup(entity_name):
+        slots = snap.slots(n)
+        slots = _cap_slots(snap, slots[snap.has_emb[snap.adj_nbr[slots]]], fanout_for(1))
+        for m, e in zip(snap.adj_nbr[slots], snap.adj_edge[slots]):
+            neighbor = {
+                "name": snap.names[m],
+                "desc_emb": snap.desc_emb[m],
+                "para_emb": snap.para_emb[m],
+                "description": snap.descriptions[m],
+                "paragraph": snap.paragraphs[m],
+                "triple": (entity_name, snap.rel_types[snap.edge_rel[e]], snap.names[m]),
+                "source": snap.source(e)
+            }
+            if with_labels:
+                neighbor["labels"] = snap.labels[m]
+                neighbor["raw_triple"] = (snap.names[snap.edge_head[e]], snap.rel_types[snap.edge_rel[e]],
+                                          snap.names[snap.edge_tail[e]])
+            neighbors.append(neighbor)
+    return neighbors
+
+
+def query_direct_neighbors(entity_name: str) -> List[Dict[str, Any]]:
+    """
+    Returns the 1-hop neighbors connected to the specified entity, along with the corresponding triples and source.
+    """
+    return _neighbors_of(_snapshot(), entity_name)
+
+
+def query_direct_neighbors_many(entity_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Batched query_direct_neighbors; each neighbor dict additionally carries the neighbor's "labels"
+    and "raw_triple", the relationship in its stored direction.
+    """
+    snap = _snapshot()
+    return {n: _neighbors_of(snap, n, with_labels=True) for n in dict.fromkeys(n for n in entity_names if n)}
+
+
+def query_direct_genesis_neighbors(entity_name: str) -> List[Dict[str, Any]]:
+    """
+    Returns a 1-hop neighborhood of type genesis.
+    """
+    snap = _snapshot()
+    neighbors = []
+    for n in snap.lookup(entity_name):
+        for m in snap.adj_nbr[snap.slots(n)]:
+            if not snap.has_emb[m] or "genesis" not in snap.labels[m]:
+                continue
+            neighbors.append({
+                "name": snap.names[m],
+                "desc_emb": snap.desc_emb[m],
+                "para_emb": snap.para_emb[m],
+                "description": snap.descriptions[m],
+                "paragraph": snap.paragraphs[m]
+            })
+    return neighbors
+
+
+def _khop_node_paths(snap: GraphSnapshot, start: int, k: int, caps: Optional[List[Optional[int]]] = None,
+                     query_vec: Optional[np.ndarray] = None):
+    """
+    Depth-first enumeration of simple k-hop paths whose nodes all carry embeddings and distinct names.
+    Hop h follows at most fanout_for(h, caps) neighbours of each node, ranked by importance,
+    or by similarity to query_vec when one is given.
+    """
+    if not snap.has_emb[start]:
+        return
+    q = np.ravel(query_vec).astype(np.float32) if query_vec is not None else None
+    stack = [([start], [], {int(snap.name_key[start])})]
+    while stack:
+        nodes, edges, seen_keys = stack.pop()
+        if len(edges) == k:
+            yield nodes, edges
+            continue
+        slots = snap.slots(nodes[-1])
+        nbrs = snap.adj_nbr[slots]
+        valid = snap.has_emb[nbrs] & ~np.isin(snap.name_key[nbrs], list(seen_keys))
+        slots, nbrs = slots[valid], nbrs[valid]
+        cap = fanout_for(len(edges) + 1, caps)
+        if q is not None:
+            slots = _cap_slots(snap, slots, len(slots) if cap is None else cap, rank=snap.desc_emb[nbrs] @ q + snap.para_emb[nbrs] @ q)
+        else:
+            slots = _cap_slots(snap, slots, cap)
+        for m, e in zip(snap.adj_nbr[slots][::-1], snap.adj_edge[slots][::-1]):
+            stack.append((nodes + [int(m)], edges + [int(e)], seen_keys | {int(snap.name_key[m])}))
+
+
+def _path_record(snap: GraphSnapshot, nodes: List[int], edges: List[int]) -> Dict[str, Any]:
+    return {
+        "path": [snap.names[n] for n in nodes],
+        "desc_embs": [snap.desc_emb[n] for n in nodes],
+        "para_embs": [snap.para_emb[n] for n in nodes],
+        "descriptions": [snap.descriptions[n] for n in nodes],
+        "paragraphs": [snap.paragraphs[n] for n in nodes],
+        "triples": [snap.oriented_triple(e) for e in edges],
+        "sources": [snap.source(e, "unknown") for e in edges]
+    }
+
+
+def query_khop_paths(start: str, k: int) -> List[Dict[str, Any]]:
+    """
+    Expand the k-hop paths of a given entity, including all entity information, relation types, and source.
+    Return: path (list of names), desc/para embedding lists, triples, source, description, paragraph.
+    """
+    snap = _snapshot()
+    results = []
+    for s in snap.lookup(start):
+        for nodes, edges in _khop_node_paths(snap, s, k):
+            results.append(_path_record(snap, nodes, edges))
+    return results
+
+
+def query_khop_paths_ranked(start: str, k: int, query_vec: np.ndarray, fanout: Optional[List[Optional[int]]] = None) -> List[Dict[str, Any]]:
+    """
+    k-hop paths where every hop keeps only the neighbours most similar to query_vec
+    (per-hop caps from `fanout`, default node_degrees.HUB_FANOUT).
+    Without any cap every path is kept, so this is query_khop_paths.
+    """
+    if all(fanout_for(hop, fanout) is None for hop in range(1, k + 1)):
+        return query_khop_paths(start, k)
+    snap = _snapshot()
+    results = []
+    for s in snap.lookup(start):
+        for nodes, edges in _khop_node_paths(snap, s, k, caps=fanout, query_vec=query_vec):
+            results.append(_path_record(snap, nodes, edges))
+    return results
+
+
+def iter_khop_paths(start: str, k: int, query_vec: Optional[np.ndarray] = None,
+                    fanout: Optional[List[Optional[int]]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield the k-hop paths of `start`. With query_vec every hop is ranked by similarity and the paths
+    come best first by their summed node similarity; only node/edge ids are held, records are built on demand.
+    """
+    snap = _snapshot()
+    if query_vec is None:
+        for s in snap.lookup(start):
+            for nodes, edges in _khop_node_paths(snap, s, k, caps=fanout):
+                yield _path_record(snap, nodes, edges)
+        return
+    found = [p for s in snap.lookup(start) for p in _khop_node_paths(snap, s, k, caps=fanout, query_vec=query_vec)]
+    if not found:
+        return
+    q = np.ravel(query_vec).astype(np.float32)
+    node_rows = np.array([nodes for nodes, _ in found], dtype=np.int64)
+    scores = (snap.desc_emb[node_rows] @ q + snap.para_emb[node_rows] @ q).sum(axis=1)
+    for i in np.argsort(-scores, kind="stable"):
+        yield _path_record(snap, *found[i])
+
+
+def query_khop_paths_many(starts: List[str], k: int) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Batched query_khop_paths. Return: {start: [path dict, ...]} keyed by the start names exactly as given.
+    """
+    return {s: query_khop_paths(s, k) for s in dict.fromkeys(s for s in starts if s)}
+
+
+def query_relation_between(entity1: str, entity2: str) -> Dict[str, str]:
+    """
+    Query the direct relationship type and source between two entities
+    """
+    snap = _snapshot()
+    targets = set(snap.lookup(entity2))
+    for a in snap.lookup(entity1):
+        slots = snap.slots(a)
+        for m, e in zip(snap.adj_nbr[slots], snap.adj_edge[slots]):
+            if m in targets:
+                return {
+                    "rel_type": snap.rel_types[snap.edge_rel[e]],
+                    "source": snap.source(e, "unknown")
+                }
+    return {
+        "rel_type": "related_to",
+        "source": "unknown"
+    }
+
+
+def query_relations_between(pairs: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+    """
+    Batched query_relation_between. Returns one {"rel_type", "source"} dict per input pair, in input order.
+    """
+    return [query_relation_between(a, b) for a, b in pairs]
+
+
+def query_genesis_triples_for(mineral: str):
+    """
+    Retrieve the genetic mechanism triples and origin associated with a specific mineral.
+    The mineral name must match exactly, like the Cypher lookup without the name_key index.
+    """
+    snap = _snapshot()
+    results = []
+    for m in snap.lookup(mineral):
+        if snap.names[m] != mineral:
+            continue
+        for e in snap.adj_edge[snap.slots(m)]:
+            if snap.edge_head[e] != m or "genesis" not in snap.labels[snap.edge_tail[e]]:
+                continue
+            results.append({
+                "triple": snap.oriented_triple(e),
+                "source": snap.source(e),
+                "paragraph": snap.edge_paragraphs[e]
+            })
+    return results
+
+
+def query_node_labels_and_neighbors(entity_name: str) -> Tuple[List[str], int]:
+    """
+    Query the label and number of neighbors of a given entity
+    """
+    snap = _snapshot()
+    for n in snap.lookup(entity_name):
+        degree = snap.degree(n)
+        if degree:
+            return snap.labels[n], degree
+    return [], 0
+
+
+def query_labels_and_degrees(names: List[str]) -> Dict[str, Tuple[List[str], int]]:
+    """
+    Batched query_node_labels_and_neighbors. Return: {lower-cased name: (labels, neighbor_count)}.
+    """
+    return {key: query_node_labels_and_neighbors(key) for key in dict.fromkeys(n.lower() for n in names if n)}
+
+
+def get_topic_entities(mineral: str, max_hop: int = 3):
+    return [mineral]
+
+
+def query_one_hop_edges_undirected(entity: str, blocked_sources: List[str] = []) -> List[Tuple[str, str, str, str]]:
+    """
+    Retrieve the 1-hop adjacency edges of a given entity, treating it as an undirected graph.
+    Return format: (entity, relation, neighbor, source)
+    """
+    snap = _snapshot()
+    results = []
+    for a in snap.lookup(entity):
+        slots = snap.slots(a)
+        for m, e in zip(snap.adj_nbr[slots], snap.adj_edge[slots]):
+            source = snap.source(e) or ""
+            if source in blocked_sources:
+                continue
+            results.append((snap.names[a], snap.rel_types[snap.edge_rel[e]], snap.names[m], source))
+    return results
+
+
+def query_one_hop_edges_with_raw_direction(entity: str, blocked_sources: List[str] = []) -> List[Tuple[str, str, str, str]]:
+    """
+    Return the one-hop adjacent edge of the entity, preserving the true direction. (head, relation, tail, source)
+    """
+    snap = _snapshot()
+    results = []
+    for a in snap.lookup(entity):
+        for e in snap.adj_edge[snap.slots(a)]:
+            source = snap.source(e) or ""
+            if source in blocked_sources:
+                continue
+            h, r, t = snap.oriented_triple(e)
+            results.append((h, r, t, source))
+    return results
+
+
+if __name__ == "__main__":
+    export_graph_snapshot(SNAPSHOT_DIR)
@@ -0,0 +1,292 @@
+import os
+import re
+import json
+import shutil
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional
+from functools import lru_cache
+import graph_snapshot
+from graph_snapshot import GraphSnapshot, load_graph_snapshot, append_snapshot_edges, _path_record
+from node_degrees import fanout_for
+# Directory of the materialized path table (see build_path_table).
+# The table stores snapshot node and edge ids, so it is built from and read together with graph_snapshot.SNAPSHOT_DIR.
+PATH_TABLE_DIR = r""
+# Longest materialized path, in hops
+PATH_TABLE_MAX_HOPS = 2
+# Start nodes expanded per chunk while materializing (bounds peak memory around hub nodes)
+BUILD_CHUNK_STARTS = 20000
+
+_META_FILE = "meta.json"
+# Every write goes to a new version directory; this file names the current one
+_CURRENT_FILE = "CURRENT"
+
+
+def _version_dir(table_dir: str) -> Path:
+    """ Directory of the current table version (the directory itself for tables written before versioning) """
+    root = Path(table_dir)
+    pointer = root / _CURRENT_FILE
+    if pointer.exists():
+        return root / pointer.read_text(encoding="utf-8").strip()
+    return root
+
+
+class PathTable:
+    """
+    Columnar table of all simple k-hop paths (k = 1..max_hops) between embedded nodes.
+    For each k: nodes (P, k+1) and edges (P, k) hold snapshot node / edge ids, rows sorted by
+    start node, and indptr (N+1,) gives the row range of every start node.
+    Relation types, directions and sources are resolved through the snapshot edge table.
+    The same paths as graph_query._khop_cypher: every node embedded, names pairwise distinct.
+    """
+
+    def __init__(self, table_dir: str):
+        root = _version_dir(table_dir)
+        self.version_dir = root
+        with open(root / _META_FILE, "r", encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.max_hops = self.meta["max_hops"]
+        self.indptr: Dict[int, np.ndarray] = {}
+        self.nodes: Dict[int, np.ndarray] = {}
+        self.edges: Dict[int, np.ndarray] = {}
+        for k in range(1, self.max_hops + 1):
+            self.indptr[k] = np.load(root / f"k{k}_indptr.npy", mmap_mode="r")
+            self.nodes[k] = np.load(root / f"k{k}_nodes.npy", mmap_mode="r")
+            self.edges[k] = np.load(root / f"k{k}_edges.npy", mmap_mode="r")
+
+    def covers(self, k: int) -> bool:
+        return 1 <= k <= self.max_hops
+
+    def matches(self, snap: GraphSnapshot) -> bool:
+        """ True if the table was built from this version of the snapshot (same content fingerprint) """
+        return (self.meta["num_nodes"] == snap.num_nodes
+                and self.meta.get("snapshot_fingerprint") == snap.fingerprint())
+
+    def rows(self, start: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """ Range scan: (nodes, edges) of all k-hop paths leaving `start` """
+        lo, hi = self.indptr[k][start], self.indptr[k][start + 1]
+        return self.nodes[k][lo:hi], self.edges[k][lo:hi]
+
+
+@lru_cache(maxsize=1)
+def load_path_table(table_dir: str, snapshot_dir: str) -> Optional[PathTable]:
+    """ Open a table version once; None if it was built from a different snapshot version """
+    table = PathTable(table_dir)
+    if not table.matches(load_graph_snapshot(snapshot_dir)):
+        print(f"⚠️ Path table {table_dir} does not match the graph snapshot; rebuild it with build_path_table.")
+        return None
+    print(f"📦 Path table opened: up to {table.max_hops} hops, "
+          + ", ".join(f"{len(table.nodes[k])} {k}-hop" for k in range(1, table.max_hops + 1)))
+    return table
+
+
+def get_path_table() -> Optional[PathTable]:
+    if not PATH_TABLE_DIR:
+        return None
+    # Resolved on every call, so a rebuilt table is picked up as soon as its version becomes current
+    return load_path_table(str(_version_dir(PATH_TABLE_DIR)), graph_snapshot.SNAPSHOT_DIR)
+
+
+def table_khop_paths(start: str, k: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    query_khop_paths served from the path table; None when no table is configured, it does not cover k
+    or `start` is not in the snapshot (an entity added since the build), so the caller asks Neo4j.
+    """
+    table = get_path_table()
+    if table is None or not table.covers(k):
+        return None
+    snap = load_graph_snapshot(graph_snapshot.SNAPSHOT_DIR)
+    starts = snap.lookup(start)
+    if not starts:
+        return None
+    results = []
+    for s in starts:
+        nodes, edges = _capped_rows(table, snap, s, k)
+        results.extend(_path_record(snap, path_nodes, path_edges) for path_nodes, path_edges in zip(nodes, edges))
+    return results
+
+
+def _top_per_group(groups: np.ndarray, scores: np.ndarray, cap: int) -> np.ndarray:
+    """ Boolean mask keeping, within every group, the `cap` highest-scoring rows (ties keep row order) """
+    order = np.lexsort((np.arange(len(groups)), -scores, groups))
+    sorted_groups = groups[order]
+    first = np.r_[0, np.flatnonzero(sorted_groups[1:] != sorted_groups[:-1]) + 1]
+    rank = np.arange(len(order)) - np.repeat(first, np.diff(np.r_[first, len(order)]))
+    mask = np.zeros(len(groups), dtype=bool)
+    mask[order[rank < cap]] = True
+    return mask
+
+
+def _capped_rows(table: PathTable, snap: GraphSnapshot, start: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rows of `start` under the per-hop fan-out caps (node_degrees.HUB_FANOUT), with the semantics of the
+    capped Cypher and snapshot expansions: hop h keeps the top-importance valid extensions of each kept prefix.
+    The valid extensions at hop h are exactly the h-hop table rows, so the caps are applied hop by hop.
+    """
+    if all(fanout_for(hop) is None for hop in range(1, k + 1)):
+        return table.rows(start, k)
+    allowed = None
+    for hop in range(1, k + 1):
+        nodes, edges = table.rows(start, hop)
+        keep = np.ones(len(nodes), dtype=bool)
+        if allowed is not None:
+            keep = np.array([tuple(prefix) in allowed for prefix in edges[:, :-1].tolist()], dtype=bool)
+        cap = fanout_for(hop)
+        if cap is not None and keep.any():
+            idx = np.flatnonzero(keep)
+            _, groups = np.unique(edges[idx, :-1], axis=0, return_inverse=True)
+            keep[idx] = _top_per_group(groups.ravel(), snap.importance[nodes[idx, -1]], cap)
+        if hop == k:
+            return nodes[keep], edges[keep]
+        allowed = set(map(tuple, edges[keep].tolist()))
+
+
+# === Materialization ===
+
+def _concat_ranges(lo: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """ Concatenation of arange(lo[i], lo[i] + counts[i]) for all i """
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(int(counts.sum()), dtype=np.int64) - offsets + np.repeat(lo, counts)
+
+
+def _extend_paths(snap: GraphSnapshot, nodes: np.ndarray, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Extend every path (nodes (P, h+1), edges (P, h)) by one hop through the CSR adjacency,
+    keeping embedded end nodes whose name differs from every node already on the path.
+    Output rows stay grouped by input row, in adjacency order.
+    """
+    last = nodes[:, -1]
+    lo = snap.indptr[last]
+    counts = snap.indptr[last + 1] - lo
+    row = np.repeat(np.arange(len(nodes)), counts)
+    slots = _concat_ranges(lo, counts)
+    nxt = snap.adj_nbr[slots]
+    nxt_edge = snap.adj_edge[slots]
+    keep = snap.has_emb[nxt] & ~(snap.name_key[nodes[row]] == snap.name_key[nxt][:, None]).any(axis=1)
+    row, nxt, nxt_edge = row[keep], nxt[keep], nxt_edge[keep]
+    return np.column_stack([nodes[row], nxt]).astype(np.int32), np.column_stack([edges[row], nxt_edge]).astype(np.int32)
+
+
+def _materialize(snap: GraphSnapshot, starts: np.ndarray, max_hops: int) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """ All 1..max_hops paths leaving the given (sorted) start nodes: {k: (nodes, edges)} """
+    starts = np.asarray(starts, dtype=np.int32)
+    nodes = starts[snap.has_emb[starts]][:, None]
+    edges = np.zeros((len(nodes), 0), dtype=np.int32)
+    out = {}
+    for k in range(1, max_hops + 1):
+        nodes, edges = _extend_paths(snap, nodes, edges)
+        out[k] = (nodes, edges)
+    return out
+
+
+def _indptr(num_nodes: int, starts: np.ndarray) -> np.ndarray:
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(starts, minlength=num_nodes), out=indptr[1:])
+    return indptr
+
+
+def _write_table(root: Path, snap: GraphSnapshot, tables: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> None:
+    """
+    Write the arrays and meta into a new version directory, then switch CURRENT to it with one atomic rename.
+    Files a reader has memory-mapped are never overwritten; versions older than the previous one are removed
+    where possible (a reader may still hold them open on Windows).
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    previous = _version_dir(root)
+    versions = [int(m.group(1)) for m in (re.fullmatch(r"v(\d+)", p.name) for p in root.iterdir()) if m]
+    version = f"v{max(versions, default=0) + 1:06d}"
+    target = root / version
+    target.mkdir()
+    for k, (nodes, edges) in tables.items():
+        np.save(target / f"k{k}_indptr.npy", _indptr(snap.num_nodes, nodes[:, 0]))
+        np.save(target / f"k{k}_nodes.npy", nodes)
+        np.save(target / f"k{k}_edges.npy", edges)
+    with open(target / _META_FILE, "w", encoding="utf-8") as f:
+        json.dump({"max_hops": max(tables), "num_nodes": snap.num_nodes, "num_edges": len(snap.edge_head),
+                   "snapshot_fingerprint": snap.fingerprint()}, f)
+    pointer = root / (_CURRENT_FILE + ".tmp")
+    pointer.write_text(version, encoding="utf-8")
+    os.replace(pointer, root / _CURRENT_FILE)
+    for p in root.iterdir():
+        if p.is_dir() and re.fullmatch(r"v\d+", p.name) and p.name not in (version, previous.name):
+            shutil.rmtree(p, ignore_errors=True)
+    load_path_table.cache_clear()
+
+
+def build_path_table(table_dir: str = PATH_TABLE_DIR, snapshot_dir: str = graph_snapshot.SNAPSHOT_DIR,
+                     max_hops: int = PATH_TABLE_MAX_HOPS, chunk_starts: int = BUILD_CHUNK_STARTS) -> None:
+    """
+    Offline job: materialize every simple 1..max_hops path of the snapshot into the path table.
+    """
+    snap = load_graph_snapshot(snapshot_dir)
+    chunks = {k: ([], []) for k in range(1, max_hops + 1)}
+    print(f"🛠️ Materializing 1..{max_hops}-hop paths for {snap.num_nodes} start nodes ...")
+    for lo in range(0, snap.num_nodes, chunk_starts):
+        for k, (nodes, edges) in _materialize(snap, np.arange(lo, min(lo + chunk_starts, snap.num_nodes)), max_hops).items():
+            chunks[k][0].append(nodes)
+            chunks[k][1].append(edges)
+        print(f"  - {min(lo + chunk_starts, snap.num_nodes)}/{snap.num_nodes} start nodes done")
+    tables = {
+        k: (np.concatenate(nodes) if nodes else np.zeros((0, k + 1), dtype=np.int32),
+            np.concatenate(edges) if edges else np.zeros((0, k), dtype=np.int32))
+        for k, (nodes, edges) in chunks.items()
+    }
+    _write_table(Path(table_dir), snap, tables)
+    print(f"✅ Path table written to {table_dir}: " + ", ".join(f"{len(n)} {k}-hop" for k, (n, _) in tables.items()))
+
+
+# === Incremental maintenance ===
+
+def _within_hops(snap: GraphSnapshot, seeds: np.ndarray, hops: int) -> np.ndarray:
+    """ Sorted ids of all nodes at most `hops` steps away from the seeds """
+    reached = np.unique(np.asarray(seeds, dtype=np.int32))
+    frontier = reached
+    for _ in range(hops):
+        lo = snap.indptr[frontier]
+        nbrs = np.unique(snap.adj_nbr[_concat_ranges(lo, snap.indptr[frontier + 1] - lo)])
+        frontier = np.setdiff1d(nbrs, reached)
+        reached = np.union1d(reached, frontier)
+    return reached
+
+
+def refresh_start_nodes(starts: np.ndarray, table_dir: str = PATH_TABLE_DIR,
+                        snapshot_dir: str = graph_snapshot.SNAPSHOT_DIR) -> None:
+    """ Recompute the rows of the given start nodes against the current snapshot and splice them into the table """
+    snap = load_graph_snapshot(snapshot_dir)
+    root = Path(table_dir)
+    old = PathTable(table_dir)
+    starts = np.unique(np.asarray(starts, dtype=np.int32))
+    fresh = _materialize(snap, starts, old.max_hops)
+    tables = {}
+    for k in range(1, old.max_hops + 1):
+        old_nodes, old_edges = np.asarray(old.nodes[k]), np.asarray(old.edges[k])
+        keep = ~np.isin(old_nodes[:, 0], starts)
+        nodes = np.concatenate([old_nodes[keep], fresh[k][0]])
+        edges = np.concatenate([old_edges[keep], fresh[k][1]])
+        order = np.argsort(nodes[:, 0], kind="stable")
+        tables[k] = (nodes[order], edges[order])
+    _write_table(root, snap, tables)
+
+
+def add_edges(edges: List[Dict[str, Any]], table_dir: str = PATH_TABLE_DIR,
+              snapshot_dir: str = graph_snapshot.SNAPSHOT_DIR) -> None:
+    """
+    Incremental maintenance after relationships were added to the graph:
+    append them to the snapshot, then recompute only the start nodes whose paths can pass through them
+    (nodes within max_hops - 1 hops of a new edge's endpoints).
+    edges: [{"triple": (head, rel, tail), "source": ..., "paragraph": ...}]
+    """
+    new_ids = append_snapshot_edges(snapshot_dir, edges)
+    if not len(new_ids):
+        return
+    snap = load_graph_snapshot(snapshot_dir)
+    max_hops = PathTable(table_dir).meta["max_hops"]
+    endpoints = np.concatenate([snap.edge_head[new_ids], snap.edge_tail[new_ids]])
+    affected = _within_hops(snap, endpoints, max_hops - 1)
+    print(f"🔁 Refreshing paths of {len(affected)} start nodes affected by {len(new_ids)} new relationships ...")
+    refresh_start_nodes(affected, table_dir, snapshot_dir)
+    print("✅ Path table up to date")
+
+
+if __name__ == "__main__":
+    build_path_table(PATH_TABLE_DIR, graph_snapshot.SNAPSHOT_DIR, PATH_TABLE_MAX_HOPS)
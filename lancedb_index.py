@@ -0,0 +1,377 @@
+"""
+ANN index lifecycle of the LanceDB "documents" table.
+python lancedb_index.py build    : (re)build the vector index, the scalar index on file and the full-text index
+python lancedb_index.py refresh  : fold newly added rows into the index, rebuilding when too many are unindexed
+python lancedb_index.py status   : indexed / unindexed row counts
+python lancedb_index.py recall   : recall@k and latency of the index against a flat scan
+python lancedb_index.py hybrid   : recall@k and latency of vector / BM25 / hybrid first-stage retrieval
+python lancedb_index.py block    : export the memory-mapped vector block used by batched multi-entity search
+"""
+import sys
+import json
+import math
+import time
+import numpy as np
+from pathlib import Path
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+# "IVF_PQ" or "IVF_HNSW_SQ"
+INDEX_TYPE = "IVF_PQ"
+VECTOR_COLUMN = "vector"
+# Column of the blocked-source prefilter and its scalar index type ("BITMAP" suits a few thousand distinct files)
+FILE_COLUMN = "file"
+FILE_INDEX_TYPE = "BITMAP"
+# Column of the full-text (BM25) index used by fts / hybrid retrieval
+TEXT_COLUMN = "text"
+INDEX_METRIC = "cosine"
+# IVF partitions (None = sqrt(rows)) and PQ sub-vectors (None = dim / 16; must divide dim)
+NUM_PARTITIONS: Optional[int] = None
+NUM_SUB_VECTORS: Optional[int] = None
+# Below this many rows a flat scan is fast and exact, so no index is built
+MIN_ROWS_FOR_INDEX = 10000
+# Default search parameters of indexed queries: partitions probed, and re-ranking of
+# refine_factor * limit candidates with full vectors (None = PQ distances only)
+NPROBES = 20
+REFINE_FACTOR: Optional[int] = 5
+# refresh_index rebuilds from scratch once this fraction of rows is unindexed (appends degrade the IVF centroids);
+# below it, new rows are folded into the existing index
+REBUILD_UNINDEXED_FRACTION = 0.2
+# Identity of a document row in recall measurements
+_ROW_KEY = ("file", "page", "text")
+# Directory of the exported, memory-mapped vector block (see export_vector_block)
+VECTOR_BLOCK_DIR = r""
+# Rows scored per matrix multiply when searching the vector block
+VECTOR_BLOCK_CHUNK = 262144
+
+_BLOCK_VECTORS = "vectors.npy"
+_BLOCK_FILE_CODES = "file_codes.npy"
+_BLOCK_META = "meta.json"
+
+
+def _table(table=None):
+    if table is None:
+        from text_retrival import get_table
+        table = get_table()
+    return table
+
+
+def _column_index(table, column: str) -> Optional[Any]:
+    for index in table.list_indices():
+        if column in index.columns:
+            return index
+    return None
+
+
+def _vector_index(table) -> Optional[Any]:
+    return _column_index(table, VECTOR_COLUMN)
+
+
+def index_status(table=None) -> Dict[str, Any]:
+    """ Row counts of the table and of its vector index, and the name of the scalar index on file """
+    table = _table(table)
+    rows = table.count_rows()
+    file_index = getattr(_column_index(table, FILE_COLUMN), "name", None)
+    index = _vector_index(table)
+    if index is None:
+        return {"rows": rows, "index": None, "indexed_rows": 0, "unindexed_rows": rows, "file_index": file_index}
+    stats = table.index_stats(index.name)
+    return {
+        "rows": rows,
+        "index": index.name,
+        "index_type": getattr(stats, "index_type", None),
+        "indexed_rows": stats.num_indexed_rows,
+        "unindexed_rows": stats.num_unindexed_rows,
+        "file_index": file_index,
+    }
+
+
+def build_index(table=None, index_type: str = INDEX_TYPE, num_partitions: Optional[int] = NUM_PARTITIONS,
+                num_sub_vectors: Optional[int] = NUM_SUB_VECTORS) -> Dict[str, Any]:
+    """ Build (or replace) the vector index over every row; returns index_status() """
+    table = _table(table)
+    rows = table.count_rows()
+    dim = table.schema.field(VECTOR_COLUMN).type.list_size
+    num_partitions = num_partitions or max(1, int(math.sqrt(rows)))
+    params = {"metric": INDEX_METRIC, "vector_column_name": VECTOR_COLUMN, "num_partitions": num_partitions,
+              "index_type": index_type, "replace": True}
+    if index_type == "IVF_PQ":
+        params["num_sub_vectors"] = num_sub_vectors or max(1, dim // 16)
+    print(f"🛠️ Building {index_type} index on {rows} rows ({params}) ...")
+    started = time.perf_counter()
+    table.create_index(**params)
+    print(f"✅ Index built in {time.perf_counter() - started:.1f}s")
+    return index_status(table)
+
+
+def build_scalar_index(table=None, column: str = FILE_COLUMN, index_type: str = FILE_INDEX_TYPE) -> None:
+    """ (Re)build the scalar index that serves the blocked-source prefilter """
+    table = _table(table)
+    print(f"🛠️ Building {index_type} scalar index on {column} ...")
+    table.create_scalar_index(column, index_type=index_type, replace=True)
+    print("✅ Scalar index built")
+
+
+def build_fts_index(table=None, column: str = TEXT_COLUMN) -> None:
+    """ (Re)build the BM25 full-text index used by fts / hybrid retrieval """
+    table = _table(table)
+    print(f"🛠️ Building full-text index on {column} ...")
+    started = time.perf_counter()
+    table.create_fts_index(column, replace=True)
+    print(f"✅ Full-text index built in {time.perf_counter() - started:.1f}s")
+
+
+def refresh_index(table=None, rebuild_fraction: float = REBUILD_UNINDEXED_FRACTION) -> Dict[str, Any]:
+    """
+    Bring the indices up to date after inserts: build the vector index once the table is large enough, rebuild it
+    when more than rebuild_fraction of the rows are unindexed, otherwise append the new rows to the existing
+    indices (vector, file and full-text) with optimize().
+    """
+    table = _table(table)
+    if _column_index(table, FILE_COLUMN) is None:
+        build_scalar_index(table)
+    if _column_index(table, TEXT_COLUMN) is None:
+        build_fts_index(table)
+    status = index_status(table)
+    if status["index"] is None:
+        if status["rows"] >= MIN_ROWS_FOR_INDEX:
+            build_index(table)
+    elif status["unindexed_rows"] > rebuild_fraction * status["rows"]:
+        build_index(table)
+    elif status["unindexed_rows"] == 0:
+        return status
+    # Fold new rows into the scalar and full-text indices (and into the vector index when it was not rebuilt)
+    print("🛠️ Adding new rows to the existing indices ...")
+    table.optimize()
+    return index_status(table)
+
+
+def add_documents(rows: List[Dict[str, Any]], table=None) -> Dict[str, Any]:
+    """ Bulk insert document rows (text, file, page, vector) and re-index; returns index_status() """
+    table = _table(table)
+    table.add(rows)
+    print(f"✅ Added {len(rows)} documents")
+    status = refresh_index(table)
+    if VECTOR_BLOCK_DIR and (Path(VECTOR_BLOCK_DIR) / _BLOCK_META).exists():
+        export_vector_block(VECTOR_BLOCK_DIR, table)
+    return status
+
+
+class VectorBlock:
+    """
+    Exported copy of the table's vectors for exact batched search: an (N, dim) L2-normalized float32 matrix
+    and the file code of every row, both memory-mapped. Row i is row offset i of the exported table version.
+    """
+
+    def __init__(self, block_dir: str):
+        root = Path(block_dir)
+        self.meta = json.loads((root / _BLOCK_META).read_text(encoding="utf-8"))
+        self.vectors = np.load(root / _BLOCK_VECTORS, mmap_mode="r")
+        self.file_codes = np.load(root / _BLOCK_FILE_CODES, mmap_mode="r")
+        self.files: List[str] = self.meta["files"]
+        self._file_code = {f: i for i, f in enumerate(self.files)}
+
+    @property
+    def version(self) -> int:
+        return self.meta["version"]
+
+    def search(self, query_vecs: np.ndarray, k: int, blocked_files=()) -> List[np.ndarray]:
+        """ Row offsets of the k most cosine-similar rows of every query, best first, skipping blocked files """
+        queries = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        blocked_codes = np.array([self._file_code[f] for f in blocked_files if f in self._file_code], dtype=np.int32)
+        n_queries = len(queries)
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+        for start in range(0, len(self.vectors), VECTOR_BLOCK_CHUNK):
+            chunk = np.asarray(self.vectors[start:start + VECTOR_BLOCK_CHUNK])
+            scores = queries @ chunk.T
+            if len(blocked_codes):
+                scores[:, np.isin(self.file_codes[start:start + len(chunk)], blocked_codes)] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(chunk)), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return [r[o][np.isfinite(s[o])] for r, s, o in zip(best_rows, best_scores, order)]
+
+
+def export_vector_block(out_dir: str = VECTOR_BLOCK_DIR, table=None, batch_rows: int = 65536) -> None:
+    """ Offline job: write the current table version's vectors and file codes as a VectorBlock """
+    table = _table(table)
+    dataset = table.to_lance()
+    rows = dataset.count_rows()
+    dim = table.schema.field(VECTOR_COLUMN).type.list_size
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    # Without meta the block is not used, so readers never pair new arrays with the old version
+    (out / _BLOCK_META).unlink(missing_ok=True)
+    print(f"🛠️ Exporting {rows} x {dim} vectors of version {table.version} to {out} ...")
+    vectors = np.lib.format.open_memmap(out / (_BLOCK_VECTORS + ".tmp"), mode="w+", dtype=np.float32, shape=(rows, dim))
+    file_codes = np.empty(rows, dtype=np.int32)
+    files: Dict[str, int] = {}
+    offset = 0
+    for batch in dataset.to_batches(columns=[VECTOR_COLUMN, FILE_COLUMN], batch_size=batch_rows):
+        block = np.asarray(batch.column(VECTOR_COLUMN).flatten(), dtype=np.float32).reshape(-1, dim)
+        vectors[offset:offset + len(block)] = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+        file_codes[offset:offset + len(block)] = [files.setdefault(f, len(files)) for f in batch.column(FILE_COLUMN).to_pylist()]
+        offset += len(block)
+    vectors.flush()
+    del vectors
+    with open(out / (_BLOCK_FILE_CODES + ".tmp"), "wb") as f:
+        np.save(f, file_codes)
+    (out / (_BLOCK_VECTORS + ".tmp")).replace(out / _BLOCK_VECTORS)
+    (out / (_BLOCK_FILE_CODES + ".tmp")).replace(out / _BLOCK_FILE_CODES)
+    meta = {"version": table.version, "rows": rows, "dim": dim, "files": list(files)}
+    (out / _BLOCK_META).write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    load_vector_block.cache_clear()
+    print("✅ Vector block exported")
+
+
+@lru_cache(maxsize=1)
+def load_vector_block(block_dir: str) -> Optional[VectorBlock]:
+    if not block_dir or not (Path(block_dir) / _BLOCK_META).exists():
+        return None
+    return VectorBlock(block_dir)
+
+
+def get_vector_block(table=None) -> Optional[VectorBlock]:
+    """ The vector block of VECTOR_BLOCK_DIR if it matches the table's current version, else None """
+    block = load_vector_block(VECTOR_BLOCK_DIR)
+    if block is None:
+        return None
+    if block.version != _table(table).version:
+        print("⚠️ Vector block is stale (table changed since export); using LanceDB search")
+        return None
+    return block
+
+
+def apply_search_params(query, nprobes: Optional[int] = None, refine_factor: Optional[int] = None):
+    """
+    Set the ANN parameters of a LanceDB vector query (NPROBES / REFINE_FACTOR when not given)
+    and its distance to INDEX_METRIC, which the index was built with (LanceDB otherwise defaults to L2).
+    """
+    query = query.distance_type(INDEX_METRIC).nprobes(nprobes or NPROBES)
+    refine_factor = REFINE_FACTOR if refine_factor is None else refine_factor
+    if refine_factor:
+        query = query.refine_factor(refine_factor)
+    return query
+
+
+def _search_keys(table, vec: np.ndarray, k: int, flat: bool, nprobes: Optional[int], refine_factor: Optional[int]):
+    query = table.search(vec.tolist(), query_type="vector").select(list(_ROW_KEY)).limit(k)
+    if flat:
+        query = query.distance_type(INDEX_METRIC).bypass_vector_index()
+    else:
+        query = apply_search_params(query, nprobes, refine_factor)
+    started = time.perf_counter()
+    rows = query.to_list()
+    return [tuple(r[c] for c in _ROW_KEY) for r in rows], time.perf_counter() - started
+
+
+def recall_at_k(k: int = 15, n_queries: int = 100, nprobes: Optional[int] = None,
+                refine_factor: Optional[int] = None, table=None, queries: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Mean recall@k of the ANN index against an exact flat scan, with mean latencies of both.
+    Queries are held out from the table: KG entity names (or `queries`) embedded the way entity retrieval
+    embeds them, since stored document vectors would find themselves and inflate recall.
+    """
+    from embedding_utils import embed_many
+    table = _table(table)
+    queries = queries or _benchmark_queries(n_queries)
+    vecs = embed_many([f"Find scientific paragraphs about: {q}" for q in queries]) if queries else []
+    recalls, ann_times, flat_times = [], [], []
+    for vec in vecs:
+        vec = np.asarray(vec, dtype=np.float32)
+        exact, flat_time = _search_keys(table, vec, k, True, nprobes, refine_factor)
+        approx, ann_time = _search_keys(table, vec, k, False, nprobes, refine_factor)
+        if exact:
+            recalls.append(len(set(exact) & set(approx)) / len(exact))
+        ann_times.append(ann_time)
+        flat_times.append(flat_time)
+    report = {
+        "k": k,
+        "queries": len(recalls),
+        "nprobes": nprobes or NPROBES,
+        "refine_factor": REFINE_FACTOR if refine_factor is None else refine_factor,
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+        "ann_ms": 1000 * float(np.mean(ann_times)) if ann_times else 0.0,
+        "flat_ms": 1000 * float(np.mean(flat_times)) if flat_times else 0.0,
+    }
+    print(f"📊 recall@{k} = {report['recall']:.3f} over {report['queries']} queries "
+          f"(nprobes={report['nprobes']}, refine_factor={report['refine_factor']}) | "
+          f"ANN {report['ann_ms']:.1f} ms vs flat {report['flat_ms']:.1f} ms")
+    return report
+
+
+def _benchmark_queries(n: int) -> List[str]:
+    """ Entity names of the KG: the short, term-heavy queries of entity retrieval """
+    from graph_query import _driver
+    from entity_names import ENTITY_LABEL
+    with _driver.session() as session:
+        return [r["name"] for r in session.run(
+            f"MATCH (n:{ENTITY_LABEL}) WHERE n.name IS NOT NULL RETURN n.name AS name LIMIT $n", n=n
+        )]
+
+
+def benchmark_retrieval(reranker, queries: Optional[List[str]] = None, k: int = 3, candidates: int = 15,
+                        pool: int = 100, modes: Tuple[str, ...] = ("vector", "fts", "hybrid")) -> Dict[str, Any]:
+    """
+    First-stage recall@k and latency of each retrieval mode.
+    The reference top-k of a query is what the reranker picks from a large pool (the union of the vector and
+    BM25 top-`pool` lists); recall is the share of it already inside a mode's `candidates` first-stage rows,
+    i.e. how small the reranker candidate set can be.
+    """
+    from embedding_utils import embed_many
+    from text_retrival import search_candidates, vector_candidates, fts_candidates, _row_key
+    queries = queries or _benchmark_queries(50)
+    vecs = embed_many([f"Find scientific paragraphs about: {q}" for q in queries])
+    recalls = {mode: [] for mode in modes}
+    latency = {mode: [] for mode in modes}
+    for query, vec in zip(queries, vecs):
+        pooled = {_row_key(r): r for r in [*vector_candidates(vec, limit=pool), *fts_candidates(query, limit=pool)]}
+        if not pooled:
+            continue
+        keys = list(pooled)
+        scores = reranker.compute_score([(query, pooled[key]["text"]) for key in keys])
+        reference = {keys[i] for i in np.argsort(-np.asarray(scores), kind="stable")[:k]}
+        for mode in modes:
+            started = time.perf_counter()
+            rows = search_candidates(vec, query, mode=mode, limit=candidates)
+            latency[mode].append(time.perf_counter() - started)
+            recalls[mode].append(len(reference & {_row_key(r) for r in rows}) / len(reference))
+    report = {
+        mode: {"recall": float(np.mean(recalls[mode])) if recalls[mode] else 0.0,
+               "ms": 1000 * float(np.mean(latency[mode])) if latency[mode] else 0.0}
+        for mode in modes
+    }
+    print(f"📊 First-stage recall@{k} of the reranker's choice with {candidates} candidates "
+          f"({len(recalls[modes[0]])} queries)")
+    for mode, r in report.items():
+        print(f"  {mode:<8} recall {r['recall']:.3f} | {r['ms']:.1f} ms")
+    return report
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "build":
+        build_scalar_index()
+        build_fts_index()
+        print(build_index())
+    elif command == "refresh":
+        print(refresh_index())
+    elif command == "recall":
+        names = _benchmark_queries(100)
+        for probes in (5, 10, 20, 50):
+            recall_at_k(nprobes=probes, queries=names)
+    elif command == "block":
+        export_vector_block()
+    elif command == "hybrid":
+        from rerank_service import get_rerank_service
+        for n_candidates in (5, 10, 15):
+            benchmark_retrieval(get_rerank_service(), candidates=n_candidates)
+    else:
+        print(index_status())
@@ -1,4 +1,6 @@
+import heapq
 import numpy as np
+from typing import Optional, Tuple, Iterable, Callable, List, Dict
 
 # Input two vectors and return their similarity (normalized dot product)
 def sim(vec1: np.ndarray, vec2: np.ndarray) -> float:
@@ -6,8 +8,116 @@ def sim(vec1: np.ndarray, vec2: np.ndarray) -> float:
 
 # Calculate the sum of similarities between the question vector and a set of vectors (such as segments or description vectors on a link).
 def score_vector_list(query_vec: np.ndarray, vecs: list[np.ndarray]) -> float:
-    return sum(sim(query_vec, v) for v in vecs)
+    if not vecs:
+        return 0.0
+    return float(np.sum(np.stack(vecs) @ np.ravel(query_vec)))
 
 # Calculate the vector score (description + paragraph) in the link.
 def score_path(query_vec: np.ndarray, desc_embs: list[np.ndarray], para_embs: list[np.ndarray], alpha=1.0, beta=1.0) -> float:
     return alpha * score_vector_list(query_vec, desc_embs) + beta * score_vector_list(query_vec, para_embs)
+
+
+def _as_queries(query_vecs: np.ndarray) -> Tuple[np.ndarray, bool]:
+    """
+    Normalize query input to a (Q, dim) matrix.
+    A 1-D vector or a single (1, dim) row (what embed([...]) returns) counts as one query.
+    """
+    q = np.asarray(query_vecs, dtype=np.float32)
+    single = q.ndim == 1 or q.shape[0] == 1
+    return q.reshape(-1, q.shape[-1]), single
+
+
+# Stack variable-length per-path vector lists into a zero-padded (paths, hops, dim) tensor and a (paths, hops) mask.
+def pad_path_embeddings(paths_embs: list[list[np.ndarray]], dim: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    hops = max((len(embs) for embs in paths_embs), default=0)
+    if dim is None:
+        dim = next((len(embs[0]) for embs in paths_embs if len(embs)), 0)
+    tensor = np.zeros((len(paths_embs), hops, dim), dtype=np.float32)
+    mask = np.zeros((len(paths_embs), hops), dtype=bool)
+    for i, embs in enumerate(paths_embs):
+        if len(embs):
+            tensor[i, :len(embs)] = np.stack(embs)
+            mask[i, :len(embs)] = True
+    return tensor, mask
+
+
+# Score all padded paths at once: alpha * sum(q·desc) + beta * sum(q·para) over the existing hops of each path.
+def score_paths_batch(query_vecs: np.ndarray, desc_embs: np.ndarray, para_embs: np.ndarray, mask: Optional[np.ndarray] = None, alpha=1.0, beta=1.0) -> np.ndarray:
+    """
+    desc_embs, para_embs: (paths, hops, dim) tensors; mask: (paths, hops), true where a hop exists.
+    query_vecs: (dim,) or (Q, dim).
+    Returns (paths,) scores for a single query, (paths, Q) for several.
+    """
+    q, single = _as_queries(query_vecs)
+    n_paths, hops, dim = desc_embs.shape
+    # (paths * hops, dim) @ (dim, Q) for each embedding family
+    desc_sims = (desc_embs.reshape(-1, dim) @ q.T).reshape(n_paths, hops, -1)
+    para_sims = (para_embs.reshape(-1, dim) @ q.T).reshape(n_paths, hops, -1)
+    sims = alpha * desc_sims + beta * para_sims
+    if mask is not None:
+        sims = sims * mask[:, :, None]
+    scores = sims.sum(axis=1)
+    return scores[:, 0] if single else scores
+
+
+# Score paths given as rows of embedding matrices (e.g. a node embedding store); -1 marks padding.
+def score_rows_batch(query_vecs: np.ndarray, desc_matrix: np.ndarray, para_matrix: np.ndarray, rows: np.ndarray, alpha=1.0, beta=1.0) -> np.ndarray:
+    """
+    rows: (paths, hops) integer array of matrix rows, padded with -1.
+    Every distinct row is scored once, then scattered back into the path layout.
+    Returns (paths,) scores for a single query, (paths, Q) for several.
+    """
+    q, single = _as_queries(query_vecs)
+    rows = np.asarray(rows, dtype=np.int64)
+    valid = rows >= 0
+    uniq, inverse = np.unique(rows[valid], return_inverse=True)
+    node_sims = alpha * (desc_matrix[uniq] @ q.T) + beta * (para_matrix[uniq] @ q.T)
+    sims = np.zeros(rows.shape + (q.shape[0],), dtype=np.float32)
+    sims[valid] = node_sims[inverse]
+    scores = sims.sum(axis=1)
+    return scores[:, 0] if single else scores
+
+
+# Convenience wrapper: pad per-path vector lists and score them in one batch.
+def score_paths(query_vec: np.ndarray, desc_embs_per_path: list[list[np.ndarray]], para_embs_per_path: list[list[np.ndarray]], alpha=1.0, beta=1.0) -> np.ndarray:
+    if not desc_embs_per_path:
+        return np.zeros(0, dtype=np.float32)
+    desc, mask = pad_path_embeddings(desc_embs_per_path)
+    para, _ = pad_path_embeddings(para_embs_per_path, dim=desc.shape[2])
+    return score_paths_batch(query_vec, desc, para, mask, alpha=alpha, beta=beta)
+
+
+# Streaming top-k: score paths one at a time as they arrive and keep only the best k.
+def top_k_paths(paths: Iterable[Dict], query_vec: np.ndarray, k: int, accept: Optional[Callable[[Dict], bool]] = None,
+                best_first: bool = False, alpha=1.0, beta=1.0) -> List[Tuple[float, Dict]]:
+    """
+    Consume `paths` lazily with a bounded heap (O(k) paths held).
+    accept: optional filter; rejected paths are skipped without scoring.
+    best_first: the stream arrives in non-increasing score_path order with alpha = beta = 1 (iter_khop_paths
+    with a query vector), so consumption stops at the first accepted path that cannot enter the heap.
+    Returns [(score, path), ...] best first; equal scores keep stream order, like a stable sort.
+    """
+    if k <= 0:
+        return []
+    q = np.ravel(query_vec)
+    # The stream order only bounds the unweighted score; other weights must consume every path
+    best_first = best_first and alpha == 1.0 and beta == 1.0
+    heap = []
+    stream = iter(paths)
+    try:
+        for seq, path in enumerate(stream):
+            if accept is not None and not accept(path):
+                continue
+            score = score_path(q, path["desc_embs"], path["para_embs"], alpha=alpha, beta=beta)
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -seq, path))
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, (score, -seq, path))
+            elif best_first:
+                break
+    finally:
+        # Stop a lazily streamed query (generator) right away instead of at garbage collection
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    return [(score, path) for score, _, path in sorted(heap, key=lambda item: (-item[0], -item[1]))]
@@ -0,0 +1,143 @@
+"""
+Process-wide model registry.
+Every module asks here for its models instead of constructing them, so each model path is loaded once,
+on first use (or up front with warmup()), and importing a module never loads a model.
+"""
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_models: Dict[Tuple[str, str], Any] = {}
+_load_stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def get_device() -> str:
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _rss_bytes() -> Optional[int]:
+    """ Resident set size of this process, None where /proc is unavailable """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _gpu_bytes() -> int:
+    try:
+        import torch
+    except ImportError:  # CPU-only ONNX deployments
+        return 0
+    return torch.cuda.memory_allocated() if torch.cuda.is_available() else 0
+
+
+def _load_sentence_transformer(path: str) -> Any:
+    from sentence_transformers import SentenceTransformer
+    device = get_device()
+    model = SentenceTransformer(path)
+    model.to(device)
+    return model
+
+
+def _load_reranker(path: str) -> Any:
+    from FlagEmbedding import FlagReranker
+    import torch
+    device = get_device()
+    # fp16 only pays off on GPU; on CPU it is slow or unsupported
+    reranker = FlagReranker(path, use_fp16=device == "cuda")
+    reranker.model.to(torch.device(device))
+    if device == "cuda":
+        reranker.model.half()
+    return reranker
+
+
+def _load_onnx_reranker(path: str) -> Any:
+    from rerank_service import OnnxCrossEncoder
+    return OnnxCrossEncoder(path)
+
+
+def _load_onnx_embedder(path: str) -> Any:
+    from onnx_embedder import OnnxEmbedder
+    return OnnxEmbedder(path, quantized=False)
+
+
+def _load_onnx_embedder_int8(path: str) -> Any:
+    from onnx_embedder import OnnxEmbedder
+    return OnnxEmbedder(path, quantized=True)
+
+
+# kind -> loader(path)
+_LOADERS: Dict[str, Callable[[str], Any]] = {
+    "sentence_transformer": _load_sentence_transformer,
+    "reranker": _load_reranker,
+    "onnx_embedder": _load_onnx_embedder,
+    "onnx_embedder_int8": _load_onnx_embedder_int8,
+    "onnx_reranker": _load_onnx_reranker,
+}
+
+
+def get_model(kind: str, path: str) -> Any:
+    """ The shared instance of the `kind` model at `path`, loaded on first request """
+    key = (kind, os.path.abspath(path) if path else path)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        model = _models.get(key)
+        if model is None:
+            print(f"📦 Loading {kind} model {path or '(default)'} ...")
+            rss_before, gpu_before = _rss_bytes(), _gpu_bytes()
+            started = time.perf_counter()
+            model = _LOADERS[kind](path)
+            rss_after = _rss_bytes()
+            _load_stats[key] = {
+                "kind": kind,
+                "path": path,
+                "device": "cpu" if kind.startswith("onnx_") else get_device(),
+                "load_seconds": time.perf_counter() - started,
+                "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                "gpu_delta_bytes": _gpu_bytes() - gpu_before,
+            }
+            _models[key] = model
+            s = _load_stats[key]
+            rss = f"{s['rss_delta_bytes'] / 2 ** 20:.0f} MB" if s["rss_delta_bytes"] is not None else "n/a"
+            print(f"✅ {kind} loaded on {s['device']} in {s['load_seconds']:.1f}s (RSS +{rss}, "
+                  f"GPU +{s['gpu_delta_bytes'] / 2 ** 20:.0f} MB)")
+    return model
+
+
+def get_sentence_transformer(path: str) -> Any:
+    return get_model("sentence_transformer", path)
+
+
+def get_reranker(path: str) -> Any:
+    return get_model("reranker", path)
+
+
+def warmup(specs: Optional[List[Tuple[str, str]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Load models before the first question instead of on it.
+    specs: (kind, path) pairs; defaults to the embedding model of embedding_utils (its EMBED_BACKEND).
+    Returns model_stats().
+    """
+    if specs is None:
+        import embedding_utils
+        embedding_utils.get_model()
+        specs = []
+    for kind, path in specs:
+        get_model(kind, path)
+    return model_stats()
+
+
+def model_stats() -> Dict[str, Dict[str, Any]]:
+    """ Load time, device and resident memory growth of every loaded model, plus the current process RSS """
+    stats = {f"{kind}:{path}": dict(s) for (kind, path), s in _load_stats.items()}
+    stats["process"] = {"rss_bytes": _rss_bytes()}
+    return stats
@@ -0,0 +1,117 @@
+import numpy as np
+from typing import List, Dict, Any, Optional
+from entity_names import ENTITY_LABEL
+# Per-hop fan-out caps of graph expansions: entry i limits how many neighbours of each node are followed
+# at hop i+1 of an expansion (query_direct_neighbors is hop 1). None = unlimited; hops past the list are unlimited.
+HUB_FANOUT: List[Optional[int]] = [None, None, None]
+# Which neighbours a capped hop keeps: "importance" (precomputed, see compute_node_degrees)
+# or "similarity" (to the question vector, where the caller provides one; Neo4j >= 5.18 vector functions)
+FANOUT_ORDER = "importance"
+VECTOR_SIMILARITY_FUNCTION = "vector.similarity.cosine"
+# Node properties written by compute_node_degrees
+DEGREE_PROPERTY = "degree"
+EMBEDDED_DEGREE_PROPERTY = "embedded_degree"
+IMPORTANCE_PROPERTY = "importance"
+
+
+def fanout_for(hop: int, caps: Optional[List[Optional[int]]] = None) -> Optional[int]:
+    """ Cap of a 1-based hop, None if unlimited """
+    caps = HUB_FANOUT if caps is None else caps
+    return caps[hop - 1] if 0 < hop <= len(caps) else None
+
+
+def importance_from_degree(degree):
+    """
+    Importance used to rank neighbours under a fan-out cap: specific (low-degree) nodes rank above generic hubs.
+    Works on scalars and numpy arrays.
+    """
+    return 1.0 / np.log2(2.0 + np.asarray(degree, dtype=np.float64))
+
+
+def compute_node_degrees(driver=None, batch_size: int = 10000) -> int:
+    """
+    Offline job: store degree, embedded_degree (neighbours carrying both embeddings) and importance on every
+    :Entity node. Re-run after loading new data. Returns the number of nodes updated.
+    """
+    if driver is None:
+        from graph_query import _driver as driver
+
+    update = f"""
+    UNWIND $rows AS row
+    MATCH (n) WHERE elementId(n) = row.id
+    SET n.{DEGREE_PROPERTY} = row.degree,
+        n.{EMBEDDED_DEGREE_PROPERTY} = row.embedded_degree,
+        n.{IMPORTANCE_PROPERTY} = row.importance
+    """
+    updated = 0
+    with driver.session() as session:
+        records = list(session.run(f"""
+        MATCH (n:{ENTITY_LABEL})
+        RETURN elementId(n) AS id,
+               COUNT {{ (n)--() }} AS degree,
+               COUNT {{ (n)--(m) WHERE m.gnn_embedding_v1 IS NOT NULL AND m.paragraph_embedding_v1 IS NOT NULL }} AS embedded_degree
+        """))
+        print(f"🛠️ Writing degree statistics of {len(records)} nodes ...")
+        for i in range(0, len(records), batch_size):
+            batch = records[i:i + batch_size]
+            importance = importance_from_degree([r["degree"] for r in batch])
+            rows = [
+                {"id": r["id"], "degree": r["degree"], "embedded_degree": r["embedded_degree"], "importance": float(imp)}
+                for r, imp in zip(batch, importance)
+            ]
+            session.run(update, rows=rows).consume()
+            updated += len(rows)
+            print(f"  - {updated}/{len(records)} nodes updated")
+    print(f"✅ Degree statistics written for {updated} nodes")
+    return updated
+
+
+def hub_report(top: int = 30, driver=None, caps: Optional[List[Optional[int]]] = None) -> List[Dict[str, Any]]:
+    """
+    The `top` highest-degree nodes with the rows a 1-hop and a 2-hop expansion from them returns,
+    uncapped and under the fan-out caps (HUB_FANOUT by default). Requires compute_node_degrees.
+    """
+    if driver is None:
+        from graph_query import _driver as driver
+
+    caps = HUB_FANOUT if caps is None else caps
+    cap1, cap2 = fanout_for(1, caps), fanout_for(2, caps)
+    report = []
+    with driver.session() as session:
+        records = session.run(f"""
+        MATCH (n:{ENTITY_LABEL}) WHERE n.{DEGREE_PROPERTY} IS NOT NULL
+        WITH n ORDER BY n.{DEGREE_PROPERTY} DESC LIMIT $top
+        OPTIONAL MATCH (n)--(m)
+        WHERE m.gnn_embedding_v1 IS NOT NULL AND m.paragraph_embedding_v1 IS NOT NULL
+        WITH n, collect([coalesce(m.{EMBEDDED_DEGREE_PROPERTY}, 0), coalesce(m.{IMPORTANCE_PROPERTY}, 0.0)]) AS nbrs
+        RETURN n.name AS name, n.{DEGREE_PROPERTY} AS degree, n.{EMBEDDED_DEGREE_PROPERTY} AS embedded_degree, nbrs
+        ORDER BY degree DESC
+        """, top=top)
+        for r in records:
+            nbr_degrees = np.array([d for d, _ in r["nbrs"]], dtype=np.int64)
+            nbr_importance = np.array([imp for _, imp in r["nbrs"]], dtype=np.float64)
+            # A 2-hop path continues from each neighbour to every neighbour other than the way back
+            second = np.maximum(nbr_degrees - 1, 0)
+            kept = np.argsort(-nbr_importance, kind="stable")[:cap1] if cap1 is not None else np.arange(len(second))
+            capped_second = np.minimum(second[kept], cap2) if cap2 is not None else second[kept]
+            report.append({
+                "name": r["name"],
+                "degree": r["degree"],
+                "embedded_degree": r["embedded_degree"],
+                "one_hop_rows": len(second),
+                "two_hop_rows": int(second.sum()),
+                "capped_one_hop_rows": len(kept),
+                "capped_two_hop_rows": int(capped_second.sum()),
+            })
+
+    print(f"\n📊 Top {len(report)} hub nodes (fan-out caps: {caps})")
+    print(f"{'name':<40}{'degree':>10}{'1-hop':>10}{'2-hop':>12}{'1-hop cap':>12}{'2-hop cap':>12}")
+    for h in report:
+        print(f"{str(h['name'])[:39]:<40}{h['degree']:>10}{h['one_hop_rows']:>10}{h['two_hop_rows']:>12}"
+              f"{h['capped_one_hop_rows']:>12}{h['capped_two_hop_rows']:>12}")
+    return report
+
+
+if __name__ == "__main__":
+    compute_node_degrees()
+    hub_report()
@@ -0,0 +1,120 @@
+import json
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+from functools import lru_cache
+# Directory of the exported node embedding store (see export_node_embeddings)
+EMBEDDING_STORE_DIR = r""
+# Storage dtype of the exported matrix: "float32" or "float16" (half the size, ~1e-3 relative error)
+EMBEDDING_STORE_DTYPE = "float32"
+
+_MATRIX_FILE = "embeddings.npy"
+_INDEX_FILE = "index.json"
+
+
+class NodeEmbeddingStore:
+    """
+    Memory-mapped embeddings of all KG nodes.
+    matrix has shape (N, 2, dim): matrix[row, 0] is gnn_embedding_v1 (desc_emb),
+    matrix[row, 1] is paragraph_embedding_v1 (para_emb).
+    Rows are addressed by Neo4j elementId or by lower-cased node name.
+    """
+
+    def __init__(self, store_dir: str):
+        root = Path(store_dir)
+        self.matrix = np.load(root / _MATRIX_FILE, mmap_mode="r")
+        with open(root / _INDEX_FILE, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.ids: List[str] = index["ids"]
+        self.names: List[str] = index["names"]
+        self.row_by_id: Dict[str, int] = {node_id: i for i, node_id in enumerate(self.ids)}
+        self.row_by_name: Dict[str, int] = {}
+        for i, name in enumerate(self.names):
+            if name:
+                self.row_by_name.setdefault(name.lower(), i)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[2]
+
+    def row_of(self, node_id: str) -> Optional[int]:
+        return self.row_by_id.get(node_id)
+
+    def row_of_name(self, name: str) -> Optional[int]:
+        return self.row_by_name.get(name.lower()) if name else None
+
+    def desc(self, row: int) -> np.ndarray:
+        """ Zero-copy view of one desc embedding """
+        return self.matrix[row, 0]
+
+    def para(self, row: int) -> np.ndarray:
+        """ Zero-copy view of one paragraph embedding """
+        return self.matrix[row, 1]
+
+    def gather(self, rows) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Gather the desc and paragraph embeddings of many rows.
+        rows may have any shape; the results have shape rows.shape + (dim,).
+        """
+        block = self.matrix[np.asarray(rows, dtype=np.int64)]
+        return block[..., 0, :], block[..., 1, :]
+
+
+@lru_cache(maxsize=1)
+def load_node_embedding_store(store_dir: str) -> NodeEmbeddingStore:
+    """ Open the memory-mapped store once """
+    store = NodeEmbeddingStore(store_dir)
+    print(f"📦 Node embedding store opened: {len(store.ids)} nodes, dim {store.dim}, dtype {store.matrix.dtype}")
+    return store
+
+
+def get_node_embedding_store() -> NodeEmbeddingStore:
+    return load_node_embedding_store(EMBEDDING_STORE_DIR)
+
+
+def export_node_embeddings(store_dir: str = EMBEDDING_STORE_DIR, dtype: str = EMBEDDING_STORE_DTYPE, batch_log: int = 50000) -> None:
+    """
+    Offline export of gnn_embedding_v1 and paragraph_embedding_v1 of every embedded node
+    into a single memory-mapped matrix plus an elementId/name -> row index.
+    """
+    from graph_query import _driver
+
+    root = Path(store_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    with _driver.session() as session:
+        num_nodes = session.run("""
+        MATCH (n) WHERE n.gnn_embedding_v1 IS NOT NULL AND n.paragraph_embedding_v1 IS NOT NULL
+        RETURN count(n) AS c
+        """).single()["c"]
+        # Read the dimension from a single node rather than collecting every embedding on the server
+        sample = session.run("""
+        MATCH (n) WHERE n.gnn_embedding_v1 IS NOT NULL AND n.paragraph_embedding_v1 IS NOT NULL
+        RETURN size(n.gnn_embedding_v1) AS dim
+        LIMIT 1
+        """).single()
+        dim = sample["dim"] if sample else 0
+        print(f"📤 Exporting {num_nodes} node embeddings (dim {dim}, {dtype}) ...")
+        matrix = np.lib.format.open_memmap(root / _MATRIX_FILE, mode="w+", dtype=np.dtype(dtype), shape=(num_nodes, 2, dim))
+        ids, names = [], []
+        records = session.run("""
+        MATCH (n) WHERE n.gnn_embedding_v1 IS NOT NULL AND n.paragraph_embedding_v1 IS NOT NULL
+        RETURN elementId(n) AS id, n.name AS name, n.gnn_embedding_v1 AS desc_emb, n.paragraph_embedding_v1 AS para_emb
+        """)
+        for i, r in enumerate(records):
+            if i >= num_nodes:
+                print("⚠️ Graph grew during export; remaining nodes are skipped.")
+                break
+            matrix[i, 0] = np.asarray(r["desc_emb"], dtype=np.float32)
+            matrix[i, 1] = np.asarray(r["para_emb"], dtype=np.float32)
+            ids.append(r["id"])
+            names.append(r["name"])
+            if (i + 1) % batch_log == 0:
+                print(f"  - {i + 1} nodes exported")
+        matrix.flush()
+    with open(root / _INDEX_FILE, "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "names": names}, f, ensure_ascii=False)
+    print(f"✅ Node embedding store written to {root}: {len(ids)} rows")
+
+
+if __name__ == "__main__":
+    export_node_embeddings(EMBEDDING_STORE_DIR, EMBEDDING_STORE_DTYPE)
@@ -0,0 +1,183 @@
+"""
+ONNX Runtime CPU backend for the bge-large embedding model.
+`python onnx_embedder.py export` writes an fp32 ONNX graph plus a dynamically int8-quantized copy;
+`python onnx_embedder.py benchmark` compares the backend with PyTorch fp32 and with the stored vectors.
+Select it with embedding_utils.EMBED_BACKEND = "onnx".
+"""
+import sys
+import time
+import numpy as np
+from pathlib import Path
+from typing import List, Union, Dict, Any, Tuple, Optional
+# Directory holding model.onnx, model_int8.onnx and the tokenizer files (written by export_onnx)
+ONNX_MODEL_DIR = r""
+# Run the int8 dynamically quantized graph (False = the fp32 export)
+ONNX_QUANTIZED = True
+# ONNX Runtime intra-op threads (0 = one per physical core)
+ONNX_INTRA_OP_THREADS = 0
+# Longest tokenized input; bge-large supports 512 tokens
+ONNX_MAX_LENGTH = 512
+
+_FP32_FILE = "model.onnx"
+_INT8_FILE = "model_int8.onnx"
+
+
+def export_onnx(model_path: str, out_dir: str = ONNX_MODEL_DIR, opset: int = 17) -> None:
+    """ Offline job: export the transformer of `model_path` to ONNX and quantize its weights to int8 """
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    dynamic = {0: "batch", 1: "sequence"}
+    print(f"🛠️ Exporting {model_path} to {out / _FP32_FILE} ...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            str(out / _FP32_FILE),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "token_type_ids": dynamic,
+                          "last_hidden_state": dynamic},
+            opset_version=opset
+        )
+    tokenizer.save_pretrained(str(out))
+    print(f"🛠️ Quantizing to {out / _INT8_FILE} (dynamic int8) ...")
+    quantize_dynamic(str(out / _FP32_FILE), str(out / _INT8_FILE), weight_type=QuantType.QInt8)
+    print("✅ ONNX export complete")
+
+
+class OnnxEmbedder:
+    """
+    Drop-in for the SentenceTransformer.encode calls of embedding_utils:
+    CLS pooling of the last hidden state (bge pooling), optionally L2-normalized.
+    """
+
+    def __init__(self, model_dir: Optional[str] = None, quantized: Optional[bool] = None,
+                 intra_op_threads: Optional[int] = None, max_length: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        # None reads the module settings at construction time, so they can be changed at runtime
+        model_dir = ONNX_MODEL_DIR if model_dir is None else model_dir
+        quantized = ONNX_QUANTIZED if quantized is None else quantized
+        intra_op_threads = ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        max_length = ONNX_MAX_LENGTH if max_length is None else max_length
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.model_file = Path(model_dir) / (_INT8_FILE if quantized else _FP32_FILE)
+        self.session = ort.InferenceSession(str(self.model_file), options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = max_length
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, normalize_embeddings: bool = False,
+               convert_to_numpy: bool = True, **_) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Sort by length so each padded batch wastes little compute, then restore the input order
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        vecs = np.empty((len(texts), self.dim), dtype=np.float32) if texts else np.zeros((0, self.dim), np.float32)
+        for i in range(0, len(texts), batch_size):
+            idx = order[i:i + batch_size]
+            batch = self.tokenizer([texts[j] for j in idx], padding=True, truncation=True,
+                                   max_length=self.max_length, return_tensors="np")
+            feeds = {k: v.astype(np.int64) for k, v in batch.items() if k in self._inputs}
+            hidden = self.session.run(None, feeds)[0]
+            vecs[idx] = hidden[:, 0]
+        if normalize_embeddings and len(vecs):
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        return vecs[0] if single else vecs
+
+    @property
+    def dim(self) -> int:
+        return self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+
+def _reference_samples(n: int) -> List[Tuple[str, List[str], np.ndarray]]:
+    """ (source, texts, stored fp32 vectors) from the LanceDB paragraphs and the KG node paragraphs """
+    samples = []
+    from text_retrival import get_table
+    rows = get_table().head(n).select(["text", "vector"]).to_pylist()
+    rows = [r for r in rows if r["text"] and r["text"].strip()]
+    if rows:
+        samples.append(("lancedb", [r["text"] for r in rows], np.array([r["vector"] for r in rows], dtype=np.float32)))
+
+    from graph_query import _driver
+    with _driver.session() as session:
+        records = list(session.run(
+            "MATCH (n) WHERE n.paragraph IS NOT NULL AND n.paragraph_embedding_v1 IS NOT NULL "
+            "RETURN n.paragraph AS text, n.paragraph_embedding_v1 AS vec LIMIT $n", n=n
+        ))
+    if records:
+        samples.append(("kg", [r["text"] for r in records], np.array([r["vec"] for r in records], dtype=np.float32)))
+    return samples
+
+
+def registry_kind() -> str:
+    """ model_registry kind of the graph selected by ONNX_QUANTIZED; int8 and fp32 are separate shared instances """
+    return "onnx_embedder_int8" if ONNX_QUANTIZED else "onnx_embedder"
+
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return np.sum(a * b, axis=1)
+
+
+def _timed_encode(model, texts: List[str], batch_size: int) -> Tuple[np.ndarray, float]:
+    started = time.perf_counter()
+    vecs = model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+    return np.asarray(vecs, dtype=np.float32), len(texts) / (time.perf_counter() - started)
+
+
+def benchmark(n: int = 256, batch_size: int = 32) -> Dict[str, Any]:
+    """
+    Throughput (texts/s) of PyTorch fp32 and the ONNX backend, and cosine drift of the ONNX vectors
+    against the fp32 vectors stored in LanceDB and the KG (PyTorch fp32 re-encodings shown as the baseline).
+    """
+    import embedding_utils
+    from model_registry import get_model
+
+    torch_model = get_model("sentence_transformer", embedding_utils._model_path)
+    onnx_model = get_model(registry_kind(), ONNX_MODEL_DIR)
+    report = {}
+    for source, texts, stored in _reference_samples(n):
+        torch_vecs, torch_tps = _timed_encode(torch_model, texts, batch_size)
+        onnx_vecs, onnx_tps = _timed_encode(onnx_model, texts, batch_size)
+        vs_stored = _cosine_rows(onnx_vecs, stored)
+        report[source] = {
+            "texts": len(texts),
+            "torch_texts_per_s": torch_tps,
+            "onnx_texts_per_s": onnx_tps,
+            "speedup": onnx_tps / torch_tps,
+            "onnx_vs_stored_mean_cos": float(vs_stored.mean()),
+            "onnx_vs_stored_min_cos": float(vs_stored.min()),
+            "torch_vs_stored_mean_cos": float(_cosine_rows(torch_vecs, stored).mean()),
+            "onnx_vs_torch_mean_cos": float(_cosine_rows(onnx_vecs, torch_vecs).mean()),
+        }
+    print(f"\n📊 ONNX ({onnx_model.model_file.name}, {ONNX_INTRA_OP_THREADS or 'auto'} threads) vs PyTorch fp32")
+    for source, r in report.items():
+        print(f"[{source}] {r['texts']} texts | torch {r['torch_texts_per_s']:.1f}/s | onnx {r['onnx_texts_per_s']:.1f}/s "
+              f"(x{r['speedup']:.2f}) | cos(onnx, stored) mean {r['onnx_vs_stored_mean_cos']:.4f} "
+              f"min {r['onnx_vs_stored_min_cos']:.4f} | cos(torch, stored) mean {r['torch_vs_stored_mean_cos']:.4f}")
+    return report
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "benchmark"
+    if command == "export":
+        import embedding_utils
+        export_onnx(embedding_utils._model_path, ONNX_MODEL_DIR)
+    else:
+        benchmark()
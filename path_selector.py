@@ -1,29 +1,50 @@
 import numpy as np
-from graph_query import query_direct_genesis_neighbors, query_direct_neighbors, query_khop_paths
-from link_scorer import score_path,sim
-from embedding_utils import embed
-from graph_query import query_relation_between,query_direct_description
-from graph_query import query_direct_neighbors, query_node_labels_and_neighbors
+from itertools import islice
+from graph_backend import query_direct_neighbors, query_khop_paths
+from link_scorer import score_paths, top_k_paths
+from embedding_utils import embed_many
+from graph_backend import query_direct_description
+from graph_backend import query_labels_and_degrees, query_relations_between, query_khop_paths_many
+from graph_backend import query_direct_neighbors_many, query_khop_paths_ranked, iter_khop_paths
+import node_degrees
 from typing import List, Dict, Tuple, Optional
 BLOCKED_SOURCES = {
 
+}
+# Stream the k-hop expansions of expand_genesis_to_2hop best first and keep only the needed top paths in a
+# bounded heap instead of materializing every path. select_general_paths always expands its (up to 45) tails
+# with one batched query: streaming needs one query per start node and would undo that batching.
+USE_STREAMING_TOPK = False
+# Formation retrieval through the configurable beam search engine instead of the fixed 1-hop/2-hop/3-hop stages
+USE_BEAM_SEARCH = False
+BEAM_SEARCH_CONFIG = {
+    "depth": 3,                       # hops from the start entity
+    "beam_width": [80, 10, 10],       # partial paths kept after each hop (int or per-hop list)
+    "fanout": [80, 2, 1],             # children kept per partial path at each hop (int or per-hop list)
+    "min_depth": 2,                   # dead-end paths shorter than this are dropped
+    "prefer_labels": {1: "genesis"},  # hop -> label ranked ahead of other nodes at that hop
+    "require_labels": {},             # hop -> label every node at that hop must carry
+    "min_hop_score": None,            # drop children whose own score is below this value
+    "prune_margin": None,             # drop partial paths scoring more than this below the best one at the same hop
 }
 def select_top1hop_genesis(mineral: str, query_vec: np.ndarray, topk: int = 5) -> List[Dict]:
     neighbors = query_direct_neighbors(mineral)
     scored = []
     print(f"\n🔍 [1-hop] Scoring entities connected to“{mineral}”, Prioritize genesis entities")
     candidates = []
-    for n in neighbors:
+    # Labels and degrees of all neighbors in one round trip
+    label_info = query_labels_and_degrees([n["name"] for n in neighbors])
+    scores = score_paths(query_vec, [[n["desc_emb"]] for n in neighbors], [[n["para_emb"]] for n in neighbors])
+    for n, score in zip(neighbors, scores):
         node_name = n["name"]
-        labels, neighbor_count = query_node_labels_and_neighbors(node_name)
+        labels, neighbor_count = label_info.get(node_name.lower(), ([], 0))
 
         if "genesis" in [l.lower() for l in labels] and neighbor_count > 1:
             n["is_genesis"] = True
         else:
             n["is_genesis"] = False
 
-        score = score_path(query_vec, [n["desc_emb"]], [n["para_emb"]])
-        n["score"] = score
+        n["score"] = float(score)
         candidates.append(n)
 
     # Prioritize genesis entities(connections > 1), then add other high-scoring genes.
@@ -40,22 +61,44 @@ def select_top1hop_genesis(mineral: str, query_vec: np.ndarray, topk: int = 5) -
 
 
 # Adjusting k can adjust the search depth,k=1-d=3,k=2-d=4
-def expand_genesis_to_2hop(genesis_node: Dict, query_vec: np.ndarray, start_entity: str = None) -> List[Dict]:
-    all_paths = query_khop_paths(genesis_node["name"], k=1)
-    scored = []
-    print(f"\n🔍 [2-hop] Expanding paths from the genesis entity \"{genesis_node['name']}\":")
-    for path in all_paths:
-        if start_entity and start_entity.lower() in [n.lower() for n in path["path"][1:]]:
-            print(f"  ⚠️Jump back to the main entity, skip.: {path['path']}")
-            continue
+def _genesis_path_ok(path: Dict, start_entity: str = None) -> bool:
+    if start_entity and start_entity.lower() in [n.lower() for n in path["path"][1:]]:
+        print(f"  ⚠️Jump back to the main entity, skip.: {path['path']}")
+        return False
+
+    lowered = [n.lower() for n in path["path"]]
+    if len(set(lowered)) < len(lowered):
+        print(f"  ⚠️ Entities that are repeated should be skipped.: {path['path']}")
+        return False
+    return True
 
-        lowered = [n.lower() for n in path["path"]]
-        if len(set(lowered)) < len(lowered):
-            print(f"  ⚠️ Entities that are repeated should be skipped.: {path['path']}")
-            continue
 
-        score = score_path(query_vec, path["desc_embs"], path["para_embs"])
-        path["score"] = score
+def expand_genesis_to_2hop(genesis_node: Dict, query_vec: np.ndarray, start_entity: str = None) -> List[Dict]:
+    print(f"\n🔍 [2-hop] Expanding paths from the genesis entity \"{genesis_node['name']}\":")
+    if USE_STREAMING_TOPK:
+        # Paths stream in best first; only the two best valid ones are ever held
+        best = top_k_paths(
+            iter_khop_paths(genesis_node["name"], 1, query_vec),
+            query_vec, 2,
+            accept=lambda path: _genesis_path_ok(path, start_entity),
+            best_first=True
+        )
+        for score, path in best:
+            path["score"] = float(score)
+            print(f"  - Path: {path['path']} | score: {score:.4f}")
+        return [path for _, path in best]
+
+    if node_degrees.FANOUT_ORDER == "similarity":
+        # Server-side top-k by similarity to the question, bounded by node_degrees.HUB_FANOUT
+        all_paths = query_khop_paths_ranked(genesis_node["name"], 1, query_vec)
+    else:
+        all_paths = query_khop_paths(genesis_node["name"], k=1)
+    valid = [path for path in all_paths if _genesis_path_ok(path, start_entity)]
+
+    scores = score_paths(query_vec, [p["desc_embs"] for p in valid], [p["para_embs"] for p in valid])
+    scored = []
+    for path, score in zip(valid, scores):
+        path["score"] = float(score)
         print(f"  - Path: {path['path']} | score: {score:.4f}")
         scored.append(path)
 
@@ -63,67 +106,98 @@ def expand_genesis_to_2hop(genesis_node: Dict, query_vec: np.ndarray, start_enti
 
 
 def expand_2hop_to_3hop(path2: Dict, query_vec: np.ndarray, start_entity: str = None) -> Dict:
-    tail = path2["path"][-1]
-    candidates = query_direct_neighbors(tail)
+    return expand_2hop_to_3hop_many([path2], query_vec, start_entity=start_entity)[0]
 
-    forbidden = set(n.lower() for n in path2["path"])
-    if start_entity:
-        forbidden.add(start_entity.lower())
 
-    candidates = [c for c in candidates if c["name"].lower() not in forbidden]
-
-    print(f"\n🔍 [3-hop] Expanding candidate entities from \"{tail}\":")
-    for c in candidates:
-        score = score_path(query_vec, [c["desc_emb"]], [c["para_emb"]])
-        print(f"  - Candidate entity: {c['name']} | score: {score:.4f}")
-        c["score"] = score
-
-    if len(candidates) == 0:
-        print("  ⚠️ No extensible entity, return to the original path")
-        return path2
+def expand_2hop_to_3hop_many(paths2: List[Dict], query_vec: np.ndarray, start_entity: str = None) -> List[Dict]:
+    """
+    Extend every 2-hop path by its best-scoring 3rd-hop neighbor.
+    The neighbors of all tails and the relations of all chosen (tail, best) pairs are each fetched in a single batched query.
+    """
+    neighbors_by_tail = query_direct_neighbors_many([p["path"][-1] for p in paths2])
+    candidate_lists = []
+    for path2 in paths2:
+        tail = path2["path"][-1]
+        # Paths sharing a tail share its neighbor dicts; copy them before scores are attached
+        candidates = [dict(c) for c in neighbors_by_tail.get(tail, [])]
+
+        forbidden = set(n.lower() for n in path2["path"])
+        if start_entity:
+            forbidden.add(start_entity.lower())
+
+        candidate_lists.append([c for c in candidates if c["name"].lower() not in forbidden])
+
+    # Score the candidates of all paths in one batch
+    flat = [c for candidates in candidate_lists for c in candidates]
+    scores = score_paths(query_vec, [[c["desc_emb"]] for c in flat], [[c["para_emb"]] for c in flat])
+    for c, score in zip(flat, scores):
+        c["score"] = float(score)
+
+    chosen = []
+    for path2, candidates in zip(paths2, candidate_lists):
+        print(f"\n🔍 [3-hop] Expanding candidate entities from \"{path2['path'][-1]}\":")
+        for c in candidates:
+            print(f"  - Candidate entity: {c['name']} | score: {c['score']:.4f}")
+
+        if len(candidates) == 0:
+            print("  ⚠️ No extensible entity, return to the original path")
+            chosen.append(None)
+            continue
 
-    best = max(candidates, key=lambda c: c["score"])
-    print(f"✅ Select entity: {best['name']}")
+        best = max(candidates, key=lambda c: c["score"])
+        print(f"✅ Select entity: {best['name']}")
+        chosen.append(best)
 
-    rel_info = query_relation_between(tail, best["name"])
-    triple = (tail, rel_info["rel_type"], best["name"])
-    source = rel_info["source"]
+    pairs = [(p["path"][-1], best["name"]) for p, best in zip(paths2, chosen) if best is not None]
+    rel_infos = iter(query_relations_between(pairs))
 
-    new_path = {
-        "path": path2["path"] + [best["name"]],
-        "desc_embs": path2["desc_embs"] + [best["desc_emb"]],
-        "para_embs": path2["para_embs"] + [best["para_emb"]],
-        "score": path2["score"] + best["score"],
-        "descriptions": path2.get("descriptions", []) + [best["description"]],
-        "paragraphs": path2.get("paragraphs", []) + [best["paragraph"]],
-        "triples": path2.get("triples", []) + [triple],
-        "sources": path2.get("sources", []) + [source]
-    }
-    return new_path
+    results = []
+    for path2, best in zip(paths2, chosen):
+        if best is None:
+            results.append(path2)
+            continue
+        tail = path2["path"][-1]
+        rel_info = next(rel_infos)
+        triple = (tail, rel_info["rel_type"], best["name"])
+        source = rel_info["source"]
+
+        results.append({
+            "path": [*path2["path"], best["name"]],
+            "desc_embs": [*path2["desc_embs"], best["desc_emb"]],
+            "para_embs": [*path2["para_embs"], best["para_emb"]],
+            "score": path2["score"] + best["score"],
+            "descriptions": [*path2.get("descriptions", []), best["description"]],
+            "paragraphs": [*path2.get("paragraphs", []), best["paragraph"]],
+            "triples": [*path2.get("triples", []), triple],
+            "sources": [*path2.get("sources", []), source]
+        })
+    return results
 
 
 def select_final_3hop_paths(mineral: str, query_vec: np.ndarray, topk: int = 3) -> List[Dict]:
     top1hop = select_top1hop_genesis(mineral, query_vec)
     all_2hop = []
+    rel_infos = query_relations_between([(mineral, g["name"]) for g in top1hop])
 
-    for g in top1hop:
+    for g, rel_info in zip(top1hop, rel_infos):
         exps = expand_genesis_to_2hop(g, query_vec, start_entity=mineral)
         for path in exps:
-            rel_info = query_relation_between(mineral, g["name"])
             triple = (mineral, rel_info["rel_type"], g["name"])
             source = rel_info["source"]
 
-            path["path"] = [mineral, g["name"]] + path["path"][1:]
-            path["desc_embs"] = [g["desc_emb"]] + path["desc_embs"]
-            path["para_embs"] = [g["para_emb"]] + path["para_embs"]
-            path["triples"] = [triple] + path.get("triples", [])
-            path["sources"] = [source] + path.get("sources", [])
-            path["descriptions"] = [g.get("description", "")] + path.get("descriptions", [])
-            path["paragraphs"] = [g.get("paragraph", "")] + path.get("paragraphs", [])
-
-            all_2hop.append(path)
+            # A new record each time: duplicate neighbours (parallel relationships) share the same expansion dicts
+            all_2hop.append({
+                **path,
+                "path": [mineral, g["name"], *path["path"][1:]],
+                "desc_embs": [g["desc_emb"], *path["desc_embs"]],
+                "para_embs": [g["para_emb"], *path["para_embs"]],
+                "triples": [triple, *path.get("triples", [])],
+                "sources": [source, *path.get("sources", [])],
+                "descriptions": [g.get("description", ""), *path.get("descriptions", [])],
+                "paragraphs": [g.get("paragraph", ""), *path.get("paragraphs", [])]
+            })
 
-    all_3hop = [expand_2hop_to_3hop(p, query_vec, start_entity=mineral) for p in all_2hop]
+    all_3hop = expand_2hop_to_3hop_many(all_2hop, query_vec, start_entity=mineral)
     all_3hop = dedup_paths_by_triples(all_3hop)
 
     final = sorted(all_3hop, key=lambda x: x["score"], reverse=True)[:topk]
@@ -147,6 +221,8 @@ def select_final_3hop_paths_with_extra_1hop(
     Automatically excludes sources listed in blocked_sources.
     """
     blocked_sources = blocked_sources or BLOCKED_SOURCES
+    if USE_BEAM_SEARCH:
+        return select_beam_paths_with_extra_1hop(entity, query_vec, topk=topk, extra_1hop_k=extra_1hop_k, blocked_sources=blocked_sources)
 
     # === Step 1: Retrieve 1-hop candidate nodes ===
     top1hop = select_top1hop_genesis(entity, query_vec, topk=80)  # 先多取一些备用
@@ -170,10 +246,10 @@ def select_final_3hop_paths_with_extra_1hop(
 
     # === Step 3: Construct 2-hop paths ===
     all_2hop = []
-    for g in expandable:
+    rel_infos = query_relations_between([(entity, g["name"]) for g in expandable])
+    for g, rel_info in zip(expandable, rel_infos):
         exps = expansion_results[g["name"].lower()]
         for path in exps:
-            rel_info = query_relation_between(entity, g["name"])
             if rel_info["source"] in blocked_sources:
                 print(f"⛔ Skipping triple from blocked source: {(entity, rel_info['rel_type'], g['name'])}")
                 continue
@@ -181,18 +257,19 @@ def select_final_3hop_paths_with_extra_1hop(
             triple = (entity, rel_info["rel_type"], g["name"])
             source = rel_info["source"]
 
-            path["path"] = [entity, g["name"]] + path["path"][1:]
-            path["desc_embs"] = [g["desc_emb"]] + path["desc_embs"]
-            path["para_embs"] = [g["para_emb"]] + path["para_embs"]
-            path["triples"] = [triple] + path.get("triples", [])
-            path["sources"] = [source] + path.get("sources", [])
-            path["descriptions"] = [g.get("description", "")] + path.get("descriptions", [])
-            path["paragraphs"] = [g.get("paragraph", "")] + path.get("paragraphs", [])
-
-            all_2hop.append(path)
+            all_2hop.append({
+                **path,
+                "path": [entity, g["name"], *path["path"][1:]],
+                "desc_embs": [g["desc_emb"], *path["desc_embs"]],
+                "para_embs": [g["para_emb"], *path["para_embs"]],
+                "triples": [triple, *path.get("triples", [])],
+                "sources": [source, *path.get("sources", [])],
+                "descriptions": [g.get("description", ""), *path.get("descriptions", [])],
+                "paragraphs": [g.get("paragraph", ""), *path.get("paragraphs", [])]
+            })
 
     # === Step 4: Expand to 3-hop paths and remove duplicates ===
-    all_3hop = [expand_2hop_to_3hop(p, query_vec, start_entity=entity) for p in all_2hop]
+    all_3hop = expand_2hop_to_3hop_many(all_2hop, query_vec, start_entity=entity)
     all_3hop = [p for p in all_3hop if all(s not in blocked_sources for s in p.get("sources", []))]
     all_3hop = dedup_paths_by_triples(all_3hop)
 
@@ -213,8 +290,9 @@ def select_final_3hop_paths_with_extra_1hop(
     )[:50]
 
     extra_1hop = []
-    for n in remaining_candidates[:extra_1hop_k]:
-        rel_info = query_relation_between(entity, n["name"])
+    extra_candidates = remaining_candidates[:extra_1hop_k]
+    rel_infos = query_relations_between([(entity, n["name"]) for n in extra_candidates])
+    for n, rel_info in zip(extra_candidates, rel_infos):
         if rel_info["source"] in blocked_sources:
             print(f"⛔ Skip 1-hop triples from blocked sources: {(entity, rel_info['rel_type'], n['name'])}")
             continue
@@ -229,42 +307,198 @@ def select_final_3hop_paths_with_extra_1hop(
 
     return final_paths, extra_1hop
 
+def _per_hop(value, hop: int):
+    """ Per-hop setting: a scalar applies to every hop, a list is indexed by hop (1-based, last entry repeats) """
+    if isinstance(value, (list, tuple)):
+        return value[min(hop, len(value)) - 1]
+    return value
+
+
+def _has_label(node: Dict, label: str) -> bool:
+    return label.lower() in [l.lower() for l in node.get("labels", [])]
+
+
+def _beam_search(entity: str, query_vec: np.ndarray, blocked_sources=None, **config) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Beam search over the graph starting from `entity`.
+    Each hop expands the whole frontier with one bulk neighbor query and scores all children in one batch.
+    Triples keep the stored relationship direction, as the k-hop paths do.
+    Returns (paths, hop1_candidates); hop1_candidates are the scored 1-hop neighbors for supplementary triples.
+    """
+    cfg = {**BEAM_SEARCH_CONFIG, **config}
+    blocked_sources = blocked_sources or set()
+    prefer = cfg["prefer_labels"] or {}
+    require = cfg["require_labels"] or {}
+
+    beams = [{
+        "path": [entity], "desc_embs": [], "para_embs": [], "descriptions": [], "paragraphs": [],
+        "triples": [], "sources": [], "score": 0.0
+    }]
+    finished = []
+    hop1_candidates = []
+
+    for hop in range(1, cfg["depth"] + 1):
+        frontier = list(dict.fromkeys(b["path"][-1] for b in beams))
+        print(f"\n🔍 [beam hop {hop}] Expanding {len(beams)} partial paths from {len(frontier)} frontier entities")
+        neighbors_by_node = query_direct_neighbors_many(frontier)
+
+        # Score every fetched neighbor once
+        flat = [n for nbrs in neighbors_by_node.values() for n in nbrs]
+        scores = score_paths(query_vec, [[n["desc_emb"]] for n in flat], [[n["para_emb"]] for n in flat])
+        for n, score in zip(flat, scores):
+            n["score"] = float(score)
+
+        label = prefer.get(hop)
+        children = []
+        for beam in beams:
+            forbidden = set(n.lower() for n in beam["path"])
+            candidates = [
+                n for n in neighbors_by_node.get(beam["path"][-1], [])
+                if n["name"].lower() not in forbidden
+                and n["source"] not in blocked_sources
+                and (require.get(hop) is None or _has_label(n, require[hop]))
+                and (cfg["min_hop_score"] is None or n["score"] >= cfg["min_hop_score"])
+            ]
+            if hop == 1:
+                hop1_candidates = [{**n, "is_genesis": _has_label(n, "genesis")} for n in candidates]
+            if not candidates:
+                if hop - 1 >= cfg["min_depth"]:
+                    finished.append(beam)
+                continue
+            candidates.sort(key=lambda n: (not (label and _has_label(n, label)), -n["score"]))
+            for n in candidates[:_per_hop(cfg["fanout"], hop)]:
+                children.append(({
+                    "path": beam["path"] + [n["name"]],
+                    "desc_embs": beam["desc_embs"] + [n["desc_emb"]],
+                    "para_embs": beam["para_embs"] + [n["para_emb"]],
+                    "descriptions": beam["descriptions"] + [n.get("description", "")],
+                    "paragraphs": beam["paragraphs"] + [n.get("paragraph", "")],
+                    "triples": beam["triples"] + [n["raw_triple"]],
+                    "sources": beam["sources"] + [n["source"]],
+                    "score": beam["score"] + n["score"]
+                }, bool(label and _has_label(n, label))))
+
+        if not children:
+            beams = []
+            break
+        if cfg["prune_margin"] is not None:
+            best = max(c["score"] for c, _ in children)
+            children = [(c, p) for c, p in children if c["score"] >= best - cfg["prune_margin"]]
+        children.sort(key=lambda cp: (not cp[1], -cp[0]["score"]))
+        beams = [c for c, _ in children[:_per_hop(cfg["beam_width"], hop)]]
+        print(f"  - kept {len(beams)} partial paths, best score: {max(b['score'] for b in beams):.4f}")
+
+    return finished + beams, hop1_candidates
+
+
+def beam_search_paths(entity: str, query_vec: np.ndarray, topk: int = 8, blocked_sources=None, **config) -> List[Dict]:
+    """
+    Configurable k-hop path search. Keyword arguments override BEAM_SEARCH_CONFIG
+    (depth, beam_width, fanout, min_depth, prefer_labels, require_labels, min_hop_score, prune_margin).
+    """
+    paths, _ = _beam_search(entity, query_vec, blocked_sources=blocked_sources, **config)
+    paths = dedup_paths_by_triples(paths)
+    return sorted(paths, key=lambda x: x["score"], reverse=True)[:topk]
+
+
+def select_beam_paths_with_extra_1hop(
+    entity: str,
+    query_vec: np.ndarray,
+    topk: int = 8,
+    extra_1hop_k: int = 15,
+    blocked_sources: Optional[set] = None,
+    **config
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Beam-search counterpart of select_final_3hop_paths_with_extra_1hop, with the same return format.
+    """
+    blocked_sources = blocked_sources or BLOCKED_SOURCES
+    paths, hop1_candidates = _beam_search(entity, query_vec, blocked_sources=blocked_sources, **config)
+    final_paths = sorted(dedup_paths_by_triples(paths), key=lambda x: x["score"], reverse=True)[:topk]
+
+    print("\n📌 [Final Top-k Selected Paths]")
+    for i, p in enumerate(final_paths):
+        print(f"\n[Path {i+1}] Score: {p['score']:.4f}")
+        for j, t in enumerate(p["triples"]):
+            print(f"  - Triple {j+1}: {t} [# {j+1}]")
+            print(f"    ↳ Source: {p['sources'][j]}")
+
+    used = set(p["path"][1].lower() for p in final_paths if len(p["path"]) > 1)
+    remaining = [n for n in hop1_candidates if n["name"].lower() not in used]
+    remaining = sorted(remaining, key=lambda x: (not x["is_genesis"], -x["score"]))
+
+    extra_1hop = []
+    seen = set()
+    for n in remaining:
+        if len(extra_1hop) >= extra_1hop_k:
+            break
+        if n["name"].lower() in seen:
+            continue
+        seen.add(n["name"].lower())
+        extra_1hop.append({
+            "triple": n["raw_triple"],
+            "source": n["source"],
+            "description": n.get("description", ""),
+            "paragraph": n.get("paragraph", ""),
+            "score": n["score"]
+        })
+    return final_paths, extra_1hop
+
+
+def _continuation_ok(p: Dict, h: Dict) -> bool:
+    """ Whether 1-hop path p can be continued by path h without a closed loop or a return to the topic entity """
+    merged_path = [*p["path"], *h["path"][1:]]
+    merged_path_lower = [n.lower() for n in merged_path]
+
+    if len(set(merged_path_lower)) < len(merged_path_lower):
+        print("  ⚠️ Skip closed loop path", merged_path)
+        return False
+    if p["path"][0].lower() in merged_path_lower[1:]:
+        print("  ⚠️ Skip back path", merged_path)
+        return False
+    return True
+
+
 def select_general_paths(question: str, entities: list, topk2=6, topk1=6, max_check_expandable=45):
     print(f"\n🧪 question: {question}")
-    q_vec = embed(question)
+    descriptions = [query_direct_description(ent) for ent in entities]
+    # Question and all non-empty descriptions share one forward pass
+    vecs = embed_many([question, *(d for d in descriptions if d)])
+    q_vec = vecs[0]
+    desc_vecs = iter(vecs[1:])
 
     all_1hop = []
     entity_scores = {}
 
     print("🔍 Phase 1: Retrieve all 1-hop paths and compute scores...")
-    for ent in entities:
-        desc = query_direct_description(ent)
-        desc_vec = embed(desc) if desc else np.zeros_like(q_vec)
+    hop1_by_entity = query_khop_paths_many(entities, k=1)
+    for ent, desc in zip(entities, descriptions):
+        desc_vec = next(desc_vecs) if desc else np.zeros_like(q_vec)
         q_mix = 0.6 * q_vec + 0.4 * desc_vec
 
-        hop1 = query_khop_paths(ent, k=1)
+        hop1 = hop1_by_entity.get(ent, [])
         print(f"→ Entity {ent} is connected to {len(hop1)} entities")
-        for p in hop1:
+        scores = score_paths(q_mix, [p["desc_embs"] for p in hop1], [p["para_embs"] for p in hop1])
+        for p, score in zip(hop1, scores):
             tail_entity = p["path"][1]
-            score = sum(sim(q_mix, v) for v in p["desc_embs"] + p["para_embs"])
-            all_1hop.append({**p, "score": score})
-            entity_scores[tail_entity] = score
+            all_1hop.append({**p, "score": float(score)})
+            entity_scores[tail_entity] = float(score)
 
     print("🔍 Phase 2: Check if the top high-scoring 1-hop paths are expandable...")
     sorted_1hop = sorted(all_1hop, key=lambda x: x["score"], reverse=True)
     extendable_1hop = []
-    check_count = 0
     evaluated_entities = set()
 
-    for p in sorted_1hop:
-        if check_count >= max_check_expandable:
-            break
+    checked_1hop = sorted_1hop[:max_check_expandable]
+    expansions = []  # (expandable 1-hop path, its chosen 2nd-hop continuations)
+    # Expand all checked tails in one round trip; the first two valid continuations are kept
+    hop2_by_tail = query_khop_paths_many([p["path"][-1] for p in checked_1hop], k=1)
+    for p in checked_1hop:
         tail = p["path"][-1]
         evaluated_entities.add(tail)
-        hop2 = query_khop_paths(tail, k=1)
-        if hop2:
-            extendable_1hop.append(p)
-        check_count += 1
+        if hop2_by_tail.get(tail):
+            expansions.append((p, list(islice((h for h in hop2_by_tail[tail] if _continuation_ok(p, h)), 2))))
+    extendable_1hop = [p for p, _ in expansions]
 
     print(f"📌 Evaluated entities (up to {max_check_expandable}):")
     print("   ", ", ".join(list(evaluated_entities)[:10]) + (" ..." if len(evaluated_entities) > 10 else ""))
@@ -272,45 +506,34 @@ def select_general_paths(question: str, entities: list, topk2=6, topk1=6, max_ch
 
     print("🔍 Phase 3: Expand each expandable 1-hop path to 2-hop...")
     all_candidate_2hop = []
-    for p in extendable_1hop:
-        topic_entity_lower = p["path"][0].lower()
-        tail = p["path"][-1]
-
-        print(f"→ Expanding entity: {tail}...")
-        count = 0
-        hop2 = query_khop_paths(tail, k=1)
-        for h in hop2:
-            merged_path = p["path"] + h["path"][1:]
-            merged_path_lower = [n.lower() for n in merged_path]
-
-            if len(set(merged_path_lower)) < len(merged_path_lower):
-                print("  ⚠️ Skip closed loop path", merged_path)
-                continue
-            if topic_entity_lower in merged_path_lower[1:]:
-                print("  ⚠️ Skip back path", merged_path)
-                continue
-
-            score = sum(sim(q_vec, v) for v in h["desc_embs"] + h["para_embs"])
-            merged_triples = p["triples"] + h["triples"]
-            merged_sources = p["sources"] + h["sources"]
+    hop2_kept = []
+    for p, chosen in expansions:
+        print(f"→ Expanding entity: {p['path'][-1]}...")
+        for h in chosen:
+            merged_path = [*p["path"], *h["path"][1:]]
+            merged_triples = [*p["triples"], *h["triples"]]
+            merged_sources = [*p["sources"], *h["sources"]]
             triple_source_pairs = list(dict.fromkeys((t, s) for t, s in zip(merged_triples, merged_sources)))
             merged_triples = [ts[0] for ts in triple_source_pairs]
             merged_sources = [ts[1] for ts in triple_source_pairs]
 
             all_candidate_2hop.append({
                 "path": merged_path,
-                "desc_embs": p["desc_embs"] + h["desc_embs"],
-                "para_embs": p["para_embs"] + h["para_embs"],
-                "score": p["score"] + score,
+                "desc_embs": [*p["desc_embs"], *h["desc_embs"]],
+                "para_embs": [*p["para_embs"], *h["para_embs"]],
+                "score": p["score"],
                 "triples": merged_triples,
                 "sources": merged_sources,
-                "descriptions": p["descriptions"] + h["descriptions"],
-                "paragraphs": p["paragraphs"] + h["paragraphs"]
+                "descriptions": [*p["descriptions"], *h["descriptions"]],
+                "paragraphs": [*p["paragraphs"], *h["paragraphs"]]
             })
 
-            count += 1
-            if count >= 2:
-                break
+            hop2_kept.append(h)
+
+    # Add the 2nd-hop scores of all kept expansions in one batch
+    scores = score_paths(q_vec, [h["desc_embs"] for h in hop2_kept], [h["para_embs"] for h in hop2_kept])
+    for candidate, score in zip(all_candidate_2hop, scores):
+        candidate["score"] += float(score)
     print("🔍 Phase 4: Select final topk2 paths from candidate 2-hop paths...")
     final_paths = sorted(all_candidate_2hop, key=lambda x: x["score"], reverse=True)[:topk2]
     print("📌 Selected 2-hop paths:")
@@ -0,0 +1,183 @@
+"""
+Cross-encoder reranking service.
+Scores (query, paragraph) pairs in large batches, caches scores by (query hash, paragraph hash) and picks
+the backend per device: FlagReranker in fp16 on GPU, fp32 or an int8 ONNX cross-encoder on CPU.
+`python rerank_service.py export <reranker model path>` writes the ONNX cross-encoder.
+"""
+import sys
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Any, Sequence, Optional
+from model_registry import get_model, get_device
+# Path to the local reranker model (bge-reranker)
+RERANK_MODEL_PATH = r""
+# "auto": FlagReranker on GPU, the ONNX cross-encoder on CPU when RERANK_ONNX_DIR is set;
+# "flag": always FlagReranker; "onnx": always the ONNX cross-encoder
+RERANK_BACKEND = "auto"
+# Directory of the exported int8 cross-encoder (written by export_onnx_reranker)
+RERANK_ONNX_DIR = r""
+RERANK_BATCH_SIZE = 64
+RERANK_MAX_LENGTH = 512
+# Scores kept in memory (one float per (query, paragraph) pair)
+RERANK_CACHE_SIZE = 100000
+
+_INT8_FILE = "reranker_int8.onnx"
+_FP32_FILE = "reranker.onnx"
+
+
+def _hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def export_onnx_reranker(model_path: str, out_dir: str = RERANK_ONNX_DIR, opset: int = 17) -> None:
+    """ Offline job: export the cross-encoder at `model_path` to ONNX and quantize its weights to int8 """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+    sample = tokenizer([["query", "paragraph"]], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic = {0: "batch", 1: "sequence"}
+    print(f"🛠️ Exporting {model_path} to {out / _FP32_FILE} ...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[n] for n in names),
+            str(out / _FP32_FILE),
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes={**{n: dynamic for n in names}, "logits": {0: "batch"}},
+            opset_version=opset
+        )
+    tokenizer.save_pretrained(str(out))
+    print(f"🛠️ Quantizing to {out / _INT8_FILE} (dynamic int8) ...")
+    quantize_dynamic(str(out / _FP32_FILE), str(out / _INT8_FILE), weight_type=QuantType.QInt8)
+    print("✅ ONNX reranker export complete")
+
+
+class OnnxCrossEncoder:
+    """ int8 ONNX Runtime cross-encoder with the compute_score interface of FlagReranker """
+
+    def __init__(self, model_dir: str, intra_op_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(Path(model_dir) / _INT8_FILE), options,
+                                            providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def compute_score(self, pairs: Sequence[Tuple[str, str]], batch_size: int = RERANK_BATCH_SIZE,
+                      max_length: int = RERANK_MAX_LENGTH) -> List[float]:
+        pairs = list(pairs)
+        scores = np.empty(len(pairs), dtype=np.float32)
+        # Similar lengths share a batch, so little compute goes to padding
+        order = np.argsort([-(len(q) + len(p)) for q, p in pairs], kind="stable")
+        for i in range(0, len(pairs), batch_size):
+            idx = order[i:i + batch_size]
+            batch = self.tokenizer([list(pairs[j]) for j in idx], padding=True, truncation=True,
+                                   max_length=max_length, return_tensors="np")
+            feeds = {k: v.astype(np.int64) for k, v in batch.items() if k in self._inputs}
+            scores[idx] = self.session.run(None, feeds)[0][:, 0]
+        return scores.tolist()
+
+
+class RerankService:
+    """
+    Scores (query, paragraph) pairs with a cross-encoder behind an LRU score cache.
+    compute_score mirrors FlagReranker, so the service can be passed wherever a reranker is expected;
+    rerank_many scores the candidates of several queries in one batch.
+    """
+
+    def __init__(self, model, cache_size: int = RERANK_CACHE_SIZE, batch_size: int = RERANK_BATCH_SIZE):
+        self.model = model
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self._scores: "OrderedDict[Tuple[bytes, bytes], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.batches = 0
+
+    def compute_score(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        keys = [(_hash(q), _hash(p)) for q, p in pairs]
+        scores: Dict[Tuple[bytes, bytes], float] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[key] = self._scores[key]
+        missing = list({key: pair for key, pair in zip(keys, pairs) if key not in scores}.items())
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            computed = np.atleast_1d(np.asarray(self.model.compute_score(
+                [pair for _, pair in missing], batch_size=self.batch_size, max_length=RERANK_MAX_LENGTH
+            ), dtype=np.float64))
+            with self._lock:
+                self.batches += 1
+                for (key, _), score in zip(missing, computed):
+                    self._scores[key] = scores[key] = float(score)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+        return [scores[key] for key in keys]
+
+    def rerank_many(self, jobs: List[Tuple[str, List[str]]], topk: int) -> List[List[str]]:
+        """ Best `topk` paragraphs of every (query, paragraphs) job, with all pairs scored in one batch """
+        pairs = [(query, para) for query, paragraphs in jobs for para in paragraphs]
+        scores = iter(self.compute_score(pairs)) if pairs else iter(())
+        ranked = []
+        for _, paragraphs in jobs:
+            scored = [(para, next(scores)) for para in paragraphs]
+            ranked.append([p for p, _ in sorted(scored, key=lambda x: x[1], reverse=True)][:topk])
+        return ranked
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._scores),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "batches": self.batches,
+            }
+
+
+_services: Dict[Tuple[str, str], RerankService] = {}
+_services_lock = threading.Lock()
+
+
+def _backend() -> str:
+    if RERANK_BACKEND != "auto":
+        return RERANK_BACKEND
+    return "onnx" if get_device() == "cpu" and RERANK_ONNX_DIR else "flag"
+
+
+def get_rerank_service(model_path: Optional[str] = None) -> RerankService:
+    """ Shared service of the reranker at `model_path` (RERANK_MODEL_PATH by default; RERANK_ONNX_DIR on the onnx backend) """
+    model_path = model_path or RERANK_MODEL_PATH
+    backend = _backend()
+    key = (backend, RERANK_ONNX_DIR if backend == "onnx" else model_path)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            kind = "onnx_reranker" if backend == "onnx" else "reranker"
+            service = _services[key] = RerankService(get_model(kind, key[1]))
+    return service
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "export":
+        export_onnx_reranker(sys.argv[2], RERANK_ONNX_DIR)
+    else:
+        print("usage: python rerank_service.py export <reranker model path>")
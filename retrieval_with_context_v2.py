@@ -1,8 +1,9 @@
+import asyncio
 import numpy as np
 from typing import List, Tuple, Dict
-from embedding_utils import embed
-from text_retrival import get_top_texts_for_entity
-from graph_query import query_direct_description
+from embedding_utils import embed_many
+from text_retrival import get_top_texts_for_entity, get_top_texts_for_entities
+from graph_query_async import aquery_direct_descriptions, run_async
 import warnings
 from path_selector import select_final_3hop_paths,select_final_3hop_paths_with_extra_1hop,select_general_paths
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -24,17 +25,21 @@ def retrieve_for_formation_analysis_v2(
     reranker=None,
     blocked_sources=None,
     text_weight: float = 0.6,
-    desc_weight: float = 0.4
+    desc_weight: float = 0.4,
+    retrieve_texts: bool = True
 ) -> Tuple[List[Dict], List[str], List[Dict]]:
     """
     For the formation_analysis task, starting from a single entity:
     Retrieve its 3-hop knowledge graph paths (including triples and paragraphs)
     Retrieve its related paragraphs as textual evidence
+    (skipped with retrieve_texts=False, when the caller batches them with retrieve_formation_texts)
     Returns: (paths, paragraphs)
     """
     print(f"\n🌋 Formation retrieval: entity={entity}")
     q_mix = text_weight * q_vec + desc_weight * geo_vec
     paths, extra_1hop = select_final_3hop_paths_with_extra_1hop(entity, q_mix, topk=topk)
+    if not retrieve_texts:
+        return paths, [], extra_1hop
     top_texts = get_top_texts_for_entity(
         entity,
         query_vec=q_mix,
@@ -44,6 +49,37 @@ def retrieve_for_formation_analysis_v2(
     )
     return paths, top_texts, extra_1hop
 
+def retrieve_formation_texts(
+    entities: List[str],
+    q_vec: np.ndarray,
+    geo_vec: np.ndarray,
+    topk: int = 3,
+    reranker=None,
+    blocked_sources=None,
+    text_weight: float = 0.6,
+    desc_weight: float = 0.4
+) -> List[List[str]]:
+    """
+    Textual evidence of every formation entity with one reranker batch, in the text_retrival.RETRIEVAL_MODE of
+    the per-entity search of retrieve_for_formation_analysis_v2. Vector mode searches all entities in one batch;
+    over the exported vector block that search is exact, so it can differ from the per-entity ANN (IVF-PQ) results.
+    """
+    q_mix = np.asarray(text_weight * q_vec + desc_weight * geo_vec, dtype=np.float32).reshape(1, -1)
+    return get_top_texts_for_entities(
+        entities,
+        np.repeat(q_mix, len(entities), axis=0),
+        blocked_sources=blocked_sources or BLOCKED_SOURCES,
+        topk=topk,
+        reranker=reranker
+    )
+
+async def _general_paths_and_descriptions(question: str, entities: List[str], topk_path: int):
+    """ Path selection (worker thread) and the entity description lookups run concurrently """
+    return await asyncio.gather(
+        asyncio.to_thread(select_general_paths, question, entities, topk2=topk_path),
+        aquery_direct_descriptions(entities)
+    )
+
 def retrieve_for_general_question_v2(
     question: str,
     entities: List[str],
@@ -63,22 +99,23 @@ def retrieve_for_general_question_v2(
     Returns:(paths, concatenated_descriptions, paragraphs)`
     """
     print(f"\n🔍 General QA retrieval: entities={entities}")
-    paths = select_general_paths(question, entities, topk2=topk_path)
     print("📘 Concatenating entity description information...")
-    descriptions = [query_direct_description(e) for e in entities if query_direct_description(e)]
+    paths, descriptions = run_async(_general_paths_and_descriptions(question, entities, topk_path))
+    descriptions = [d for d in descriptions if d]
     context_text = "\n".join(descriptions)
-    desc_vec = embed(context_text)
     print("📑 Retrieving related paragraphs (weighted question + description vectors)...")
     instr = "Generate a representation for this sentence to use to retrieve related articles:"
     print(instr + question + context_text)
-    q_mix = embed([instr + question + "\nkey entity descriptions:" + context_text], tag="General QA")
+    vecs = embed_many([context_text, instr + question + "\nkey entity descriptions:" + context_text], tag="General QA")
+    desc_vec, q_mix = vecs[0], vecs[1:2]
     q_mix = text_weight * q_mix + desc_weight * desc_vec
     top_texts = get_top_texts_for_entity(
         entity_name="",
         query_vec=q_mix,
         blocked_sources=blocked_sources or BLOCKED_SOURCES,
         reranker=reranker,
-        topk=3
+        topk=3,
+        query_text=" ".join([question, *entities])
     )
     return paths, context_text, top_texts
 
@@ -0,0 +1,65 @@
+import sys
+import json
+from pathlib import Path
+import numpy as np
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import graph_snapshot
+import khop_path_table
+import node_degrees
+
+
+def write_snapshot(root: Path, names, edges, embedded=None, sources=("paper_a", "paper_b"), dim=8, seed=0):
+    """
+    Write a small snapshot in the export_graph_snapshot layout.
+    edges: [(head, rel_type, tail, source index or -1)]; embedded: per-node has_emb flags (default all True)
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    rel_types = sorted({rel for _, rel, _, _ in edges})
+    head = np.array([h for h, _, _, _ in edges], dtype=np.int32)
+    tail = np.array([t for _, _, t, _ in edges], dtype=np.int32)
+    indptr, adj_nbr, adj_edge = graph_snapshot._build_csr(len(names), head, tail)
+    has_emb = np.ones(len(names), dtype=bool) if embedded is None else np.asarray(embedded, dtype=bool)
+    np.savez(root / graph_snapshot._ARRAYS_FILE, indptr=indptr, adj_nbr=adj_nbr, adj_edge=adj_edge,
+             edge_head=head, edge_tail=tail,
+             edge_rel=np.array([rel_types.index(rel) for _, rel, _, _ in edges], dtype=np.int32),
+             edge_src=np.array([s for _, _, _, s in edges], dtype=np.int32),
+             has_emb=has_emb, name_key=graph_snapshot._build_name_keys(names))
+    rng = np.random.default_rng(seed)
+    np.save(root / graph_snapshot._DESC_EMB_FILE, rng.normal(size=(len(names), dim)).astype(np.float32))
+    np.save(root / graph_snapshot._PARA_EMB_FILE, rng.normal(size=(len(names), dim)).astype(np.float32))
+    with open(root / graph_snapshot._STRINGS_FILE, "w", encoding="utf-8") as f:
+        json.dump({"names": names, "labels": [["Entity"]] * len(names),
+                   "descriptions": [f"description of {n}" for n in names],
+                   "paragraphs": [f"paragraph of {n}" for n in names],
+                   "rel_types": rel_types, "sources": list(sources),
+                   "edge_paragraphs": [None] * len(edges)}, f)
+
+
+# A hub ("Mars"), a node without embeddings ("olivine"), a case variant of another name ("Sulfate"),
+# a parallel relationship and relationships without a source
+TOY_NAMES = ["sulfate", "aqueous alteration", "water", "Mars", "jarosite", "olivine", "Sulfate", "hematite", "clay"]
+TOY_EDGES = [
+    (0, "formed_by", 1, 0), (1, "related_to", 2, -1), (1, "related_to", 3, 1), (2, "related_to", 3, 0),
+    (4, "formed_by", 1, 1), (0, "related_to", 4, 0), (3, "contains", 5, 0), (5, "related_to", 7, 1),
+    (6, "related_to", 3, 1), (0, "related_to", 6, 0), (7, "related_to", 3, -1), (8, "formed_by", 2, 0),
+    (8, "related_to", 3, 1), (3, "contains", 7, 0),
+]
+TOY_EMBEDDED = [True, True, True, True, True, False, True, True, True]
+
+
+@pytest.fixture
+def toy_snapshot(tmp_path, monkeypatch):
+    """ The toy graph as the configured snapshot, with fresh loader caches and no fan-out caps """
+    snapshot_dir = tmp_path / "snapshot"
+    write_snapshot(snapshot_dir, TOY_NAMES, TOY_EDGES, TOY_EMBEDDED)
+    monkeypatch.setattr(graph_snapshot, "SNAPSHOT_DIR", str(snapshot_dir))
+    monkeypatch.setattr(node_degrees, "HUB_FANOUT", [None, None, None])
+    graph_snapshot.load_graph_snapshot.cache_clear()
+    khop_path_table.load_path_table.cache_clear()
+    yield snapshot_dir
+    graph_snapshot.load_graph_snapshot.cache_clear()
+    khop_path_table.load_path_table.cache_clear()
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+import graph_cache
+import embedding_cache
+from graph_cache import GraphResultCache, MISSING
+from embedding_cache import EmbeddingCache, text_hash
+
+
+class Clock:
+    """ Settable stand-in for time.monotonic / time.time """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def vector(i, dim=16):
+    return np.full(dim, i, dtype=np.float32)
+
+
+# === GraphResultCache ===
+
+def test_graph_cache_evicts_least_recently_used_by_bytes():
+    entry = graph_cache.estimate_nbytes(graph_cache.freeze(vector(0, 256)))
+    cache = GraphResultCache("test_lru", max_bytes=3 * entry, ttl=None)
+    for i in range(3):
+        cache.put((i,), vector(i, 256))
+    assert cache.get((0,)) is not MISSING  # 0 becomes the most recently used
+    cache.put((3,), vector(3, 256))
+    assert cache.get((1,)) is MISSING
+    assert all(cache.get((i,)) is not MISSING for i in (0, 2, 3))
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 3 and stats["bytes"] <= stats["max_bytes"]
+
+
+def test_graph_cache_skips_oversized_values_and_replaces_keys():
+    small = graph_cache.estimate_nbytes(graph_cache.freeze(vector(0)))
+    cache = GraphResultCache("test_oversized", max_bytes=4 * small, ttl=None)
+    cache.put(("a",), vector(1))
+    cache.put(("a",), vector(2))
+    assert cache.stats()["bytes"] == small
+    assert np.array_equal(cache.get(("a",)), vector(2))
+    cache.put(("big",), vector(0, 4096))
+    assert cache.get(("big",)) is MISSING
+    assert cache.stats()["oversized"] == 1 and cache.get(("a",)) is not MISSING
+
+
+def test_graph_cache_expires_entries_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(graph_cache.time, "monotonic", clock)
+    cache = GraphResultCache("test_ttl", ttl=10.0)
+    cache.put(("k",), [1, 2])
+    clock.now += 9.0
+    assert cache.get(("k",)) is not MISSING
+    clock.now += 2.0
+    assert cache.get(("k",)) is MISSING
+    assert cache.stats()["expirations"] == 1 and cache.stats()["bytes"] == 0
+
+
+def test_decorated_lookup_returns_independent_views():
+    calls = []
+
+    @graph_cache.graph_cache(ttl=None)
+    def lookup(name, k=2):
+        calls.append((name, k))
+        return [{"path": [name], "k": k}]
+
+    first = lookup("jarosite")
+    first[0]["score"] = 1.0
+    assert lookup("jarosite", 2) == [{"path": ["jarosite"], "k": 2}]
+    assert calls == [("jarosite", 2)]
+
+
+# === EmbeddingCache ===
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embedding_cache.time, "time", clock)
+    return clock
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "EMBED_CACHE_TOUCH_INTERVAL", 0.0)
+    nbytes = vector(0).nbytes
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), "model", max_bytes=4 * nbytes)
+    for i in range(4):
+        clock.now += 1
+        cache.put_many({text_hash(f"t{i}"): vector(i)})
+    clock.now += 1
+    assert text_hash("t0") in cache.get_many([text_hash("t0")])  # t0 becomes the most recently used
+    clock.now += 1
+    cache.put_many({text_hash("t4"): vector(4)})
+    # Over budget: evicted down to EMBED_CACHE_EVICT_TO of it, oldest first (t1, then t2)
+    found = cache.get_many([text_hash(f"t{i}") for i in range(5)])
+    assert sorted(found) == sorted(text_hash(t) for t in ("t0", "t3", "t4"))
+    assert np.array_equal(found[text_hash("t4")], vector(4))
+    assert cache.stats()["evictions"] == 2 and cache.stats()["bytes"] == 3 * nbytes
+
+
+def test_embedding_cache_touches_only_stale_entries(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "EMBED_CACHE_TOUCH_INTERVAL", 100.0)
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), "model")
+    cache.put_many({text_hash("a"): vector(1)})
+    last_used = lambda: cache._conn.execute("SELECT last_used FROM embeddings").fetchone()[0]
+    clock.now += 50
+    cache.get_many([text_hash("a")])
+    assert last_used() == 1000.0
+    clock.now += 60
+    cache.get_many([text_hash("a")])
+    assert last_used() == 1110.0
+
+
+def test_embedding_cache_computes_only_misses_and_rolls_back(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), "model")
+    computed = []
+
+    def compute(texts):
+        computed.extend(texts)
+        return np.stack([vector(len(t)) for t in texts])
+
+    first = cache.embed_many(["a", "bb", "a"], compute)
+    second = cache.embed_many(["bb", "ccc"], compute)
+    assert computed == ["a", "bb", "ccc"]
+    assert np.array_equal(first[2], vector(1)) and np.array_equal(second[0], vector(2))
+    # A failing write leaves neither rows nor byte count behind
+    before = cache.stats()
+    with pytest.raises(Exception):
+        cache.put_many({text_hash("ok"): vector(3), object(): vector(4)})
+    assert cache.stats()["entries"] == before["entries"] and cache.stats()["bytes"] == before["bytes"]
+    assert not cache._conn.in_transaction
+    # Vectors are keyed by model and normalization
+    other = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), "other-model")
+    assert other.get_many([text_hash("a")]) == {}
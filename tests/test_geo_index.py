@@ -0,0 +1,166 @@
+import csv
+import json
+import math
+import numpy as np
+import pytest
+
+for module in ("shapely", "requests", "lxml", "rasterio", "pandas", "geopandas", "fiona", "scipy"):
+    pytest.importorskip(module)
+import geo_context_loader as geo
+
+R_MARS_KM = geo.R_MARS / 1000.0
+
+
+# === Mineral cube ===
+
+def baseline_indices(lats, lons):
+    return np.array([geo.get_index_from_latlon(lat, lon) for lat, lon in zip(lats, lons)])
+
+
+def test_vectorized_indices_match_scalar_baseline():
+    rng = np.random.default_rng(0)
+    edges = [(-90, -180), (90, 180), (-90, 180), (90, -180), (0, 0), (89.99, 179.99), (-89.875, -179.875), (0.25, -0.25)]
+    lats = np.r_[rng.uniform(-90, 90, 2000), [lat for lat, _ in edges]]
+    lons = np.r_[rng.uniform(-180, 180, 2000), [lon for _, lon in edges]]
+    assert np.array_equal(geo.get_indices_from_latlon(lats, lons), baseline_indices(lats, lons))
+
+
+@pytest.mark.parametrize("lat, lon", [(90.5, 0), (0, -180.5), (np.nan, 0), (0, np.nan)])
+def test_vectorized_indices_reject_out_of_range(lat, lon):
+    with pytest.raises(ValueError):
+        geo.get_indices_from_latlon([0, lat], [0, lon])
+
+
+@pytest.fixture
+def mineral_cube(tmp_path, monkeypatch):
+    """ Two-mineral cube in the build_mineral_cube layout, with -1 and NaN cells and one all-empty pixel """
+    rng = np.random.default_rng(1)
+    cube = rng.random((2, geo.NUM_ROWS, geo.NUM_COLS)).astype(np.float32)
+    cube[rng.random(cube.shape) < 0.1] = -1
+    cube[rng.random(cube.shape) < 0.05] = np.nan
+    cube[:, 360, 720] = [-1, np.nan]
+    path = tmp_path / "cube.npy"
+    np.save(path, cube)
+    path.with_suffix(".json").write_text(json.dumps(["hematite", "olivine"]))
+    monkeypatch.setattr(geo, "MINERAL_CUBE_PATH", str(path))
+    geo.load_mineral_cube.cache_clear()
+    yield {"hematite": "hematite.tif", "olivine": "olivine.tif"}, cube
+    geo.load_mineral_cube.cache_clear()
+
+
+def baseline_abundance(cube, names, lat, lon):
+    """ The per-point lookup the cube replaces: one band read per mineral at get_index_from_latlon's cell """
+    idx = geo.get_index_from_latlon(lat, lon)
+    row, col = (idx - 1) // geo.NUM_COLS, (idx - 1) % geo.NUM_COLS
+    values = {}
+    for name, band in zip(names, cube):
+        value = band[row, col]
+        values[name] = None if value == -1 or np.isnan(value) else float(value)
+    return idx, None if all(v is None for v in values.values()) else values
+
+
+def test_mineral_cube_matches_per_point_baseline(mineral_cube):
+    minerals, cube = mineral_cube
+    rng = np.random.default_rng(2)
+    points = list(zip(rng.uniform(-90, 90, 500), rng.uniform(-180, 180, 500))) + [(0, 0), (-90, -180), (90, 180)]
+    for lat, lon in points:
+        assert geo.get_mineral_abundance(lat, lon, minerals) == baseline_abundance(cube, list(minerals), lat, lon)
+    lats, lons = np.array(points).T
+    idx, names, values = geo.sample_mineral_abundances(lats, lons, minerals)
+    assert names == list(minerals)
+    assert np.array_equal(idx, baseline_indices(lats, lons))
+    for (lat, lon), row in zip(points, values):
+        _, expected = baseline_abundance(cube, names, lat, lon)
+        expected = expected or {}
+        assert np.array_equal(row, [np.nan if expected.get(n) is None else expected[n] for n in names], equal_nan=True)
+
+
+# === Crater index ===
+
+def haversine_km(lat, lon, lats, lons):
+    p1, p2 = np.radians(lat), np.radians(lats)
+    h = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lons - lon) / 2) ** 2
+    return 2 * R_MARS_KM * np.arcsin(np.sqrt(h))
+
+
+# Query points, each with a tight cluster of craters around it (Robbins longitudes are 0..360)
+CLUSTERS = [(10.0, 100.0), (-45.0, -110.0), (60.0, 30.0), (0.5, 359.5), (-20.0, 180.2)]
+
+
+@pytest.fixture
+def craters(tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    lats = [np.degrees(np.arcsin(rng.uniform(-1, 1, 3000)))]
+    lons = [rng.uniform(0, 360, 3000)]
+    for lat, lon in CLUSTERS:
+        lats.append(lat + rng.uniform(-0.3, 0.3, 6))
+        lons.append((lon + rng.uniform(-0.3, 0.3, 6)) % 360)
+    # Craters across the 0/360 seam and next to the pole
+    lats.append(np.array([5.0, 5.02, 89.9, 89.95]))
+    lons.append(np.array([359.95, 0.03, 10.0, 190.0]))
+    lats, lons = np.concatenate(lats), np.concatenate(lons)
+    path = tmp_path / "craters.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["CRATER_ID", "LAT_CIRC_IMG", "LON_CIRC_IMG", "DIAM_CIRC_IMG"])
+        writer.writerows((f"{i:06d}", lat, lon, 1.0 + i % 7) for i, (lat, lon) in enumerate(zip(lats, lons)))
+        writer.writerow(["no_position", "", "", 3.0])
+    monkeypatch.setattr(geo, "CRATER_INDEX_PATH", str(tmp_path / "craters.pkl"))
+    geo.load_crater_csv.cache_clear()
+    geo.load_crater_index.cache_clear()
+    yield str(path), np.array([f"{i:06d}" for i in range(len(lats))]), lats, lons
+    geo.load_crater_csv.cache_clear()
+    geo.load_crater_index.cache_clear()
+
+
+def baseline_craters(ids, lats, lons, lat, lon, delta=1.0, topk=3):
+    """ The ±delta° box lookup the index replaces, ranked by great-circle distance on the Mars sphere """
+    db_lon = lon + 360 if lon < 0 else lon
+    box = (np.abs(lats - lat) <= delta) & (np.abs(lons - db_lon) <= delta)
+    distance = haversine_km(lat, db_lon, lats[box], lons[box])
+    order = np.argsort(distance, kind="stable")[:topk]
+    return list(ids[box][order]), distance[order]
+
+
+def test_crater_index_matches_box_baseline(craters):
+    path, ids, lats, lons = craters
+    for lat, lon in CLUSTERS:
+        query_lon = lon - 360 if lon > 180 else lon
+        result = geo.get_crater_context(path, lat, query_lon)
+        expected_ids, expected_km = baseline_craters(ids, lats, lons, lat, query_lon)
+        assert len(result) == 3
+        assert [int(c["crater_id"]) for c in result] == [int(i) for i in expected_ids]
+        assert np.allclose([c["distance_km"] for c in result], expected_km)
+        assert all(c["diameter_km"] is not None and c["int_morph1"] is None for c in result)
+
+
+def test_crater_index_matches_brute_force_everywhere(craters):
+    path, ids, lats, lons = craters
+    rng = np.random.default_rng(4)
+    points = [(5.01, 0.0), (5.01, -0.01), (5.01, 359.99 - 360), (89.97, -100.0), (-90.0, 0.0), (0.0, 180.0), (0.0, -180.0)]
+    points += list(zip(rng.uniform(-90, 90, 200), rng.uniform(-180, 180, 200)))
+    radius_km = math.radians(1.0) * R_MARS_KM
+    for lat, lon in points:
+        distance = haversine_km(lat, lon, lats, lons)
+        order = np.argsort(distance, kind="stable")
+        order = order[distance[order] <= radius_km][:3]
+        result = geo.get_crater_context(path, lat, lon)
+        assert [int(c["crater_id"]) for c in result] == [int(i) for i in ids[order]]
+        assert np.allclose([c["distance_km"] for c in result], distance[order])
+        rows, km = geo.query_craters_nearest(path, lat, lon, k=2)
+        assert np.allclose(km, np.sort(distance)[:2])
+
+
+def test_crater_index_finds_craters_across_the_seam(craters):
+    path, _, _, _ = craters
+    # (5.0, 359.95) and (5.02, 0.03) are ~5 km apart, on either side of the 0/360 seam
+    found = [c["lat"] for c in geo.get_crater_context(path, 5.01, -0.01, delta=0.1)]
+    assert sorted(found) == [5.0, 5.02]
+
+
+def test_crater_index_is_persisted_and_reused(craters):
+    path, _, _, _ = craters
+    geo.get_crater_context(path, 0.0, 0.0)
+    geo.load_crater_index.cache_clear()
+    index = geo.load_crater_index(path)
+    assert index["csv_path"].endswith("craters.csv") and index["tree"].n == len(craters[1])
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from link_scorer import score_path, top_k_paths
+
+
+def make_paths(n, seed=0, dim=6, ties=False):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(n):
+        hops = int(rng.integers(1, 4))
+        # Rounded embeddings give many equal scores
+        emb = lambda: (np.round(rng.normal(size=dim)) if ties else rng.normal(size=dim)).astype(np.float32)
+        paths.append({"id": i, "desc_embs": [emb() for _ in range(hops + 1)], "para_embs": [emb() for _ in range(hops + 1)]})
+    return paths
+
+
+def full_sort(paths, query_vec, accept=None, alpha=1.0, beta=1.0):
+    """ Reference: score everything, stable sort by descending score """
+    scored = [(score_path(query_vec, p["desc_embs"], p["para_embs"], alpha=alpha, beta=beta), p)
+              for p in paths if accept is None or accept(p)]
+    return sorted(scored, key=lambda item: -item[0])
+
+
+def ids(scored):
+    return [p["id"] for _, p in scored]
+
+
+@pytest.mark.parametrize("ties", [False, True])
+@pytest.mark.parametrize("k", [1, 5, 40, 500])
+def test_top_k_matches_full_sort(k, ties):
+    paths = make_paths(300, seed=k, ties=ties)
+    query_vec = np.round(np.random.default_rng(99).normal(size=6)).astype(np.float32)
+    expected = full_sort(paths, query_vec)[:k]
+    result = top_k_paths(iter(paths), query_vec, k)
+    assert ids(result) == ids(expected)
+    assert np.allclose([s for s, _ in result], [s for s, _ in expected])
+
+
+def test_top_k_with_filter_and_weights():
+    paths = make_paths(200, seed=3)
+    query_vec = np.random.default_rng(4).normal(size=6).astype(np.float32)
+    accept = lambda p: p["id"] % 3 != 0
+    expected = full_sort(paths, query_vec, accept=accept, alpha=0.7, beta=1.3)[:10]
+    assert ids(top_k_paths(paths, query_vec, 10, accept=accept, alpha=0.7, beta=1.3)) == ids(expected)
+
+
+def test_best_first_stops_early_with_the_same_result():
+    paths = make_paths(200, seed=5, ties=True)
+    query_vec = np.round(np.random.default_rng(6).normal(size=6)).astype(np.float32)
+    ordered = [p for _, p in full_sort(paths, query_vec)]
+    consumed = []
+
+    def stream():
+        for p in ordered:
+            consumed.append(p["id"])
+            yield p
+
+    result = top_k_paths(stream(), query_vec, 10, best_first=True)
+    assert ids(result) == ids(full_sort(ordered, query_vec)[:10])
+    assert len(consumed) < len(ordered)
+
+
+def test_best_first_is_ignored_for_weighted_scores():
+    paths = make_paths(100, seed=7)
+    query_vec = np.random.default_rng(8).normal(size=6).astype(np.float32)
+    # Best first for the unweighted score only; the weighted top-k needs the whole stream
+    ordered = [p for _, p in full_sort(paths, query_vec)]
+    expected = full_sort(ordered, query_vec, alpha=0.2, beta=2.0)[:5]
+    assert ids(top_k_paths(iter(ordered), query_vec, 5, best_first=True, alpha=0.2, beta=2.0)) == ids(expected)
+
+
+def test_stream_is_closed_and_empty_k():
+    closed = []
+
+    def stream():
+        try:
+            yield from make_paths(50, seed=9)
+        finally:
+            closed.append(True)
+
+    query_vec = np.ones(6, dtype=np.float32)
+    top_k_paths(stream(), query_vec, 3, best_first=True)
+    assert closed == [True]
+    assert top_k_paths(make_paths(5), query_vec, 0) == []
@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+import graph_snapshot
+import khop_path_table
+import node_degrees
+from entity_names import normalize_name
+from conftest import TOY_NAMES, TOY_EDGES, TOY_EMBEDDED, write_snapshot
+
+
+def reference_paths(start, k):
+    """
+    Brute-force k-hop paths with the semantics of graph_query._khop_cypher: relationships followed in either
+    direction, every node embedded, node names pairwise distinct
+    """
+    adjacency = {i: [] for i in range(len(TOY_NAMES))}
+    for e, (h, _, t, _) in enumerate(TOY_EDGES):
+        adjacency[h].append((t, e))
+        adjacency[t].append((h, e))
+    found = []
+
+    def extend(nodes, edges):
+        if len(edges) == k:
+            found.append((nodes, edges))
+            return
+        for m, e in adjacency[nodes[-1]]:
+            if TOY_EMBEDDED[m] and normalize_name(TOY_NAMES[m]) not in {normalize_name(TOY_NAMES[n]) for n in nodes}:
+                extend(nodes + [m], edges + [e])
+
+    for s, name in enumerate(TOY_NAMES):
+        if TOY_EMBEDDED[s] and normalize_name(name) == normalize_name(start):
+            extend([s], [])
+    return found
+
+
+def reference_records(start, k):
+    sources = ["paper_a", "paper_b"]
+    return [
+        {
+            "path": [TOY_NAMES[n] for n in nodes],
+            "triples": [(TOY_NAMES[TOY_EDGES[e][0]], TOY_EDGES[e][1], TOY_NAMES[TOY_EDGES[e][2]]) for e in edges],
+            "sources": [sources[TOY_EDGES[e][3]] if TOY_EDGES[e][3] >= 0 else "unknown" for e in edges],
+        }
+        for nodes, edges in reference_paths(start, k)
+    ]
+
+
+def canonical(paths):
+    """ Order-independent comparable form of path records """
+    return sorted((tuple(p["path"]), tuple(p["triples"]), tuple(p["sources"])) for p in paths)
+
+
+@pytest.fixture
+def path_table(toy_snapshot, tmp_path, monkeypatch):
+    table_dir = tmp_path / "path_table"
+    khop_path_table.build_path_table(str(table_dir), str(toy_snapshot), max_hops=3, chunk_starts=4)
+    monkeypatch.setattr(khop_path_table, "PATH_TABLE_DIR", str(table_dir))
+    return table_dir
+
+
+@pytest.mark.parametrize("k", [1, 2, 3])
+@pytest.mark.parametrize("start", ["sulfate", "Mars", "water", "hematite", "CLAY"])
+def test_table_matches_snapshot_and_reference(path_table, start, k):
+    table = khop_path_table.table_khop_paths(start, k)
+    assert table is not None
+    assert canonical(table) == canonical(graph_snapshot.query_khop_paths(start, k))
+    assert canonical(table) == canonical(reference_records(start, k))
+
+
+def test_table_carries_snapshot_embeddings(path_table):
+    snap = graph_snapshot.load_graph_snapshot(graph_snapshot.SNAPSHOT_DIR)
+    for path in khop_path_table.table_khop_paths("Mars", 2):
+        ids = [TOY_NAMES.index(name) for name in path["path"]]
+        assert np.array_equal(np.stack(path["desc_embs"]), snap.desc_emb[ids])
+        assert np.array_equal(np.stack(path["para_embs"]), snap.para_emb[ids])
+
+
+@pytest.mark.parametrize("caps", [[1], [2, 1], [None, 2, 1], [3, 3, 3]])
+def test_capped_table_matches_capped_snapshot(path_table, monkeypatch, caps):
+    monkeypatch.setattr(node_degrees, "HUB_FANOUT", caps)
+    for start in ["sulfate", "Mars", "clay"]:
+        for k in (1, 2, 3):
+            assert canonical(khop_path_table.table_khop_paths(start, k)) == canonical(graph_snapshot.query_khop_paths(start, k))
+
+
+def test_uncovered_hops_and_unknown_starts_fall_back(path_table):
+    assert khop_path_table.table_khop_paths("Mars", 4) is None
+    assert khop_path_table.table_khop_paths("not in the snapshot", 1) is None
+    # Known but without embeddings: the table answers, with no paths
+    assert khop_path_table.table_khop_paths("olivine", 1) == []
+
+
+def test_table_rejects_a_rewired_snapshot(path_table, toy_snapshot):
+    edges = list(TOY_EDGES)
+    edges[0] = (0, "formed_by", 2, 0)
+    write_snapshot(toy_snapshot, TOY_NAMES, edges, TOY_EMBEDDED)
+    graph_snapshot.load_graph_snapshot.cache_clear()
+    khop_path_table.load_path_table.cache_clear()
+    snap = graph_snapshot.load_graph_snapshot(str(toy_snapshot))
+    assert not khop_path_table.PathTable(str(path_table)).matches(snap)
+    assert khop_path_table.table_khop_paths("sulfate", 1) is None
+
+
+def test_incremental_edges_match_a_full_rebuild(path_table, toy_snapshot, tmp_path):
+    khop_path_table.add_edges([{"triple": ("clay", "related_to", "jarosite"), "source": "paper_c", "paragraph": None}],
+                              str(path_table), str(toy_snapshot))
+    full_dir = tmp_path / "full"
+    khop_path_table.build_path_table(str(full_dir), str(toy_snapshot), max_hops=3)
+    incremental, full = khop_path_table.PathTable(str(path_table)), khop_path_table.PathTable(str(full_dir))
+    for k in (1, 2, 3):
+        assert np.array_equal(incremental.indptr[k], full.indptr[k])
+        assert np.array_equal(incremental.nodes[k], full.nodes[k])
+        assert np.array_equal(incremental.edges[k], full.edges[k])
+
+
+def _cypher_records(start, k):
+    """ Records in the shape returned by the _khop_cypher query for the reference paths """
+    snap = graph_snapshot.load_graph_snapshot(graph_snapshot.SNAPSHOT_DIR)
+    sources = ["paper_a", "paper_b"]
+    records = []
+    for nodes, edges in reference_paths(start, k):
+        records.append({
+            "path_nodes": [{"name": TOY_NAMES[n], "description": snap.descriptions[n], "paragraph": snap.paragraphs[n],
+                            "desc_emb": snap.desc_emb[n].tolist(), "para_emb": snap.para_emb[n].tolist()} for n in nodes],
+            "rels": [{"head": TOY_NAMES[TOY_EDGES[e][0]], "type": TOY_EDGES[e][1], "tail": TOY_NAMES[TOY_EDGES[e][2]],
+                      "source": sources[TOY_EDGES[e][3]] if TOY_EDGES[e][3] >= 0 else None} for e in edges],
+        })
+    return records
+
+
+@pytest.mark.parametrize("k", [1, 2, 3])
+def test_table_matches_cypher_results(path_table, monkeypatch, k):
+    pytest.importorskip("neo4j")
+    import graph_query
+    monkeypatch.setattr(graph_query, "_use_name_key", lambda: False)
+    monkeypatch.setattr(graph_query, "USE_EMBEDDING_STORE", False)
+    graph_query.query_khop_paths.cache_clear()
+    for start in ["sulfate", "Mars", "clay"]:
+        monkeypatch.setattr(graph_query, "_read", lambda query, key: _cypher_records(start, k))
+        monkeypatch.setattr(graph_query, "USE_PATH_TABLE", False)
+        from_cypher = graph_query.query_khop_paths(start, k)
+        monkeypatch.setattr(graph_query, "USE_PATH_TABLE", True)
+        monkeypatch.setattr(graph_query, "_read", lambda query, key: pytest.fail("the path table should answer"))
+        graph_query.query_khop_paths.cache_clear()
+        from_table = graph_query.query_khop_paths(start, k)
+        graph_query.query_khop_paths.cache_clear()
+        assert canonical(from_cypher) == canonical(from_table)
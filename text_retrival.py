@@ -1,43 +1,170 @@
-from typing import Optional, List, Tuple, Union
-from sentence_transformers import SentenceTransformer
-import torch
+import re
+from typing import Optional, List, Tuple, Union, Iterable, FrozenSet, Dict, Any
+from functools import lru_cache
 import lancedb
 import numpy as np
 import warnings
+import embedding_utils
+from lancedb_index import apply_search_params, get_vector_block, FILE_COLUMN, TEXT_COLUMN
 warnings.filterwarnings("ignore", category=FutureWarning)
-# === Model and Database Path Configuration ===
-MODEL_PATH = ""  # Embedded model path, we choose bge-large-en-1.5
+# === Database Path Configuration (the embedding model path is embedding_utils._model_path) ===
 LANCEDB_PATH = ""  # Vector database path
+# First-stage retrieval: "vector", "fts" (BM25 over text) or "hybrid" (both, rank-fused); overridable per call
+RETRIEVAL_MODE = "vector"
+# Hybrid fusion: "rrf" (reciprocal rank fusion) or "weighted" (min-max normalized scores)
+FUSION_METHOD = "rrf"
+RRF_K = 60
+# Share of the vector list in fusion (the BM25 list gets the rest)
+HYBRID_VECTOR_WEIGHT = 0.5
+# Candidates per first-stage list, and kept after fusion, before the length filter and reranking
+SEARCH_CANDIDATES = 15
 
-# === Load Model and Vector Database ===
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = SentenceTransformer(MODEL_PATH).to(device)
-db = lancedb.connect(LANCEDB_PATH)
-table = db.open_table("documents")
 
-def get_top_texts_for_entity(
+@lru_cache(maxsize=1)
+def get_table():
+    """ The paragraph table, opened on first use """
+    return lancedb.connect(LANCEDB_PATH).open_table("documents")
+
+
+def _sql_string(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+@lru_cache(maxsize=64)
+def _compiled_source_filter(blocked: FrozenSet[str]) -> str:
+    return f"{FILE_COLUMN} NOT IN ({', '.join(_sql_string(f) for f in sorted(blocked))})"
+
+
+def blocked_source_filter(blocked_sources: Optional[Iterable[str]]) -> Optional[str]:
+    """
+    Prefilter predicate excluding the blocked files, compiled once per distinct block list
+    (served by the scalar index on file, see lancedb_index.build_scalar_index). None if nothing is blocked.
+    """
+    blocked = frozenset(blocked_sources or ())
+    return _compiled_source_filter(blocked) if blocked else None
+
+
+def _row_key(row: Dict[str, Any]) -> Tuple:
+    return row["file"], row["page"], row["text"]
+
+
+def _fts_query(text: str) -> str:
+    """ Plain terms only: query-parser syntax (quotes, colons, brackets ...) would fail or change the meaning """
+    return " ".join(re.findall(r"[\w-]+", text))
+
+
+def _run(query, condition: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    if condition:
+        # Prefilter so blocked rows never take up a candidate slot
+        query = query.where(condition, prefilter=True)
+    return query.select(["text", "file", "page"]).limit(limit).to_list()
+
+
+def vector_candidates(query_vec: np.ndarray, condition: Optional[str] = None, limit: int = SEARCH_CANDIDATES,
+                      nprobes: Optional[int] = None, refine_factor: Optional[int] = None) -> List[Dict[str, Any]]:
+    query = apply_search_params(get_table().search(query_vec.tolist(), query_type="vector"), nprobes, refine_factor)
+    return _run(query, condition, limit)
+
+
+def fts_candidates(query_text: str, condition: Optional[str] = None,
+                   limit: int = SEARCH_CANDIDATES) -> List[Dict[str, Any]]:
+    terms = _fts_query(query_text)
+    if not terms:
+        return []
+    return _run(get_table().search(terms, query_type="fts", fts_columns=TEXT_COLUMN), condition, limit)
+
+
+def fuse_rankings(vector_rows: List[Dict[str, Any]], fts_rows: List[Dict[str, Any]], limit: int,
+                  method: str = FUSION_METHOD, vector_weight: float = HYBRID_VECTOR_WEIGHT) -> List[Dict[str, Any]]:
+    """
+    Merge the vector and BM25 result lists into one ranking.
+    rrf: sum of w / (RRF_K + rank); weighted: sum of w * min-max normalized score
+    (vector rows score 1 - _distance, BM25 rows their _score).
+    """
+    weighted_lists = [
+        (vector_rows, vector_weight, lambda r: 1.0 - r.get("_distance", 0.0)),
+        (fts_rows, 1.0 - vector_weight, lambda r: r.get("_score", 0.0)),
+    ]
+    fused: Dict[Tuple, float] = {}
+    rows: Dict[Tuple, Dict[str, Any]] = {}
+    for result, weight, score_of in weighted_lists:
+        if method == "weighted" and result:
+            scores = np.array([score_of(r) for r in result], dtype=np.float64)
+            span = scores.max() - scores.min()
+            contributions = weight * ((scores - scores.min()) / span if span > 0 else np.ones_like(scores))
+        else:
+            contributions = [weight / (RRF_K + rank) for rank in range(1, len(result) + 1)]
+        for row, contribution in zip(result, contributions):
+            key = _row_key(row)
+            rows.setdefault(key, row)
+            fused[key] = fused.get(key, 0.0) + float(contribution)
+    ranked = sorted(fused, key=fused.get, reverse=True)
+    return [rows[key] for key in ranked[:limit]]
+
+
+def search_candidates(query_vec: Optional[np.ndarray], query_text: str, condition: Optional[str] = None,
+                      mode: Optional[str] = None, limit: int = SEARCH_CANDIDATES, nprobes: Optional[int] = None,
+                      refine_factor: Optional[int] = None) -> List[Dict[str, Any]]:
+    """ First-stage candidates of one query in the given retrieval mode (RETRIEVAL_MODE by default) """
+    mode = mode or RETRIEVAL_MODE
+    if mode == "fts":
+        return fts_candidates(query_text, condition, limit)
+    if mode == "hybrid":
+        return fuse_rankings(
+            vector_candidates(query_vec, condition, limit, nprobes, refine_factor),
+            fts_candidates(query_text, condition, limit),
+            limit
+        )
+    return vector_candidates(query_vec, condition, limit, nprobes, refine_factor)
+
+
+def get_candidate_texts(
     entity_name: str,
     query_vec: Optional[np.ndarray] = None,
     blocked_sources: Optional[List[str]] = None,
-    topk: int = 5,
-    reranker=None
+    nprobes: Optional[int] = None,
+    refine_factor: Optional[int] = None,
+    mode: Optional[str] = None,
+    query_text: Optional[str] = None,
+    candidates: int = SEARCH_CANDIDATES
 ) -> List[str]:
     """
-    Retrieve top-k paragraphs relevant to an entity.
-    Supports blocked sources and optional reranking.
+    First-stage paragraphs of an entity in retrieval order, before reranking and top-k truncation.
+    nprobes / refine_factor tune the ANN index search (defaults in lancedb_index).
+    mode selects vector / fts / hybrid retrieval (RETRIEVAL_MODE by default); BM25 matches query_text,
+    which defaults to the entity name.
     """
-    if query_vec is None:
-        query_vec = model.encode([f"Find scientific paragraphs about: {entity_name}"], normalize_embeddings=True)[0]
+    mode = mode or RETRIEVAL_MODE
+    if query_vec is None and mode != "fts":
+        query_vec = embedding_utils.embed(f"Find scientific paragraphs about: {entity_name}")
+
+    result = search_candidates(
+        query_vec,
+        query_text if query_text is not None else entity_name,
+        blocked_source_filter(blocked_sources),
+        mode=mode,
+        limit=candidates,
+        nprobes=nprobes,
+        refine_factor=refine_factor
+    )
 
-    blocked_list = blocked_sources or []
-    query = table.search(query_vec.tolist(), query_type="vector")
-    if blocked_list:
-        condition = " AND ".join([f"file != '{f}'" for f in blocked_list])
-        query = query.where(condition)
+    return [r["text"].strip() for r in result if len(r["text"].strip()) > 50]
 
-    result = query.select(["text", "file", "page"]).limit(15).to_list()
 
-    paragraphs = [r["text"].strip() for r in result if len(r["text"].strip()) > 50]
+def get_top_texts_for_entity(
+    entity_name: str,
+    query_vec: Optional[np.ndarray] = None,
+    blocked_sources: Optional[List[str]] = None,
+    topk: int = 5,
+    reranker=None,
+    **search_kwargs
+) -> List[str]:
+    """
+    Retrieve top-k paragraphs relevant to an entity.
+    Supports blocked sources and optional reranking (a FlagReranker or a rerank_service.RerankService).
+    search_kwargs are passed to get_candidate_texts.
+    """
+    paragraphs = get_candidate_texts(entity_name, query_vec, blocked_sources, **search_kwargs)
 
     if reranker is not None and paragraphs:
         pairs = [(entity_name, para) for para in paragraphs]
@@ -46,3 +173,76 @@ def get_top_texts_for_entity(
     return paragraphs[:topk]
 
 
+def _batch_vector_search(query_vecs: np.ndarray, blocked_sources: Optional[Iterable[str]], limit: int,
+                         nprobes: Optional[int], refine_factor: Optional[int]) -> Tuple[List[List[Any]], Dict[Any, str]]:
+    """
+    One search for all query vectors: an exact matrix multiply over the exported vector block when it is current
+    (so it can return better neighbours than the ANN index whenever the index recall is below 1),
+    else a multi-vector LanceDB query. Returns the ranked row keys of every query and the text of every
+    distinct key, each text read once however many queries share it.
+    """
+    block = get_vector_block()
+    if block is not None:
+        ranked = block.search(query_vecs, limit, frozenset(blocked_sources or ()))
+        offsets = np.unique(np.concatenate(ranked)) if ranked else np.zeros(0, dtype=np.int64)
+        texts = get_table().to_lance().take(offsets, columns=[TEXT_COLUMN]).column(TEXT_COLUMN).to_pylist() if len(offsets) else []
+        return [r.tolist() for r in ranked], dict(zip(offsets.tolist(), texts))
+
+    query = get_table().search([v.tolist() for v in query_vecs], query_type="vector")
+    rows = _run(apply_search_params(query, nprobes, refine_factor), blocked_source_filter(blocked_sources), limit)
+    ranked: List[List[Any]] = [[] for _ in range(len(query_vecs))]
+    texts: Dict[Any, str] = {}
+    for row in sorted(rows, key=lambda r: (r.get("query_index", 0), r.get("_distance", 0.0))):
+        key = _row_key(row)
+        texts.setdefault(key, row["text"])
+        ranked[row.get("query_index", 0)].append(key)
+    return ranked, texts
+
+
+def get_top_texts_for_entities(
+    entity_names: List[str],
+    query_vecs: np.ndarray,
+    blocked_sources: Optional[List[str]] = None,
+    topk: int = 5,
+    reranker=None,
+    candidates: int = SEARCH_CANDIDATES,
+    nprobes: Optional[int] = None,
+    refine_factor: Optional[int] = None,
+    mode: Optional[str] = None
+) -> List[List[str]]:
+    """
+    get_top_texts_for_entity for several entities at once, one result list per entity.
+    query_vecs holds one vector per entity. In vector mode identical vectors are searched once and all searches
+    run as one batch (exact over the vector block, see _batch_vector_search, so results may differ from the ANN
+    path of get_top_texts_for_entity); fts / hybrid (mode, RETRIEVAL_MODE by default) search per entity with its name as BM25 query.
+    With a reranker the candidates of all entities are scored in one batch.
+    """
+    mode = mode or RETRIEVAL_MODE
+    vecs = np.asarray(query_vecs, dtype=np.float32).reshape(len(entity_names), -1)
+    if not len(vecs):
+        return []
+    if mode == "vector":
+        unique_vecs, inverse = np.unique(vecs, axis=0, return_inverse=True)
+        ranked, texts = _batch_vector_search(unique_vecs, blocked_sources, candidates, nprobes, refine_factor)
+        stripped = {key: text.strip() for key, text in texts.items()}
+        paragraphs = [
+            [stripped[key] for key in ranked[i] if len(stripped[key]) > 50]
+            for i in np.asarray(inverse).reshape(-1)
+        ]
+    else:
+        paragraphs = [
+            get_candidate_texts(entity_name, vec, blocked_sources, nprobes=nprobes, refine_factor=refine_factor,
+                                mode=mode, candidates=candidates)
+            for entity_name, vec in zip(entity_names, vecs)
+        ]
+    if reranker is None:
+        return [p[:topk] for p in paragraphs]
+    if hasattr(reranker, "rerank_many"):
+        return reranker.rerank_many(list(zip(entity_names, paragraphs)), topk=topk)
+    results = []
+    for entity_name, paras in zip(entity_names, paragraphs):
+        if paras:
+            scores = reranker.compute_score([(entity_name, para) for para in paras])
+            paras = [p for p, _ in sorted(zip(paras, np.atleast_1d(scores)), key=lambda x: x[1], reverse=True)]
+        results.append(paras[:topk])
+    return results